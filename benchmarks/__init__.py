@@ -0,0 +1,10 @@
+"""
+Benchmarks for the pswdfile package.  Run each module from the repository root, e.g.
+
+    python -m benchmarks.session -n 10000
+
+benchmarks.suite times the common operations on a file made by benchmarks.generate and compares the
+results with a saved baseline:
+
+    python -m benchmarks.suite -o results.json --baseline baseline.json
+"""
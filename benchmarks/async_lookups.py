@@ -0,0 +1,68 @@
+"""
+10k concurrent lookups submitted from a single thread to AsyncPasswordStore, against a sequential
+PasswordStore.get loop.  Uniform keys measure the worker pool, skewed keys (most lookups on a few hot
+entries) show request coalescing.  Python 2.7 has no asyncio - the async store hands back futures
+(multiprocessing AsyncResult) completed by a pool of worker threads.
+
+    python -m benchmarks.async_lookups -n 10000
+"""
+import argparse
+import random
+import time
+
+from pswdfile.password import PasswordStore,AsyncPasswordStore
+from benchmarks.common import temp_dir,make_entries,populate,report
+
+
+def workload(entries,lookups,skewed):
+    """ List of (username, host) pairs to look up """
+    rng = random.Random(42)
+    if skewed:
+        hot = entries[:10]
+        return [(u,h) for u,h,_ in (rng.choice(hot) if rng.random() < 0.9 else rng.choice(entries)
+                                    for _ in xrange(lookups))]
+    return [(u,h) for u,h,_ in (rng.choice(entries) for _ in xrange(lookups))]
+
+
+def sequential(data_file_dir,pairs):
+    with PasswordStore(data_file_dir=data_file_dir) as store:
+        return [store.get(username,host) for username,host in pairs]
+
+
+def concurrent(data_file_dir,pairs,workers,max_pending):
+    """ Submit every lookup before collecting any result """
+    with AsyncPasswordStore(data_file_dir=data_file_dir,workers=workers,max_pending=max_pending) as store:
+        results = [store.get(username,host) for username,host in pairs]
+        passwords = [result.get() for result in results]
+    return passwords,store.lookups,store.coalesced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--lookups',type=int,default=10000)
+    parser.add_argument('-r','--records',type=int,default=10000)
+    parser.add_argument('-m','--max-pending',type=int,default=1000)
+    parser.add_argument('-w','--workers',type=int,nargs='+',default=[1,4,8])
+    parser.add_argument('-B','--backend',choices=['shelve','compact'],default='compact')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    expected = dict(((u,h),p) for u,h,p in entries)
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries,backend=args.backend)
+        for skewed in (False,True):
+            pairs = workload(entries,args.lookups,skewed)
+            label = 'skewed' if skewed else 'uniform'
+            start = time.time()
+            passwords = sequential(data_file_dir,pairs)
+            report('{0} sequential get'.format(label),len(pairs),time.time() - start)
+            assert passwords == [expected[pair] for pair in pairs]
+            for workers in args.workers:
+                start = time.time()
+                passwords,lookups,coalesced = concurrent(data_file_dir,pairs,workers,args.max_pending)
+                report('{0} async {1:d} workers'.format(label,workers),len(pairs),time.time() - start)
+                print('{0:<40} {1:>10d} lookups {2:>10d} coalesced'.format('',lookups,coalesced))
+                assert passwords == [expected[pair] for pair in pairs]
+
+
+if __name__ == '__main__':
+    main()
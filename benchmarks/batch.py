@@ -0,0 +1,78 @@
+"""
+A mix of get, add, update, remove and list commands run as separate pwutil invocations - an interpreter,
+the imports and an open of the file each - against the same commands piped to one pwutil batch.
+
+    python -m benchmarks.batch -n 1000 -B shelve
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.common import temp_dir,make_entries,populate,report
+
+PWUTIL = [sys.executable,'-m','pswdfile.pwutil']
+
+
+def make_commands(entries,count):
+    """ Command argument lists - mostly gets, the writes spread over the existing entries and new ones """
+    rng = random.Random(42)
+    commands = []
+    for i in range(count):
+        username,host,password = rng.choice(entries)
+        roll = rng.random()
+        if roll < 0.5:
+            commands.append(['get',username,host])
+        elif roll < 0.7:
+            commands.append(['add','new{0:06d}'.format(i),host,'secret-new'])
+        elif roll < 0.85:
+            commands.append(['update',username,host,password + '-v2'])
+        elif roll < 0.95:
+            commands.append(['remove',username,host])
+        else:
+            commands.append(['list',username[:-2] + '*'])
+    return commands
+
+
+def separate(filename,commands):
+    """ One pwutil process per command """
+    for command in commands:
+        if command[0] == 'list':
+            args = ['list',filename,'--match',command[1]]
+        else:
+            args = [command[0],filename] + command[1:]
+        with open('/dev/null','w') as devnull:
+            subprocess.check_call(PWUTIL + args,stdout=devnull)
+
+
+def batch(filename,commands,commit_every):
+    """ Every command through one pwutil batch process """
+    lines = ''.join(' '.join(command) + '\n' for command in commands)
+    process = subprocess.Popen(PWUTIL + ['batch',filename,'--commit-every',str(commit_every)],
+                               stdin=subprocess.PIPE,stdout=subprocess.PIPE)
+    output = process.communicate(lines)[0]
+    assert len(output.splitlines()) == len(commands)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--commands',type=int,default=1000)
+    parser.add_argument('-r','--records',type=int,default=1000)
+    parser.add_argument('-c','--commit-every',type=int,default=0)
+    parser.add_argument('-B','--backend',choices=['shelve','compact','sqlite'],default='shelve')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    commands = make_commands(entries,args.commands)
+    for name,run in (('batch',lambda filename: batch(filename,commands,args.commit_every)),
+                     ('separate invocations',lambda filename: separate(filename,commands))):
+        with temp_dir() as data_file_dir:
+            populate(data_file_dir,entries,backend=args.backend)
+            start = time.time()
+            run(os.path.join(data_file_dir,'.pddatafile'))
+            report('{0} {1}'.format(args.backend,name),len(commands),time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
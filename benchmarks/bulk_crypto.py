@@ -0,0 +1,30 @@
+"""
+encrypt_many/decrypt_many and rekey_file throughput with 1, 4 and 8 worker processes
+"""
+import argparse
+
+from pswdfile.password import encrypt_many,decrypt_many,rekey_file
+from benchmarks.common import temp_dir,make_entries,populate,timed,report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    parser.add_argument('-w','--workers',type=int,nargs='+',default=[1,4,8])
+    parser.add_argument('-c','--chunk-size',type=int,default=2000)
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    encrypted = list(encrypt_many(entries))
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries)
+        for workers in args.workers:
+            elapsed,_ = timed(lambda: list(encrypt_many(entries,workers,args.chunk_size)))
+            report('encrypt_many workers={0}'.format(workers),len(entries),elapsed)
+            elapsed,_ = timed(lambda: list(decrypt_many(encrypted,workers,args.chunk_size)))
+            report('decrypt_many workers={0}'.format(workers),len(entries),elapsed)
+            elapsed,_ = timed(rekey_file,data_file_dir=data_file_dir,workers=workers,chunk_size=args.chunk_size)
+            report('rekey_file workers={0}'.format(workers),len(entries),elapsed)
+
+
+if __name__ == '__main__':
+    main()
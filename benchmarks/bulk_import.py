@@ -0,0 +1,46 @@
+"""
+Bulk import through PasswordStore.import_records versus one upsert per entry, with peak memory
+"""
+import argparse
+import os
+import resource
+
+from pswdfile.password import PasswordStore
+from pswdfile.pwutil import upsert
+from benchmarks.common import temp_dir,make_entries,timed,report
+
+
+def generate_entries(count):
+    """ Stream entries without holding them in memory """
+    for i in xrange(count):
+        yield 'user{0:07d}'.format(i),'host{0:04d}.example.com'.format(i % 1000),'secret-{0:07d}'.format(i)
+
+
+def upsert_loop(filename,entries):
+    for username,host,password in entries:
+        upsert(filename,host,username,password)
+
+
+def bulk_import(data_file_dir,count,batch_size):
+    with PasswordStore(data_file_dir=data_file_dir,mode='c') as store:
+        return store.import_records(generate_entries(count),batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    parser.add_argument('-u','--upserts',type=int,default=500,help='entries for the per-entry upsert run')
+    parser.add_argument('-b','--batch-size',type=int,default=1000)
+    args = parser.parse_args()
+    with temp_dir() as data_file_dir:
+        entries = make_entries(args.upserts)
+        elapsed,_ = timed(upsert_loop,os.path.join(data_file_dir,'upsert'),entries)
+        report('upsert per entry',len(entries),elapsed)
+    with temp_dir() as data_file_dir:
+        elapsed,_ = timed(bulk_import,data_file_dir,args.records,args.batch_size)
+        report('import_records batch={0}'.format(args.batch_size),args.records,elapsed)
+    print('peak RSS: {0:.1f} MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Repeated Password.decrypt() of a small working set with and without a CredentialCache
+"""
+import argparse
+import random
+
+from pswdfile.password import Password
+from pswdfile.cache import CredentialCache
+from benchmarks.common import temp_dir,make_entries,populate,timed,report
+
+
+def lookups(data_file_dir,sample,cache=None):
+    for username,host,_ in sample:
+        Password(host=host,username=username,data_file_dir=data_file_dir,cache=cache).decrypt()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=1000)
+    parser.add_argument('-w','--working-set',type=int,default=20)
+    parser.add_argument('-l','--lookups',type=int,default=500)
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    rand = random.Random(0)
+    working_set = rand.sample(entries,args.working_set)
+    sample = [rand.choice(working_set) for _ in xrange(args.lookups)]
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries)
+        elapsed,_ = timed(lookups,data_file_dir,sample)
+        report('decrypt without cache',len(sample),elapsed)
+        cache = CredentialCache(max_entries=args.working_set,ttl=300)
+        elapsed,_ = timed(lookups,data_file_dir,sample,cache)
+        report('decrypt with CredentialCache',len(sample),elapsed)
+        print(cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Write throughput and file size over an update churn (default 1M updates over 10k keys, 10% deletes) in one
+session syncing every 1000 writes, then the size after pwutil compact.  Followed by the group commit check:
+threads sharing a session that commit after every write.
+
+    python -m benchmarks.churn -B compact
+    python -m benchmarks.churn -B shelve -u 100000   # dumbdbm rewrites its directory file on every delete
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+from pswdfile.password import PasswordStore
+from pswdfile.storage import compact_file
+from benchmarks.common import temp_dir
+
+
+def file_size(data_file_dir):
+    return sum(os.path.getsize(os.path.join(data_file_dir,name)) for name in os.listdir(data_file_dir)
+               if not name.endswith('.lock'))
+
+
+def churn(data_file_dir,backend,updates,keys,delete_ratio,compact_ratio):
+    rng = random.Random(42)
+    step = max(1,updates // 10)
+    start = time.time()
+    with PasswordStore(data_file_dir=data_file_dir,mode='c',backend=backend,flush_every=1000,
+                       compact_ratio=compact_ratio) as store:
+        for i in xrange(1,updates + 1):
+            username = 'user{0:06d}'.format(rng.randrange(keys))
+            if rng.random() < delete_ratio:
+                store.remove(username,'dbhost.example.com')
+            else:
+                store.put(username,'dbhost.example.com','secret-{0:d}'.format(i))
+            if i % step == 0:
+                store.flush()
+                elapsed = time.time() - start
+                print('{0:<8} {1:>9d} updates {2:>10.1f} updates/sec {3:>12d} bytes'.format(
+                    backend,i,i / elapsed,file_size(data_file_dir)))
+    print('{0:<8} closed {1:>38d} bytes'.format(backend,file_size(data_file_dir)))
+    if compact_ratio is None:
+        start = time.time()
+        compact_file(os.path.join(data_file_dir,'.pddatafile'))
+        print('{0:<8} compacted in {1:.3f}s {2:>25d} bytes'.format(backend,time.time() - start,
+                                                                    file_size(data_file_dir)))
+
+
+def group_commit(data_file_dir,backend,threads,writes):
+    """ writes/sec for threads writing through one session and committing after every write """
+    with PasswordStore(data_file_dir=data_file_dir,mode='c',backend=backend) as store:
+        def writer(n):
+            for i in xrange(writes):
+                store.put('thread{0:02d}-{1:06d}'.format(n,i),'dbhost.example.com','secret')
+                store.commit()
+
+        workers = [threading.Thread(target=writer,args=(n,)) for n in range(threads)]
+        start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - start
+    print('{0:<8} group commit {1:>2d} threads {2:>10.1f} durable writes/sec'.format(backend,threads,
+                                                                                   threads * writes / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-u','--updates',type=int,default=1000000)
+    parser.add_argument('-k','--keys',type=int,default=10000)
+    parser.add_argument('-d','--delete-ratio',type=float,default=0.1)
+    parser.add_argument('-c','--compact-ratio',type=float,default=None,help='enable automatic compaction')
+    parser.add_argument('-B','--backend',choices=['shelve','compact'],default='compact')
+    parser.add_argument('-w','--writes',type=int,default=500,help='writes per thread for the group commit check')
+    args = parser.parse_args()
+    with temp_dir() as data_file_dir:
+        churn(data_file_dir,args.backend,args.updates,args.keys,args.delete_ratio,args.compact_ratio)
+    for threads in (1,4,8):
+        with temp_dir() as data_file_dir:
+            group_commit(data_file_dir,args.backend,threads,args.writes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Helpers shared by the benchmark modules
+"""
+import base64
+import hashlib
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from pswdfile.password import PasswordStore
+
+
+@contextmanager
+def temp_dir():
+    """ Temporary directory removed on exit """
+    path = tempfile.mkdtemp(prefix='pswdfile-bench-')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path,ignore_errors=True)
+
+
+def make_entries(count):
+    """ Deterministic list of (username, host, password) tuples """
+    return [('user{0:06d}'.format(i),'host{0:04d}.example.com'.format(i % 1000),'secret-{0:06d}'.format(i))
+            for i in range(count)]
+
+
+def make_records(entries):
+    """ (dbkey, record) tuples with a stand-in ciphertext - the backends never look inside it """
+    rng = random.Random(42)
+    return [(hashlib.sha256(username + '@' + host).hexdigest(),
+             {'host':host,'username':username,'rsakey':base64.b64encode(''.join(chr(rng.randrange(256))
+                                                                                for _ in range(32)))})
+            for username,host,_ in entries]
+
+
+def populate(data_file_dir,entries,data_file_name='.pddatafile',backend=None):
+    """ Write the entries to a data file using a single session """
+    with PasswordStore(data_file_name=data_file_name,data_file_dir=data_file_dir,mode='c',backend=backend) as store:
+        for username,host,password in entries:
+            store.put(username,host,password)
+
+
+def timed(func,*args,**kwargs):
+    """ Run func and return a tuple of (elapsed seconds, result) """
+    start = time.time()
+    result = func(*args,**kwargs)
+    return time.time() - start,result
+
+
+def report(name,count,elapsed):
+    print('{0:<40} {1:>10d} ops {2:>10.3f}s {3:>12.1f} ops/sec'.format(name,count,elapsed,
+                                                                        count / elapsed if elapsed else 0.0))
@@ -0,0 +1,107 @@
+"""
+Stress test - many writer and reader processes on one data file.  The file starts with every entry and the
+writers give each a new password.  Verifies every write landed intact and that every read - with the
+default lock timeout - found the old or the new password, and reports throughput.  Exits non-zero on
+corruption or on a read that timed out or found nothing.
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+from pswdfile.password import PasswordStore
+from benchmarks.common import temp_dir,populate
+
+
+def entry(writer,i):
+    username = 'w{0:02d}u{1:05d}'.format(writer,i)
+    return username,'host.example.com','secret-' + username
+
+
+def new_password(password):
+    return password + '-v2'
+
+
+def writer_process(args):
+    data_file_dir,backend,atomic,writer,count = args
+    errors = 0
+    for i in xrange(count):
+        username,host,password = entry(writer,i)
+        store = PasswordStore(data_file_dir=data_file_dir,mode='c',backend=backend,atomic=atomic)
+        store.open()
+        if store.is_error():
+            errors += 1
+            continue
+        with store:
+            store.put(username,host,new_password(password))
+            errors += store.is_error()
+    return 'write',count,errors
+
+
+def reader_process(args):
+    data_file_dir,backend,writers,count,duration = args
+    rand = random.Random()
+    reads = bad = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        username,host,password = entry(rand.randrange(writers),rand.randrange(count))
+        store = PasswordStore(data_file_dir=data_file_dir,backend=backend)
+        store.open()
+        reads += 1
+        if store.is_error():  # timed out waiting for a writer
+            bad += 1
+            continue
+        with store:
+            value = store.get(username,host)
+        if value not in (password,new_password(password)):
+            bad += 1
+    return 'read',reads,bad
+
+
+def run(data_file_dir,backend,atomic,writers,readers,count,duration):
+    populate(data_file_dir,[entry(w,i) for w in range(writers) for i in xrange(count)],backend=backend)
+    pool = multiprocessing.Pool(writers + readers)
+    start = time.time()
+    jobs = [(writer_process,(data_file_dir,backend,atomic,w,count)) for w in range(writers)]
+    jobs += [(reader_process,(data_file_dir,backend,writers,count,duration)) for _ in range(readers)]
+    results = [pool.apply_async(func,(args,)) for func,args in jobs]
+    results = [result.get() for result in results]
+    elapsed = time.time() - start
+    pool.close()
+    pool.join()
+    writes = sum(n for kind,n,_ in results if kind == 'write')
+    write_errors = sum(e for kind,_,e in results if kind == 'write')
+    reads = sum(n for kind,n,_ in results if kind == 'read')
+    bad_reads = sum(e for kind,_,e in results if kind == 'read')
+    missing = 0
+    with PasswordStore(data_file_dir=data_file_dir,backend=backend) as store:
+        for w in range(writers):
+            for i in xrange(count):
+                username,host,password = entry(w,i)
+                missing += store.get(username,host) != new_password(password)
+    name = '{0}{1}'.format(backend,' atomic' if atomic else '')
+    print('{0:<16} {1:>7d} writes {2:>9.1f}/sec  {3:>7d} reads {4:>9.1f}/sec  '
+          'write errors {5}  bad reads {6}  missing {7}'.format(name,writes,writes / elapsed,reads,
+                                                                reads / elapsed,write_errors,bad_reads,missing))
+    return write_errors + bad_reads + missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-w','--writers',type=int,default=8)
+    parser.add_argument('-r','--readers',type=int,default=8)
+    parser.add_argument('-n','--writes',type=int,default=200,help='writes per writer')
+    parser.add_argument('-d','--duration',type=float,default=5.0,help='seconds each reader runs')
+    args = parser.parse_args()
+    failures = 0
+    for backend,atomic in (('shelve',False),('shelve',True),('compact',False)):
+        with temp_dir() as data_file_dir:
+            failures += run(data_file_dir,backend,atomic,args.writers,args.readers,args.writes,args.duration)
+    if failures:
+        print('FAIL: corruption or failed reads detected')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
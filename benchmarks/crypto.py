@@ -0,0 +1,33 @@
+"""
+Encrypt/decrypt ops/sec for short and 1 KB secrets through Password (no data file)
+"""
+import argparse
+import timeit
+
+from pswdfile.password import Password
+
+SECRETS = (('short','tiger123'),('1kb','x' * 1024))
+
+
+def run(number):
+    results = []
+    for label,secret in SECRETS:
+        pwd = Password(host='dbhost.example.com',username='scott',password=secret)
+        encrypted = pwd.encrypt()
+        encrypt_time = min(timeit.repeat(pwd.encrypt,number=number,repeat=3))
+        decrypt_time = min(timeit.repeat(lambda: pwd.decrypt(encrypted),number=number,repeat=3))
+        results.append(('encrypt ' + label,number / encrypt_time))
+        results.append(('decrypt ' + label,number / decrypt_time))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--number',type=int,default=20000,help='operations per timing run')
+    args = parser.parse_args()
+    for name,rate in run(args.number):
+        print('{0:<16} {1:>12.1f} ops/sec'.format(name,rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Lookup latency through the credential daemon socket versus a cold pwutil get
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+from pswdfile.client import Client
+from benchmarks.common import temp_dir,make_entries,populate
+
+PWUTIL = [sys.executable,'-m','pswdfile.pwutil']
+
+
+def wait_for_socket(socket_path,timeout=30.0):
+    deadline = time.time() + timeout
+    while not os.path.exists(socket_path):
+        if time.time() > deadline:
+            raise RuntimeError('daemon did not start')
+        time.sleep(0.05)
+
+
+def latencies(func,sample):
+    result = []
+    for username,host,_ in sample:
+        start = time.time()
+        func(username,host)
+        result.append(time.time() - start)
+    result.sort()
+    return result
+
+
+def summary(name,values):
+    print('{0:<28} median {1:>9.3f} ms  p99 {2:>9.3f} ms'.format(name,values[len(values) // 2] * 1000,
+                                                               values[int(len(values) * 0.99)] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=10000)
+    parser.add_argument('-l','--lookups',type=int,default=2000)
+    parser.add_argument('-c','--cli-lookups',type=int,default=50)
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    rand = random.Random(0)
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries)
+        filename = os.path.join(data_file_dir,'.pddatafile')
+        socket_path = os.path.join(data_file_dir,'pwutil.sock')
+        server = subprocess.Popen(PWUTIL + ['serve',filename,'--socket',socket_path])
+        try:
+            wait_for_socket(socket_path)
+            client = Client(socket_path)
+            summary('socket lookup',latencies(client.get,[rand.choice(entries) for _ in xrange(args.lookups)]))
+            client.close()
+            summary('cold pwutil get',
+                    latencies(lambda username,host: subprocess.check_output(PWUTIL + ['get',filename,username,host]),
+                              [rand.choice(entries) for _ in xrange(args.cli_lookups)]))
+            summary('cold pwutil get --socket',
+                    latencies(lambda username,host: subprocess.check_output(PWUTIL + ['get',filename,username,host,
+                                                                                      '--socket',socket_path]),
+                              [rand.choice(entries) for _ in xrange(args.cli_lookups)]))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Query latency of find(host=...)/find(username=...) through the secondary index versus filtering a full
+iter_records() scan, on a file of 100k records (100 accounts per host)
+"""
+import argparse
+import time
+
+from pswdfile.password import Password,PasswordStore
+from benchmarks.common import temp_dir,make_entries,populate
+
+
+def latency(query,queries):
+    """ Mean seconds per query - every query must return at least one record """
+    start = time.time()
+    for value in queries:
+        assert sum(1 for _ in query(value)) > 0
+    return (time.time() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    parser.add_argument('-q','--queries',type=int,default=20)
+    parser.add_argument('-B','--backend',choices=['shelve','compact'],default='compact')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    hosts = sorted(set(host for _,host,_ in entries))[:args.queries]
+    users = [username for username,_,_ in entries[::max(1,len(entries) // args.queries)]][:args.queries]
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries,backend=args.backend)
+        pwd = Password(data_file_dir=data_file_dir)
+        runs = [('scan host',lambda host: (r for r in pwd.iter_records() if r['host'] == host),hosts),
+                ('scan username',lambda user: (r for r in pwd.iter_records() if r['username'] == user),users[:3]),
+                ('find host (open per query)',lambda host: pwd.find(host=host),hosts),
+                ('find username (open per query)',lambda user: pwd.find(username=user),users)]
+        for name,query,queries in runs:
+            print('{0:<36} {1:>10.3f} ms/query'.format(name,latency(query,queries) * 1000))
+        with PasswordStore(data_file_dir=data_file_dir) as store:
+            pwd = Password(data_file_dir=data_file_dir,store=store)
+            for name,query,queries in [('find host (open session)',lambda host: pwd.find(host=host),hosts),
+                                       ('find username (open session)',lambda user: pwd.find(username=user),users)]:
+                print('{0:<36} {1:>10.3f} ms/query'.format(name,latency(query,queries) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Synthetic password files for the benchmarks - written through PasswordStore.import_records, so every entry
+is encrypted like a real one.  The entries are deterministic for a seed.
+
+Host distributions:
+    uniform   entries spread evenly over --host-count hosts
+    zipf      a few hosts hold most entries (rank r gets weight 1/r), like a fleet with shared service hosts
+    unique    a host per entry
+Username distributions:
+    unique    a username per entry
+    shared    half the entries use a small pool of service accounts (root, admin, ...) on many hosts
+
+    python -m benchmarks.generate /tmp/bench.pd -n 100000 --hosts zipf --users shared -B compact
+"""
+import argparse
+import bisect
+import os
+import random
+import time
+
+from pswdfile.password import PasswordStore
+from pswdfile.storage import BACKENDS
+
+HOST_DISTRIBUTIONS = ('uniform','zipf','unique')
+USER_DISTRIBUTIONS = ('unique','shared')
+SERVICE_ACCOUNTS = ('root','admin','oracle','postgres','backup','deploy','monitor','svc_batch')
+
+
+def _host_picker(rng,distribution,host_count):
+    """ Function of the entry number returning its host """
+    if distribution == 'unique':
+        return lambda i: 'host{0:07d}.example.com'.format(i)
+    hosts = ['host{0:05d}.example.com'.format(i) for i in range(host_count)]
+    if distribution == 'uniform':
+        return lambda i: hosts[rng.randrange(host_count)]
+    weights = []  # cumulative weights of the hosts by rank
+    total = 0.0
+    for rank in range(1,host_count + 1):
+        total += 1.0 / rank
+        weights.append(total)
+    return lambda i: hosts[min(bisect.bisect(weights,rng.random() * total),host_count - 1)]
+
+
+def make_dataset(count,hosts='uniform',users='unique',host_count=1000,seed=42):
+    """
+    Deterministic (username, host, password) tuples - username and host pairs are unique, so the file
+    holds count entries
+    :param hosts: host distribution, one of HOST_DISTRIBUTIONS
+    :param users: username distribution, one of USER_DISTRIBUTIONS
+    """
+    rng = random.Random(seed)
+    pick_host = _host_picker(rng,hosts,host_count)
+    entries = []
+    seen = set()
+    for i in range(count):
+        host = pick_host(i)
+        username = 'user{0:07d}'.format(i)
+        if users == 'shared' and rng.random() < 0.5:
+            account = rng.choice(SERVICE_ACCOUNTS)
+            if (account,host) not in seen:
+                username = account
+        seen.add((username,host))
+        entries.append((username,host,'pw-{0:016x}'.format(rng.getrandbits(64))))
+    return entries
+
+
+def generate_file(path,entries,backend=None,batch_size=10000):
+    """ Write the entries to a new password file - returns the elapsed seconds """
+    start = time.time()
+    with PasswordStore(data_file_name=os.path.basename(path),data_file_dir=os.path.dirname(path) or '.',mode='n',
+                       backend=backend) as store:
+        written,failed = store.import_records(entries,batch_size)
+        if failed:
+            raise IOError(store.get_error_message())
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path',help='password file to create (replaced when it exists)')
+    parser.add_argument('-n','--records',type=int,default=10000,help='entries, 1k to 1M is the tested range')
+    parser.add_argument('--hosts',choices=HOST_DISTRIBUTIONS,default='uniform')
+    parser.add_argument('--host-count',type=int,default=1000,help='hosts of the uniform and zipf distributions')
+    parser.add_argument('--users',choices=USER_DISTRIBUTIONS,default='unique')
+    parser.add_argument('--seed',type=int,default=42)
+    parser.add_argument('-B','--backend',choices=sorted(BACKENDS),default=None)
+    args = parser.parse_args()
+    entries = make_dataset(args.records,args.hosts,args.users,args.host_count,args.seed)
+    elapsed = generate_file(os.path.abspath(args.path),entries,args.backend)
+    print('{0:d} entries written to {1} in {2:.3f}s ({3:.1f} entries/sec)'.format(len(entries),args.path,elapsed,
+                                                                                  len(entries) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Resolving N credentials with one pwutil get per credential versus a single pwutil get-many
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from benchmarks.common import temp_dir,make_entries,populate,timed,report
+
+PWUTIL = [sys.executable,'-m','pswdfile.pwutil']
+
+
+def cli_loop(filename,entries):
+    for username,host,_ in entries:
+        subprocess.check_output(PWUTIL + ['get',filename,username,host])
+
+
+def cli_get_many(filename,entries):
+    process = subprocess.Popen(PWUTIL + ['get-many',filename],stdin=subprocess.PIPE,stdout=subprocess.PIPE)
+    output,_ = process.communicate(''.join('{0} {1}\n'.format(username,host) for username,host,_ in entries))
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=200)
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries)
+        filename = os.path.join(data_file_dir,'.pddatafile')
+        elapsed,_ = timed(cli_loop,filename,entries)
+        report('pwutil get per credential',len(entries),elapsed)
+        elapsed,_ = timed(cli_get_many,filename,entries)
+        report('pwutil get-many',len(entries),elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Import cost of the command line entry points, reported like python -X importtime (which Python 2.7 lacks).
+
+Each target is imported in a fresh interpreter with __import__ wrapped to time every module loaded.
+Exits 1 when a target loads a module it must not (click for pwget, pycrypto, shelve or multiprocessing
+before a command needs them) or its median import time is over budget.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --report pswdfile.pwutil
+"""
+import argparse
+import ast
+import subprocess
+import sys
+
+# module -> (modules it must not load, median import time budget in ms)
+TARGETS = (
+    ('pswdfile.pwget',(('click','Crypto','shelve','multiprocessing','json'),25.0)),
+    ('pswdfile.password',(('click','Crypto','shelve','multiprocessing'),25.0)),
+    ('pswdfile.pwutil',(('Crypto','shelve','multiprocessing'),60.0)),
+)
+
+# runs in the child interpreter - prints the elapsed seconds, loaded modules and per import timings as a
+# python literal (importing json there would count it as loaded by the target)
+CHILD = r"""
+import sys, time, __builtin__
+_import = __builtin__.__import__
+timings = []
+stack = [0.0]
+
+def timed_import(name, *args, **kwargs):
+    before = len(sys.modules)
+    stack.append(0.0)
+    start = time.time()
+    try:
+        return _import(name, *args, **kwargs)
+    finally:
+        elapsed = time.time() - start
+        children = stack.pop()
+        stack[-1] += elapsed
+        if len(sys.modules) > before:
+            timings.append((name, len(stack) - 1, elapsed - children, elapsed))
+
+start = time.time()
+__builtin__.__import__ = timed_import
+__import__(sys.argv[1])
+__builtin__.__import__ = _import
+elapsed = time.time() - start
+sys.stdout.write(repr({'elapsed': elapsed, 'timings': timings,
+                       'modules': sorted(m for m, v in sys.modules.items() if v is not None)}))
+"""
+
+
+def measure(module):
+    """ Import module in a fresh interpreter """
+    output = subprocess.check_output([sys.executable,'-c',CHILD,module])
+    return ast.literal_eval(output)
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def import_ms(module,repeat):
+    """ Median wall time in ms to import module """
+    return median([measure(module)['elapsed'] for _ in range(repeat)]) * 1000.0
+
+
+def report(module):
+    """ Print a python -X importtime style tree for module """
+    print('import time: self [us] | cumulative | imported package')
+    for name,depth,self_time,cumulative in measure(module)['timings']:
+        print('import time: {0:>9d} | {1:>10d} | {2}{3}'.format(int(self_time * 1e6),int(cumulative * 1e6),
+                                                               '  ' * depth,name))
+
+
+def check(repeat):
+    """ Measure every target - returns the list of failure messages """
+    failures = []
+    for module,(forbidden,budget) in TARGETS:
+        loaded = measure(module)['modules']
+        for name in forbidden:
+            if name in loaded or any(m.startswith(name + '.') for m in loaded):
+                failures.append('{0} loads {1}'.format(module,name))
+        elapsed = import_ms(module,repeat)
+        print('{0:<24} {1:>8.1f} ms {2:>6d} modules (budget {3:.1f} ms)'.format(module,elapsed,len(loaded),budget))
+        if elapsed > budget:
+            failures.append('{0} imports in {1:.1f} ms, over the {2:.1f} ms budget'.format(module,elapsed,budget))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-r','--repeat',type=int,default=7,help='interpreter runs per target (median is used)')
+    parser.add_argument('--report',metavar='MODULE',help='print the import tree of MODULE and exit')
+    args = parser.parse_args()
+    if args.report:
+        report(args.report)
+        return
+    failures = check(args.repeat)
+    for failure in failures:
+        print('REGRESSION: ' + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Cost of the instrumentation hooks (see pswdfile/instrument.py) on session lookups.
+
+Times the same lookups with instrumentation off and on, and estimates the disabled overhead as the cost
+of the "instrument.active is None" check times the number of checks per lookup, which must stay under
+--budget percent of a lookup.  Exits 1 when it does not.
+
+    python -m benchmarks.instrument_overhead -B shelve
+"""
+import argparse
+import sys
+import timeit
+
+from pswdfile import instrument
+from pswdfile.password import PasswordStore
+from benchmarks.common import temp_dir,make_entries,populate
+
+
+def lookups(data_file_dir,pairs,backend,repeat):
+    """ Best seconds per lookup over repeat runs through one session """
+    best = None
+    with PasswordStore(data_file_dir=data_file_dir,backend=backend) as store:
+        for _ in range(repeat):
+            start = instrument.clock()
+            for username,host in pairs:
+                store.get(username,host)
+            elapsed = (instrument.clock() - start) / len(pairs)
+            best = elapsed if best is None else min(best,elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=10000)
+    parser.add_argument('-r','--repeat',type=int,default=5)
+    parser.add_argument('-b','--budget',type=float,default=1.0,help='disabled overhead budget in percent')
+    parser.add_argument('-B','--backend',choices=['shelve','compact'],default='compact')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    pairs = [(username,host) for username,host,_ in entries]
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries,backend=args.backend)
+        disabled = lookups(data_file_dir,pairs,args.backend,args.repeat)
+        with instrument.instrumented() as instrumentation:
+            enabled = lookups(data_file_dir,pairs,args.backend,args.repeat)
+    records = sum(timer[0] for timer in instrumentation.timers.itervalues())
+    checks = float(records) / (len(pairs) * args.repeat)  # every check site records at least one timing
+    check = min(timeit.repeat('instrument.active is None','from pswdfile import instrument',
+                              number=1000000,repeat=5)) / 1000000
+    overhead = checks * check / disabled * 100
+    print('{0:<32} {1:>10.2f} us/lookup'.format('instrumentation off',disabled * 1e6))
+    print('{0:<32} {1:>10.2f} us/lookup {2:>+8.1f}%'.format('instrumentation on',enabled * 1e6,
+                                                             (enabled / disabled - 1) * 100))
+    print('{0:<32} {1:>10.3f} us x {2:.1f} checks = {3:.3f}% of a lookup (budget {4:.1f}%)'.format(
+        'disabled check',check * 1e6,checks,overhead,args.budget))
+    instrumentation.report(sys.stdout)
+    if overhead > args.budget:
+        print('REGRESSION: disabled instrumentation costs {0:.3f}% of a lookup'.format(overhead))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Time to first record and total time for get_all() versus iter_records()
+"""
+import argparse
+import time
+
+from pswdfile.password import Password
+from benchmarks.common import temp_dir,make_entries,populate
+
+
+def first_and_total(records):
+    start = time.time()
+    first = None
+    count = 0
+    for _ in records():
+        if first is None:
+            first = time.time() - start
+        count += 1
+    return first,time.time() - start,count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    args = parser.parse_args()
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,make_entries(args.records))
+        runs = [('get_all()',lambda: Password(data_file_dir=data_file_dir).get_all()),
+                ('iter_records()',lambda: Password(data_file_dir=data_file_dir).iter_records()),
+                ('iter_records(fields)',
+                 lambda: Password(data_file_dir=data_file_dir).iter_records(fields=('username','host')))]
+        for name,records in runs:
+            first,total,count = first_and_total(records)
+            print('{0:<24} first record {1:>8.3f}s  {2:d} records {3:>8.3f}s'.format(name,first,count,total))
+
+
+if __name__ == '__main__':
+    main()
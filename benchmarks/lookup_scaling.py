@@ -0,0 +1,43 @@
+"""
+Get latency as the data file grows - lookups must stay flat instead of scaling with the record count
+"""
+import argparse
+import sys
+
+from pswdfile.password import PasswordStore
+from benchmarks.common import temp_dir,make_entries,populate,timed
+
+
+def lookups(store,entries):
+    for username,host,_ in entries:
+        store.get(username,host)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-s','--sizes',type=int,nargs='+',default=[100,1000,10000,100000])
+    parser.add_argument('-l','--lookups',type=int,default=100)
+    parser.add_argument('--max-ratio',type=float,default=5.0,
+                        help='fail when latency at the largest size exceeds the smallest by this factor')
+    args = parser.parse_args()
+    latencies = []
+    for size in args.sizes:
+        entries = make_entries(size)
+        with temp_dir() as data_file_dir:
+            populate(data_file_dir,entries)
+            sample = entries[-args.lookups:]
+            # the open is timed separately - only the keyed lookups must stay flat
+            with PasswordStore(data_file_dir=data_file_dir) as store:
+                elapsed,_ = timed(lookups,store,sample)
+        latency = elapsed / len(sample) * 1e6
+        latencies.append(latency)
+        print('{0:>10d} records {1:>10.1f} usec/get'.format(size,latency))
+    ratio = latencies[-1] / latencies[0]
+    print('latency ratio largest/smallest: {0:.2f}'.format(ratio))
+    if ratio > args.max_ratio:
+        print('FAIL: get latency grows with file size')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
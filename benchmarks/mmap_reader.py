@@ -0,0 +1,72 @@
+"""
+Aggregate lookups/sec of PasswordReader versus Password(mode='r').decrypt() across concurrent processes
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+from pswdfile.password import Password,PasswordReader
+from pswdfile.storage import open_storage,copy_records
+from benchmarks.common import temp_dir,make_entries,populate
+
+_reader = None
+
+
+def reader_worker(args):
+    sample, = args
+    for username,host in sample:
+        _reader.get(username,host)
+    return len(sample)
+
+
+def password_worker(args):
+    sample,data_file_dir = args
+    for username,host in sample:
+        Password(host=host,username=username,data_file_dir=data_file_dir,mode='r').decrypt()
+    return len(sample)
+
+
+def run(worker,processes,samples):
+    pool = multiprocessing.Pool(processes)
+    try:
+        start = time.time()
+        count = sum(pool.map(worker,samples))
+        return count / (time.time() - start)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    global _reader
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    parser.add_argument('-l','--lookups',type=int,default=20000,help='reader lookups per process')
+    parser.add_argument('-o','--open-lookups',type=int,default=50,help='Password(mode=r) lookups per process')
+    parser.add_argument('-p','--processes',type=int,nargs='+',default=[1,8,32])
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    pairs = [(username,host) for username,host,_ in entries]
+    rand = random.Random(0)
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries)
+        source = open_storage(os.path.join(data_file_dir,'.pddatafile'),'r')
+        target = open_storage(os.path.join(data_file_dir,'compact'),'n','compact')
+        copy_records(source,target,10000)
+        source.close()
+        target.close()
+        _reader = PasswordReader('compact',data_file_dir)  # opened before the pool forks
+        for processes in args.processes:
+            samples = [([rand.choice(pairs) for _ in xrange(args.lookups)],) for _ in xrange(processes)]
+            rate = run(reader_worker,processes,samples)
+            print('{0:>3d} processes PasswordReader        {1:>12.1f} lookups/sec'.format(processes,rate))
+            samples = [([rand.choice(pairs) for _ in xrange(args.open_lookups)],data_file_dir)
+                       for _ in xrange(processes)]
+            rate = run(password_worker,processes,samples)
+            print('{0:>3d} processes Password(mode=r)      {1:>12.1f} lookups/sec'.format(processes,rate))
+
+
+if __name__ == '__main__':
+    main()
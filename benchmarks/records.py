@@ -0,0 +1,79 @@
+"""
+Memory and time to load 500k records, as the dicts shelve files used to hold (a base64 pickled dict inside
+the shelve pickle, decoded into a dict per record) and as PasswordRecords decoded from their binary form.
+
+Python 2.7 has no tracemalloc - each load runs in a fresh process and the memory is the growth of its
+resident set size while the decoded records are kept in a list.
+
+    python -m benchmarks.records -n 500000
+"""
+import argparse
+import base64
+import cPickle
+import gc
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+from pswdfile.record import PasswordRecord,decode_value
+from benchmarks.common import make_entries
+
+
+def rss():
+    """ Resident set size of this process in bytes """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def stored_values(count,legacy):
+    """ Values as a shelve file stores them - base64 pickled dicts pickled by shelve, or encoded records """
+    rsakey = base64.b64encode(os.urandom(64))
+    values = []
+    for username,host,_ in make_entries(count):
+        if legacy:
+            values.append(cPickle.dumps(base64.b64encode(cPickle.dumps({'host':host,'username':username,
+                                                                         'rsakey':rsakey}))))
+        else:
+            values.append(PasswordRecord(host,username,rsakey).encode())
+    return values
+
+
+def legacy_decode(value):
+    return cPickle.loads(base64.b64decode(cPickle.loads(value)))
+
+
+def load(count,legacy,results):
+    values = stored_values(count,legacy)
+    decode = legacy_decode if legacy else decode_value
+    gc.collect()
+    before = rss()
+    start = time.time()
+    records = [decode(value) for value in values]
+    elapsed = time.time() - start
+    gc.collect()
+    results.put((rss() - before,elapsed,sys.getsizeof(records[0])))
+    del records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=500000)
+    args = parser.parse_args()
+    results = multiprocessing.Queue()
+    measured = {}
+    for name,legacy in (('dict (pickled)',True),('PasswordRecord',False)):
+        worker = multiprocessing.Process(target=load,args=(args.records,legacy,results))
+        worker.start()
+        measured[name] = results.get()
+        worker.join()
+        memory,elapsed,size = measured[name]
+        print('{0:<20} {1:>8.1f} MB {2:>8.1f} bytes/record {3:>6d} bytes/object {4:>8.3f}s {5:>10.0f} records/sec'
+              .format(name,memory / 1e6,float(memory) / args.records,size,elapsed,args.records / elapsed))
+    saved = 1.0 - float(measured['PasswordRecord'][0]) / measured['dict (pickled)'][0]
+    print('PasswordRecord saves {0:.0%} of the memory'.format(saved))
+
+
+if __name__ == '__main__':
+    main()
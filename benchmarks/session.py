@@ -0,0 +1,37 @@
+"""
+Lookups/sec with an open/close per operation versus a PasswordStore session
+"""
+import argparse
+
+from pswdfile.password import Password,PasswordStore
+from benchmarks.common import temp_dir,make_entries,populate,timed,report
+
+
+def per_op_lookups(data_file_dir,entries):
+    for username,host,_ in entries:
+        Password(host=host,username=username,data_file_dir=data_file_dir).decrypt()
+
+
+def session_lookups(data_file_dir,entries):
+    with PasswordStore(data_file_dir=data_file_dir) as store:
+        for username,host,_ in entries:
+            store.get(username,host)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=10000)
+    parser.add_argument('-l','--lookups',type=int,default=1000,help='lookups for the per-operation run')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries)
+        sample = entries[:args.lookups]
+        elapsed,_ = timed(per_op_lookups,data_file_dir,sample)
+        report('per-operation open/close',len(sample),elapsed)
+        elapsed,_ = timed(session_lookups,data_file_dir,entries)
+        report('PasswordStore session',len(entries),elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Scaling of a sharded data file with 1 to 16 shards:
+
+    durable writes  threads sharing one ShardedPasswordStore, each committing after every write - writes
+                    to different shards hold different locks and fsync different files
+    writers         processes each writing its own keys through its own session at the same time - a writer
+                    only locks the shards it writes to
+    get             random lookups through one session
+    get_all         every record read with the shards fanned out over worker threads
+
+    python -m benchmarks.shards -n 20000 -s 1 2 4 8 16
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from pswdfile.shard import ShardedPasswordStore
+from benchmarks.common import temp_dir,make_entries,report
+
+
+def durable_writes(data_file_dir,shards,backend,threads,writes):
+    with ShardedPasswordStore(data_file_dir=data_file_dir,mode='c',shards=shards,backend=backend) as store:
+        def writer(n):
+            for i in xrange(writes):
+                store.put('thread{0:02d}-{1:06d}'.format(n,i),'dbhost.example.com','secret')
+                store.commit()
+
+        workers = [threading.Thread(target=writer,args=(n,)) for n in range(threads)]
+        start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.time() - start
+
+
+def _writer_process(data_file_dir,entries):
+    with ShardedPasswordStore(data_file_dir=data_file_dir,mode='c',lock_timeout=600.0) as store:
+        for username,host,password in entries:
+            store.put(username,host,password)
+            store.commit()
+
+
+def concurrent_writers(data_file_dir,shards,backend,entries,processes):
+    """ Seconds for processes writers with separate sessions to write the entries - each writes its own part """
+    with ShardedPasswordStore(data_file_dir=data_file_dir,mode='c',shards=shards,backend=backend):
+        pass  # create the shards
+    parts = [entries[i::processes] for i in range(processes)]
+    workers = [multiprocessing.Process(target=_writer_process,args=(data_file_dir,part)) for part in parts]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    with ShardedPasswordStore(data_file_dir=data_file_dir) as store:
+        assert len(store.get_all()) == len(entries)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=20000)
+    parser.add_argument('-s','--shards',type=int,nargs='+',default=[1,2,4,8,16])
+    parser.add_argument('-t','--threads',type=int,default=8)
+    parser.add_argument('-w','--writes',type=int,default=200,help='durable writes per thread')
+    parser.add_argument('-p','--processes',type=int,default=4)
+    parser.add_argument('-q','--lookups',type=int,default=5000)
+    parser.add_argument('-B','--backend',choices=['shelve','compact'],default='compact')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    pairs = [(u,h) for u,h,_ in random.Random(42).sample(entries,min(args.lookups,len(entries)))]
+    for shards in args.shards:
+        label = '{0:d} shards'.format(shards)
+        with temp_dir() as data_file_dir:
+            elapsed = durable_writes(data_file_dir,shards,args.backend,args.threads,args.writes)
+            report('{0} durable writes x{1:d}'.format(label,args.threads),args.threads * args.writes,elapsed)
+        writer_entries = entries[:args.processes * args.writes]
+        with temp_dir() as data_file_dir:
+            elapsed = concurrent_writers(data_file_dir,shards,args.backend,writer_entries,args.processes)
+            report('{0} writers x{1:d}'.format(label,args.processes),len(writer_entries),elapsed)
+        with temp_dir() as data_file_dir:
+            with ShardedPasswordStore(data_file_dir=data_file_dir,mode='c',shards=shards,
+                                      backend=args.backend) as store:
+                for username,host,password in entries:
+                    store.put(username,host,password)
+            with ShardedPasswordStore(data_file_dir=data_file_dir) as store:
+                start = time.time()
+                for username,host in pairs:
+                    store.get(username,host)
+                report('{0} get'.format(label),len(pairs),time.time() - start)
+                start = time.time()
+                count = len(store.get_all())
+                report('{0} get_all'.format(label),count,time.time() - start)
+                assert count == len(entries)
+            size = sum(os.path.getsize(os.path.join(data_file_dir,name)) for name in os.listdir(data_file_dir))
+            print('{0:<40} {1:>10d} bytes'.format(label,size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Load + lookup time of a short-lived job that needs one credential: a 100-entry snapshot (plain and
+encrypted) read with SnapshotReader versus opening a 100k-entry data file with Password.decrypt.
+
+    python -m benchmarks.snapshot -n 100000 -B shelve
+"""
+import argparse
+import os
+import random
+import time
+
+from pswdfile.password import Password,SnapshotReader
+from pswdfile.snapshot import write_snapshot,generate_key,decode_key
+from pswdfile.storage import open_storage
+from benchmarks.common import temp_dir,make_entries,populate
+
+
+def median_ms(func,repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    parser.add_argument('-s','--snapshot-records',type=int,default=100)
+    parser.add_argument('-r','--repeat',type=int,default=50)
+    parser.add_argument('-B','--backend',choices=['shelve','compact'],default='shelve')
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    selected = set(username for username,_,_ in random.Random(42).sample(entries,args.snapshot_records))
+    wanted = [entry for entry in entries if entry[0] in selected]
+    username,host,password = wanted[0]
+    key = generate_key()
+    with temp_dir() as data_file_dir:
+        populate(data_file_dir,entries,backend=args.backend)
+        storage = open_storage(os.path.join(data_file_dir,'.pddatafile'),'r')
+        try:
+            records = [(dbkey,record) for dbkey,record in storage.iter_records() if record['username'] in selected]
+        finally:
+            storage.close()
+        plain_path = os.path.join(data_file_dir,'plain.snapshot')
+        sealed_path = os.path.join(data_file_dir,'sealed.snapshot')
+        write_snapshot(plain_path,records)
+        write_snapshot(sealed_path,records,decode_key(key))
+
+        def from_file():
+            pwd = Password(host=host,username=username,data_file_dir=data_file_dir)
+            assert pwd.decrypt() == password
+
+        def from_snapshot(path,snapshot_key=None):
+            with SnapshotReader(path,snapshot_key) as reader:
+                assert reader.get(username,host) == password
+
+        from_file()  # load pycrypto before timing
+        print('{0:<48} {1:>10.3f} ms'.format('{0:d}-entry {1} open + lookup'.format(args.records,args.backend),
+                                             median_ms(from_file,args.repeat)))
+        print('{0:<48} {1:>10.3f} ms  {2:>8d} bytes'.format(
+            '{0:d}-entry snapshot load + lookup'.format(len(records)),
+            median_ms(lambda: from_snapshot(plain_path),args.repeat),os.path.getsize(plain_path)))
+        print('{0:<48} {1:>10.3f} ms  {2:>8d} bytes'.format(
+            '{0:d}-entry encrypted snapshot load + lookup'.format(len(records)),
+            median_ms(lambda: from_snapshot(sealed_path,key),args.repeat),os.path.getsize(sealed_path)))
+        with SnapshotReader(sealed_path,key) as reader:
+            start = time.time()
+            for entry_username,entry_host,entry_password in wanted:
+                assert reader.get(entry_username,entry_host) == entry_password
+            elapsed = time.time() - start
+        print('{0:<48} {1:>10.3f} us'.format('encrypted snapshot lookup (loaded)',elapsed / len(wanted) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
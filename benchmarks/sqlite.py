@@ -0,0 +1,120 @@
+"""
+The sqlite backend against shelve (and optionally compact) at the storage level - no encryption:
+
+    bulk insert     every record written through one writer, synced every --batch-size records
+    get             random single lookups through one open reader
+    find host       records of one host through the secondary index (.hix) or the SQLite host index
+    readers         --readers processes doing the lookups at the same time, each with its own reader,
+                    while a writer process commits one update per session - shelve readers lock the
+                    writer out, SQLite readers don't, see the writes count
+
+    python -m benchmarks.sqlite -n 50000 -B shelve sqlite
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+from pswdfile.storage import LockTimeout,open_storage
+from benchmarks.common import temp_dir,make_entries,make_records,report
+
+
+def bulk_insert(path,backend,records,batch_size):
+    storage = open_storage(path,'n',backend)
+    try:
+        for count,(dbkey,record) in enumerate(records,1):
+            storage.put(dbkey,record)
+            if count % batch_size == 0:
+                storage.sync()
+    finally:
+        storage.close()
+
+
+def lookups(path,dbkeys):
+    storage = open_storage(path,'r',timeout=600.0)
+    try:
+        for dbkey in dbkeys:
+            assert storage.get(dbkey) is not None
+    finally:
+        storage.close()
+
+
+def _writer(path,records,stop,writes):
+    """ Rewrite records, one session and commit each, until stop is set """
+    for dbkey,record in itertools.cycle(records):
+        if stop.is_set():
+            break
+        try:
+            storage = open_storage(path,'w',timeout=0.1)
+        except LockTimeout:
+            continue
+        try:
+            storage.put(dbkey,record)
+        finally:
+            storage.close()
+        writes.value += 1
+
+
+def concurrent_readers(path,dbkeys,readers,records):
+    """
+    Readers processes each look up dbkeys while a writer updates records
+    :return: tuple of the seconds the readers took and the number of writes made meanwhile
+    """
+    stop = multiprocessing.Event()
+    writes = multiprocessing.Value('i',0)
+    writer = multiprocessing.Process(target=_writer,args=(path,records,stop,writes))
+    writer.start()
+    workers = [multiprocessing.Process(target=lookups,args=(path,dbkeys)) for _ in range(readers)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    stop.set()
+    writer.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+    return elapsed,writes.value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=50000)
+    parser.add_argument('-q','--lookups',type=int,default=10000)
+    parser.add_argument('-b','--batch-size',type=int,default=1000)
+    parser.add_argument('-p','--readers',type=int,default=4)
+    parser.add_argument('-B','--backends',nargs='+',choices=['shelve','compact','sqlite'],
+                        default=['shelve','sqlite'])
+    args = parser.parse_args()
+    records = make_records(make_entries(args.records))
+    dbkeys = [dbkey for dbkey,_ in random.Random(7).sample(records,min(args.lookups,len(records)))]
+    host = records[0][1]['host']
+    for backend in args.backends:
+        with temp_dir() as data_file_dir:
+            path = os.path.join(data_file_dir,'.pddatafile')
+            start = time.time()
+            bulk_insert(path,backend,records,args.batch_size)
+            report('{0} bulk insert'.format(backend),len(records),time.time() - start)
+            start = time.time()
+            lookups(path,dbkeys)
+            report('{0} get'.format(backend),len(dbkeys),time.time() - start)
+            storage = open_storage(path)
+            try:
+                found = len(list(storage.find(host=host)))  # the first query of shelve builds the .hix file
+                start = time.time()
+                for _ in range(100):
+                    found = len(list(storage.find(host=host)))
+                report('{0} find host ({1:d} records)'.format(backend,found),100,time.time() - start)
+            finally:
+                storage.close()
+            elapsed,writes = concurrent_readers(path,dbkeys,args.readers,records[:100])
+            report('{0} readers x{1:d}'.format(backend,args.readers),len(dbkeys) * args.readers,elapsed)
+            report('{0} writes during the readers'.format(backend),writes,elapsed)
+            size = sum(os.path.getsize(os.path.join(data_file_dir,name)) for name in os.listdir(data_file_dir))
+            print('{0:<40} {1:>10d} bytes'.format(backend,size))
+
+
+if __name__ == '__main__':
+    main()
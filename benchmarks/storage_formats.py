@@ -0,0 +1,37 @@
+"""
+File size and lookup rate of the shelve and compact storage formats
+"""
+import argparse
+import glob
+import os
+import random
+
+from pswdfile.password import PasswordStore
+from pswdfile.storage import BACKENDS
+from benchmarks.common import temp_dir,make_entries,timed,report
+
+
+def file_size(data_file_dir,data_file_name):
+    return sum(os.path.getsize(path) for path in glob.glob(os.path.join(data_file_dir,data_file_name + '*')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n','--records',type=int,default=100000)
+    parser.add_argument('-l','--lookups',type=int,default=10000)
+    args = parser.parse_args()
+    entries = make_entries(args.records)
+    sample = random.Random(0).sample(entries,min(args.lookups,len(entries)))
+    with temp_dir() as data_file_dir:
+        for backend in sorted(BACKENDS):
+            with PasswordStore(data_file_name=backend,data_file_dir=data_file_dir,mode='c',backend=backend) as store:
+                elapsed,_ = timed(store.import_records,entries,10000)
+            report('{0} import'.format(backend),len(entries),elapsed)
+            with PasswordStore(data_file_name=backend,data_file_dir=data_file_dir) as store:
+                elapsed,_ = timed(lambda: [store.get(username,host) for username,host,_ in sample])
+            report('{0} lookups'.format(backend),len(sample),elapsed)
+            print('{0} size on disk: {1:.1f} KB'.format(backend,file_size(data_file_dir,backend) / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark suite - times the common operations on a generated password file, writes the results to a JSON
+file and compares them with a saved baseline.  Exits 1 when a timing is slower than the baseline by more
+than the tolerance, so a regression fails loudly.
+
+Scenarios (every timing is the median of --repeat runs, in milliseconds - lower is better):
+    generate  writing the file through PasswordStore.import_records (per 1000 entries)
+    crypto    Password.encrypt and Password.decrypt of one password
+    password2 Password2.save_to_file and Password2.get_record of one entry (the entry is removed after)
+    get_all   Password.get_all() of the whole file
+    cli       pwutil get, add, remove and list, each a fresh process on the file
+    startup   cold start of pwget --version and pwutil --version, and the import of the entry points
+
+    python -m benchmarks.suite -n 10000 -o results.json
+    python -m benchmarks.suite -n 10000 -o results.json --baseline baseline.json
+    cp results.json baseline.json   # accept the results as the new baseline
+
+Timings are only comparable on the same machine, Python and options - the options are saved with the
+results and a comparison with a baseline taken with other options is refused.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+from pswdfile import __version__ as pkg_version
+from pswdfile.password import Password,Password2
+from pswdfile.storage import BACKENDS
+from benchmarks.common import temp_dir
+from benchmarks.generate import HOST_DISTRIBUTIONS,USER_DISTRIBUTIONS,make_dataset,generate_file
+from benchmarks.importtime import import_ms
+
+PWUTIL = [sys.executable,'-m','pswdfile.pwutil']
+PWGET = [sys.executable,'-m','pswdfile.pwget']
+SCENARIOS = ('generate','crypto','password2','get_all','cli','startup')
+FORMAT_VERSION = 1
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def run_ms(args,repeat):
+    """ Median wall time in ms of a command run in a fresh process """
+    timings = []
+    with open(os.devnull,'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.check_call(args,stdout=devnull)
+            timings.append(time.time() - start)
+    return median(timings) * 1000.0
+
+
+def scenario_generate(path,entries,args):
+    timings = []
+    for _ in range(max(args.repeat // 3,1)):  # the file is written again by every run
+        timings.append(generate_file(path,entries,args.backend))
+    yield 'generate per 1000 entries',median(timings) * 1000.0 * 1000 / len(entries)
+
+
+def scenario_crypto(path,entries,args):
+    username,host,password = entries[0]
+    pwd = Password(host=host,username=username,password=password)
+    encrypted = pwd.encrypt()
+    number = 2000
+    yield 'Password.encrypt',median(timeit.repeat(pwd.encrypt,number=number,repeat=args.repeat)) * 1000.0 / number
+    yield 'Password.decrypt',median(timeit.repeat(lambda: pwd.decrypt(encrypted),number=number,
+                                                  repeat=args.repeat)) * 1000.0 / number
+
+
+def scenario_password2(path,entries,args):
+    username,host,password = entries[0]
+    username = 'bench2' + username
+    location = {'data_file_name':os.path.basename(path),'data_file_dir':os.path.dirname(path)}
+
+    def save():
+        pwd = Password2(host=host,username=username,password=password,mode='c',**location)
+        pwd.encrypt()
+        pwd.save_to_file()
+        assert not pwd.is_error(),pwd.get_error_message()
+
+    def get_record():
+        pwd = Password2(host=host,username=username,**location)
+        pwd.get_record()
+        assert not pwd.is_error() and pwd.decrypt(pwd.record['rsakey']) == password,pwd.get_error_message()
+    try:
+        yield 'Password2.save_to_file',median(timeit.repeat(save,number=1,repeat=args.repeat)) * 1000.0
+        yield 'Password2.get_record',median(timeit.repeat(get_record,number=1,repeat=args.repeat)) * 1000.0
+    finally:
+        Password(host=host,username=username,mode='c',**location).remove_record()
+
+
+def scenario_get_all(path,entries,args):
+    def get_all():
+        pwd = Password(data_file_name=os.path.basename(path),data_file_dir=os.path.dirname(path))
+        records = pwd.get_all()
+        assert len(records) == len(entries),pwd.get_error_message()
+    yield 'Password.get_all',median(timeit.repeat(get_all,number=1,repeat=args.repeat)) * 1000.0
+
+
+def scenario_cli(path,entries,args):
+    username,host,_ = entries[len(entries) // 2]
+    yield 'pwutil get',run_ms(PWUTIL + ['get',path,username,host],args.repeat)
+    add_timings = []
+    remove_timings = []
+    with open(os.devnull,'w') as devnull:
+        for i in range(args.repeat):  # add and remove a new entry, leaving the file as it was
+            for timings,command in ((add_timings,['add',path,'bench{0:03d}'.format(i),host,'secret']),
+                                    (remove_timings,['remove',path,'bench{0:03d}'.format(i),host])):
+                start = time.time()
+                subprocess.check_call(PWUTIL + command,stdout=devnull)
+                timings.append(time.time() - start)
+    yield 'pwutil add',median(add_timings) * 1000.0
+    yield 'pwutil remove',median(remove_timings) * 1000.0
+    yield 'pwutil list --limit 100',run_ms(PWUTIL + ['list',path,'--limit','100'],args.repeat)
+    yield 'pwutil list --match',run_ms(PWUTIL + ['list',path,'--match',username[:-2] + '*'],args.repeat)
+
+
+def scenario_startup(path,entries,args):
+    yield 'pwget --version',run_ms(PWGET + ['--version'],args.repeat)
+    yield 'pwutil --version',run_ms(PWUTIL + ['--version'],args.repeat)
+    for module in ('pswdfile.pwget','pswdfile.pwutil'):
+        yield 'import ' + module,import_ms(module,args.repeat)
+
+
+def run_suite(args):
+    """ Generate the file and run the selected scenarios - returns the results dict """
+    entries = make_dataset(args.records,args.hosts,args.users)
+    results = {}
+    with temp_dir() as data_file_dir:
+        path = os.path.join(data_file_dir,'.pddatafile')
+        generate_file(path,entries,args.backend)
+        for name in args.scenarios:
+            for metric,value in globals()['scenario_' + name](path,entries,args):
+                print('{0:<32} {1:>12.3f} ms'.format(metric,value))
+                results[metric] = value
+    return {'version':FORMAT_VERSION,
+            'options':{'records':args.records,'backend':args.backend,'hosts':args.hosts,'users':args.users,
+                       'repeat':args.repeat},
+            'environment':{'python':platform.python_version(),'platform':platform.platform(),
+                           'pswdfile':pkg_version},
+            'date':time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results':results}
+
+
+def compare(current,baseline,tolerance,min_delta):
+    """
+    Print the comparison report
+    :param tolerance: fraction a timing may grow over the baseline
+    :param min_delta: ms a timing may grow regardless of the tolerance - the noise of the sub-millisecond timings
+    :return: list of the regressions
+    """
+    if current['options'] != baseline['options']:
+        raise ValueError('The baseline was taken with other options: {0!r}'.format(baseline['options']))
+    regressions = []
+    print('\n{0:<32} {1:>12} {2:>12} {3:>8}'.format('metric','baseline ms','current ms','change'))
+    for metric in sorted(set(current['results']) | set(baseline['results'])):
+        if metric not in baseline['results'] or metric not in current['results']:
+            print('{0:<32} {1}'.format(metric,'not in the baseline' if metric not in baseline['results']
+                                       else 'not measured'))
+            continue
+        before = baseline['results'][metric]
+        after = current['results'][metric]
+        change = after / before - 1.0 if before else 0.0
+        status = ''
+        if change > tolerance and after - before > min_delta:
+            status = 'REGRESSION'
+            regressions.append('{0} took {1:.3f} ms, {2:.0%} over the baseline {3:.3f} ms'.format(metric,after,change,
+                                                                                                  before))
+        elif change < -tolerance and before - after > min_delta:
+            status = 'improved'
+        print('{0:<32} {1:>12.3f} {2:>12.3f} {3:>+8.0%} {4}'.format(metric,before,after,change,status))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=10000,help='entries in the generated file')
+    parser.add_argument('-B','--backend',choices=sorted(BACKENDS),default='shelve')
+    parser.add_argument('--hosts',choices=HOST_DISTRIBUTIONS,default='zipf')
+    parser.add_argument('--users',choices=USER_DISTRIBUTIONS,default='shared')
+    parser.add_argument('-r','--repeat',type=int,default=5,help='runs per timing (median is used)')
+    parser.add_argument('-s','--scenario',dest='scenarios',action='append',choices=SCENARIOS,
+                        help='scenario to run, repeat for more (default all)')
+    parser.add_argument('-o','--output',default='benchmark-results.json',help='JSON results file to write')
+    parser.add_argument('--baseline',help='JSON results file to compare with')
+    parser.add_argument('-t','--tolerance',type=float,default=0.3,
+                        help='slowdown over the baseline reported as a regression (default 0.3 = 30%%)')
+    parser.add_argument('--min-delta',type=float,default=0.05,help='ms a timing may grow regardless of the tolerance')
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    current = run_suite(args)
+    with open(args.output,'w') as output:
+        json.dump(current,output,indent=2,sort_keys=True)
+    print('Results written to {0}'.format(args.output))
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        try:
+            regressions = compare(current,baseline,args.tolerance,args.min_delta)
+        except ValueError as e:
+            print('ERROR: {0!s}'.format(e))
+            sys.exit(2)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Bringing a copy of a 200k-record file up to date after one record changed: pwutil sync (sync_files - diff
+the manifests of both files, write the one changed record) against copying every file of the data file
+over the copy and reopening it.  Records are written at the storage level with a stand-in ciphertext.
+
+The first sync builds both manifests with a scan and caches them (cold).  The second sync, after another
+record changed, uses the cached manifest of the target and the cached manifest of the source brought up
+to date - replayed for a compact file, rebuilt with a scan for the other backends (warm).
+
+    python -m benchmarks.sync -n 200000 -B shelve
+"""
+import argparse
+import base64
+import os
+import shutil
+import time
+
+from pswdfile.record import PasswordRecord
+from pswdfile.storage import BACKENDS,open_storage
+from pswdfile.sync import RecordManifest,sync_files
+from benchmarks.common import temp_dir,make_entries,make_records
+
+
+def write_file(path,backend,records):
+    storage = open_storage(path,'n',backend)
+    try:
+        for count,(dbkey,record) in enumerate(records,1):
+            storage.put(dbkey,record)
+            if count % 10000 == 0:
+                storage.sync()
+    finally:
+        storage.close()
+
+
+def copy_files(source,target,backend):
+    """ Copy every file of the source data file over the target - returns the bytes copied """
+    copied = 0
+    for suffix in BACKENDS[backend].SUFFIXES:
+        if os.path.exists(source + suffix):
+            shutil.copyfile(source + suffix,target + suffix)
+            copied += os.path.getsize(target + suffix)
+    return copied
+
+
+def change_record(path,dbkey,record):
+    """ Give the record a new ciphertext """
+    storage = open_storage(path,'w')
+    try:
+        storage.put(dbkey,PasswordRecord(record['host'],record['username'],base64.b64encode(os.urandom(64))))
+    finally:
+        storage.close()
+
+
+def reopen(path,dbkey):
+    storage = open_storage(path,'r')
+    try:
+        assert storage.get(dbkey) is not None
+    finally:
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n','--records',type=int,default=200000)
+    parser.add_argument('-B','--backend',choices=sorted(BACKENDS),default='shelve')
+    args = parser.parse_args()
+    records = make_records(make_entries(args.records))
+    dbkey,record = records[len(records) // 2]
+    other_dbkey,other_record = records[len(records) // 3]
+    with temp_dir() as data_file_dir:
+        source = os.path.join(data_file_dir,'source')
+        copy = os.path.join(data_file_dir,'copy')
+        synced = os.path.join(data_file_dir,'synced')
+        write_file(source,args.backend,records)
+        copy_files(source,copy,args.backend)
+        copy_files(source,synced,args.backend)
+        change_record(source,dbkey,record)
+
+        start = time.time()
+        copied = copy_files(source,copy,args.backend)
+        reopen(copy,dbkey)
+        print('{0:<40} {1:>10.3f}s {2:>12d} bytes written'.format('full copy and reopen',time.time() - start,copied))
+
+        for name,changed_dbkey in (('sync (cold)',dbkey),('sync (warm)',other_dbkey)):
+            if name == 'sync (warm)':
+                change_record(source,other_dbkey,other_record)
+            start = time.time()
+            counts = sync_files(source,synced)
+            reopen(synced,changed_dbkey)
+            print('{0:<40} {1:>10.3f}s {2:>12d} records written'.format(name,time.time() - start,
+                                                                          sum(counts.values())))
+            assert counts == {'added':0,'changed':1,'removed':0}
+
+        storage = open_storage(source,'r')
+        try:
+            start = time.time()
+            manifest = RecordManifest.from_records(storage.iter_records())
+            manifest.root()
+            print('{0:<40} {1:>10.3f}s'.format('manifest of one file',time.time() - start))
+        finally:
+            storage.close()
+        copy_files(source,copy,args.backend)
+        for path in (copy,synced):
+            source_storage,target_storage = open_storage(source,'r'),open_storage(path,'r')
+            try:
+                assert dict(source_storage.iter_records()) == dict(target_storage.iter_records())
+            finally:
+                source_storage.close()
+                target_storage.close()
+
+
+if __name__ == '__main__':
+    main()
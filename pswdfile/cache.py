@@ -0,0 +1,161 @@
+"""
+  Name: cache.py
+
+  Purpose: In-process cache of decrypted passwords for applications that look up the same
+           username/host repeatedly.  Entries are keyed by the data file path and the SHA256 dbkey,
+           expire after a TTL and are evicted least recently used first.  Cached entries for a data
+           file are dropped as soon as the file changes on disk (inode, mtime or size).  Passwords are
+           held in bytearrays that are overwritten with zeros when the entry is dropped.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+0.02 jwd3 10/17/2026
+    file_signature covers the write ahead log of a SQLite data file
+0.03 jwd3 10/17/2026
+    file_signature covers the shards of a sharded data file
+0.04 jwd3 10/17/2026
+    get and put drop and wipe every expired entry
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+__all__ = ['CredentialCache','file_signature']
+__version__ = "0.04"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+# files that may hold a data file depending on the storage backend and dbm flavor
+_SUFFIXES = ('','.db','.dat','.dir','.pag','.idx','-wal')
+
+
+def _files_signature(path):
+    signature = []
+    for suffix in _SUFFIXES:
+        try:
+            st = os.stat(path + suffix)
+        except OSError:
+            continue
+        signature.append((suffix,st.st_ino,st.st_mtime,st.st_size))
+    return tuple(signature)
+
+
+def file_signature(path):
+    """ Identity of the files behind a data file - changes whenever any of them is replaced or written.  For a
+        sharded data file that is the manifest and the files of every shard (named like shard.shard_path). """
+    try:
+        with open(path + '.shards') as manifest:
+            generation,count,_ = manifest.read().split()
+            generation,count = int(generation),int(count)
+    except (IOError,ValueError):
+        return _files_signature(path)
+    signature = [('.shards',generation,count)]
+    for i in range(count):
+        signature.extend(_files_signature('{0}.g{1:d}.s{2:02d}'.format(path,generation,i)))
+    return tuple(signature)
+
+
+def _wipe(secret):
+    secret[:] = '\0' * len(secret)
+
+
+class CredentialCache(object):
+    """ Bounded LRU cache of decrypted passwords with a time to live.
+
+        cache = CredentialCache(max_entries=500,ttl=60)
+        pwd = Password(host='dbhost',username='scott',data_file_dir='/tmp',cache=cache)
+        pwd.decrypt()
+
+        Every get and put first drops and wipes the entries that have expired, so a password does not stay
+        in memory past its TTL because nobody asked for it again."""
+
+    def __init__(self,max_entries=1000,ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (path, dbkey) -> bytearray password in LRU order
+        self._expiry = OrderedDict()  # (path, dbkey) -> expires in the order the entries were cached
+        self._signatures = {}  # path -> file signature when entries were cached
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """ Counters as a dict """
+        return {'hits':self.hits,'misses':self.misses,'evictions':self.evictions,'entries':len(self._entries)}
+
+    def _drop(self,key):
+        _wipe(self._entries.pop(key))
+        del self._expiry[key]
+
+    def _purge(self):
+        """ Drop the expired entries - the oldest first, they expire in the order they were cached """
+        now = time.time()
+        while self._expiry:
+            key,expires = next(self._expiry.iteritems())
+            if expires >= now:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def _check_file(self,path):
+        """ Drop the entries for path when the file changed since they were cached """
+        signature = file_signature(path)
+        if self._signatures.get(path) != signature:
+            for key in [key for key in self._entries if key[0] == path]:
+                self._drop(key)
+            self._signatures[path] = signature
+
+    def get(self,path,dbkey):
+        """ Return the cached password or None """
+        with self._lock:
+            self._purge()
+            self._check_file(path)
+            key = (path,dbkey)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # move to the most recently used end
+            del self._entries[key]
+            self._entries[key] = entry
+            return str(entry)
+
+    def put(self,path,dbkey,password):
+        """ Cache the password read from or just written to the data file """
+        with self._lock:
+            self._purge()
+            self._check_file(path)
+            key = (path,dbkey)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = bytearray(password)
+            self._expiry[key] = time.time() + self.ttl
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def discard(self,path,dbkey):
+        """ Drop one entry, e.g. when the record is removed """
+        with self._lock:
+            if (path,dbkey) in self._entries:
+                self._drop((path,dbkey))
+
+    def clear(self):
+        """ Drop and wipe every entry """
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._signatures.clear()
@@ -0,0 +1,101 @@
+"""
+  Name: client.py
+
+  Purpose: Minimal client for the credential daemon (pwutil serve).  Only imports the standard
+           library so a lookup does not pay for loading pycrypto or click.
+
+           client = Client('/run/user/1000/pwutil.sock')
+           password = client.get('scott','dbhost')
+           if client.is_error():
+               print client.get_error_message()
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+"""
+import json
+import socket
+
+__all__ = ['Client']
+__version__ = "0.01"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+
+class Client(object):
+    """ Connection to the credential daemon - the connection is opened on first use and kept open """
+
+    def __init__(self,socket_path,filename=None,timeout=10.0):
+        self.socket_path = socket_path
+        self.filename = filename  # when set the daemon checks it serves this file
+        self.timeout = timeout
+        self.error = False
+        self.errmsg = None
+        self._sock = None
+        self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+        return False
+
+    def is_error(self):
+        return self.error
+
+    def get_error_message(self):
+        return 'ERROR: ' + self.errmsg
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._reader = None
+
+    def request(self,request):
+        """ Send one request and return the response dict - socket errors are reported in the error key """
+        if self.filename:
+            request['file'] = self.filename
+        try:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+                self._sock.settimeout(self.timeout)
+                self._sock.connect(self.socket_path)
+                self._reader = self._sock.makefile('rb')
+            self._sock.sendall(json.dumps(request) + '\n')
+            line = self._reader.readline()
+            if not line:
+                raise socket.error('Connection closed by the server')
+            response = json.loads(line)
+        except (socket.error,ValueError) as e:
+            self.close()
+            response = {'error':'Cannot reach credential daemon [{0!s}] - Error {1!s}'.format(self.socket_path,e)}
+        self.error = bool(response.get('error'))
+        self.errmsg = response.get('error')
+        return response
+
+    def get(self,username,host=None):
+        """
+        Get the decrypted password for a username and host
+        :return: password or None on error
+        """
+        return self.request({'op':'get','username':username,'host':host}).get('password')
+
+    def get_many(self,pairs):
+        """
+        Get the passwords for many username/host pairs in one round trip
+        :return: list of dicts with username, host, password and error
+        """
+        return self.request({'op':'get-many','pairs':[list(pair) for pair in pairs]}).get('results',[])
+
+    def list(self,match=None,limit=None):
+        """ List username@host entries, optionally filtered by a shell pattern """
+        return self.request({'op':'list','match':match,'limit':limit}).get('entries',[])
@@ -0,0 +1,193 @@
+"""
+  Name: daemon.py
+
+  Purpose: Credential daemon that loads a password file once and answers lookups over a Unix domain
+           socket, so consumers don't pay the interpreter, import and file open cost per lookup.
+           Records are held encrypted in memory and decrypted on demand.  The file is reloaded when
+           it changes on disk.  The server is a single asyncore event loop (poll based) so it can
+           hold thousands of client connections.
+
+           Protocol: one JSON object per line in each direction.
+               {"op": "get", "username": "scott", "host": "dbhost"}
+                   -> {"password": "tiger", "error": null}
+               {"op": "get-many", "pairs": [["scott", "dbhost"], ...]}
+                   -> {"results": [{"username": ..., "host": ..., "password": ..., "error": ...}, ...]}
+               {"op": "list", "match": "*@dbhost", "limit": 10}
+                   -> {"entries": ["scott@dbhost", ...]}
+           Any request may include "file" - the daemon answers with an error when it serves another file.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+0.02 jwd3 10/17/2026
+    Serves sharded files
+"""
+import os
+import sys
+import time
+import errno
+import signal
+import fnmatch
+import json
+import socket
+import asyncore
+import asynchat
+
+from pswdfile.password import Password,_db_key
+from pswdfile.shard import open_data_file
+from pswdfile.cache import file_signature
+
+__all__ = ['CredentialServer','serve']
+__version__ = "0.02"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+
+def _utf8(value):
+    return value.encode('utf-8') if isinstance(value,unicode) else value
+
+
+class _ClientHandler(asynchat.async_chat):
+    """ One client connection - a JSON request per line """
+
+    def __init__(self,sock,server):
+        asynchat.async_chat.__init__(self,sock)
+        self.server = server
+        self.buffer = []
+        self.set_terminator('\n')
+
+    def collect_incoming_data(self,data):
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.buffer)
+        self.buffer = []
+        try:
+            response = self.server.handle_request(json.loads(line))
+        except ValueError:
+            response = {'error':'Invalid request'}
+        self.push(json.dumps(response) + '\n')
+
+    def handle_error(self):
+        self.close()
+
+
+class CredentialServer(asyncore.dispatcher):
+    """ Serve lookups for one password file on a Unix domain socket """
+
+    def __init__(self,filename,socket_path,backend=None):
+        asyncore.dispatcher.__init__(self)
+        self.filename = os.path.abspath(filename)
+        self.socket_path = socket_path
+        self.backend = backend
+        self.records = {}
+        self.signature = None
+        self._password = Password()
+        self.reload()
+        self.create_socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        self.__remove_stale_socket()
+        umask = os.umask(0o077)  # only the owner may connect
+        try:
+            self.bind(socket_path)
+        finally:
+            os.umask(umask)
+        self.listen(128)
+
+    def __remove_stale_socket(self):
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except socket.error as e:
+                if e.errno in (errno.ECONNREFUSED,errno.ENOENT):
+                    os.remove(self.socket_path)
+            else:
+                raise IOError('A server is already listening on [{0!s}]'.format(self.socket_path))
+            finally:
+                probe.close()
+
+    def reload(self):
+        """ Load the encrypted records into memory """
+        storage = open_data_file(self.filename,'r',self.backend)
+        try:
+            self.records = dict(storage.iter_records())
+        finally:
+            storage.close()
+        self.signature = file_signature(self.filename)
+
+    def check_file(self):
+        """ Reload when the file changed on disk - keeps serving the old records if the reload fails """
+        if file_signature(self.filename) != self.signature:
+            try:
+                self.reload()
+            except Exception:
+                sys.stderr.write('Reload of [{0!s}] failed - {1!s}\n'.format(self.filename,sys.exc_info()[1]))
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            _ClientHandler(pair[0],self)
+
+    def lookup(self,username,host=None):
+        """ Return a tuple of the decrypted password (or None) and an error message (or None) """
+        if not username:
+            return None,'Missing User Name'
+        record = self.records.get(_db_key(_utf8(username),_utf8(host)))
+        if record is None:
+            return None,'Record does not exist'
+        return self._password.decrypt(record['rsakey']),None
+
+    def handle_request(self,request):
+        if request.get('file') and os.path.abspath(request['file']) != self.filename:
+            return {'error':'Server does not serve [{0!s}]'.format(request['file'])}
+        op = request.get('op')
+        if op == 'get':
+            password,errmsg = self.lookup(request.get('username'),request.get('host'))
+            return {'password':password,'error':errmsg}
+        elif op == 'get-many':
+            results = []
+            for username,host in request.get('pairs',[]):
+                password,errmsg = self.lookup(username,host)
+                results.append({'username':username,'host':host,'password':password,'error':errmsg})
+            return {'results':results}
+        elif op == 'list':
+            entries = ('{0}@{1}'.format(record['username'],record['host']) for record in self.records.itervalues())
+            if request.get('match'):
+                entries = (entry for entry in entries if fnmatch.fnmatchcase(entry,request['match']))
+            entries = list(entries)
+            if request.get('limit') is not None:
+                entries = entries[:request['limit']]
+            return {'entries':entries}
+        return {'error':'Unknown operation [{0!s}]'.format(op)}
+
+    def close(self):
+        asyncore.dispatcher.close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def _terminate(signum,frame):
+    raise SystemExit(0)
+
+
+def serve(filename,socket_path,poll_interval=1.0,backend=None):
+    """ Run the server until interrupted, checking the file for changes every poll_interval seconds """
+    server = CredentialServer(filename,socket_path,backend)
+    signal.signal(signal.SIGTERM,_terminate)
+    next_check = time.time() + poll_interval
+    try:
+        while True:
+            asyncore.loop(timeout=poll_interval,use_poll=True,count=1)
+            if time.time() >= next_check:
+                server.check_file()
+                next_check = time.time() + poll_interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,223 @@
+"""
+  Name: index.py
+
+  Purpose: Secondary indexes of a password file - host -> dbkeys and username -> dbkeys - so queries like
+           "every account on host X" don't decode every record.
+
+           The index is kept in <data file>.hix: a header, the host entries sorted by host, the username
+           entries sorted by username and a table of the distinct host and username strings.  An entry is
+           (string offset, string length, raw dbkey digest), so a query is a binary search over the
+           mmapped file.  Changes are kept in memory and merged into a new file on save.
+
+           The header carries a digest of a stamp identifying the data file the index describes - its
+           signature (inode, mtime, size) for shelve files, its generation for compact files - and the data
+           size the index covers.  Records a compact file gained after that size are replayed on load.  An
+           index that does not match the data file is ignored and rebuilt with a scan, so a crash or a writer
+           that did not update the index can never make a query return wrong results.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+0.02 jwd3 10/17/2026
+    The stamp is supplied by the storage and the header records the data size covered, for journal replay
+0.03 jwd3 10/17/2026
+    Added the indexed property
+    save wrote the digest of the last entry into the header instead of the stamp digest, so a saved index was
+    never used
+"""
+import os
+import binascii
+import hashlib
+import heapq
+import mmap
+import struct
+
+__all__ = ['SecondaryIndex']
+__version__ = "0.03"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+HOSTS = 0
+USERS = 1
+
+
+def _utf8(value):
+    return value.encode('utf-8') if isinstance(value,unicode) else value
+
+
+class SecondaryIndex(object):
+    """ host -> dbkeys and username -> dbkeys for one data file """
+
+    SUFFIX = '.hix'
+    MAGIC = 'PWDX'
+    VERSION = 2
+    HEADER = struct.Struct('>4sB3x20sQII')  # magic, version, stamp digest, covered data size, host and user counts
+    ENTRY = struct.Struct('>IH32s')  # string table offset, string length, raw dbkey digest
+
+    def __init__(self,mapping=None,counts=(0,0),covered=None):
+        self._map = mapping  # mmap of the index file, None for an index only held in memory
+        self._counts = counts
+        self.covered = covered  # data size covered by the index file, None when not loaded from a file
+        self._pending = {}  # raw dbkey digest -> (host, username) of changes not in the file, None when removed
+
+    def __len__(self):
+        """ Number of changes not in the index file """
+        return len(self._pending)
+
+    @property
+    def dirty(self):
+        return bool(self._pending)
+
+    @property
+    def indexed(self):
+        """ Number of records in the index file """
+        return self._counts[HOSTS]
+
+    @staticmethod
+    def _digest(stamp):
+        return hashlib.sha1(repr(stamp)).digest()
+
+    @classmethod
+    def build(cls,records):
+        """ Build the index from an iterable of (dbkey, record) tuples """
+        index = cls()
+        for dbkey,record in records:
+            index.add(dbkey,record['host'],record['username'])
+        return index
+
+    @classmethod
+    def load(cls,path,stamp):
+        """ Map the index of the data file at path - None when it is missing, damaged or out of date """
+        try:
+            with open(path + cls.SUFFIX,'rb') as index_file:
+                mapping = mmap.mmap(index_file.fileno(),0,access=mmap.ACCESS_READ)
+        except (IOError,ValueError):  # ValueError - an empty file can't be mapped
+            return None
+        if len(mapping) >= cls.HEADER.size:
+            magic,version,digest,covered,hosts,users = cls.HEADER.unpack_from(mapping,0)
+            if (magic == cls.MAGIC and version == cls.VERSION and digest == cls._digest(stamp) and
+                    len(mapping) >= cls.HEADER.size + (hosts + users) * cls.ENTRY.size):
+                return cls(mapping,(hosts,users),covered)
+        mapping.close()
+        return None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def add(self,dbkey,host,username):
+        self._pending[binascii.unhexlify(dbkey)] = (_utf8(host) or '',_utf8(username))
+
+    def discard(self,dbkey):
+        self._pending[binascii.unhexlify(dbkey)] = None
+
+    def _entry(self,section,i):
+        """ (string, raw digest) of entry i of a section """
+        position = self.HEADER.size + (i + (self._counts[HOSTS] if section == USERS else 0)) * self.ENTRY.size
+        offset,length,digest = self.ENTRY.unpack_from(self._map,position)
+        start = self.HEADER.size + sum(self._counts) * self.ENTRY.size + offset
+        return self._map[start:start + length],digest
+
+    def _lower_bound(self,section,value):
+        """ Position of the first entry of a section whose string is not less than value """
+        low,high = 0,self._counts[section] if self._map is not None else 0
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(section,middle)[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _entries(self,section,start=0):
+        """ Generator of the (string, raw digest) entries of a section in the file not replaced by a change """
+        for i in xrange(start,self._counts[section] if self._map is not None else 0):
+            value,digest = self._entry(section,i)
+            if digest not in self._pending:
+                yield value,digest
+
+    def _lookup(self,section,value,prefix=False):
+        """ Set of dbkeys whose host (or username) is value or starts with it """
+        dbkeys = set()
+        for string,digest in self._entries(section,self._lower_bound(section,value)):
+            if string != value and not (prefix and string.startswith(value)):
+                break
+            dbkeys.add(binascii.hexlify(digest))
+        for digest,fields in self._pending.iteritems():
+            if fields is not None and (fields[section] == value or (prefix and fields[section].startswith(value))):
+                dbkeys.add(binascii.hexlify(digest))
+        return dbkeys
+
+    def find(self,host=None,username=None,prefix=None):
+        """
+        dbkeys matching every criteria given
+        :param host: exact host
+        :param username: exact username
+        :param prefix: username prefix
+        :return: sorted list of dbkeys - every dbkey when no criteria is given
+        """
+        matches = []
+        if host is not None:
+            matches.append(self._lookup(HOSTS,_utf8(host)))
+        if username is not None:
+            matches.append(self._lookup(USERS,_utf8(username)))
+        if prefix is not None or not matches:
+            matches.append(self._lookup(USERS,_utf8(prefix) or '',prefix=True))
+        matches.sort(key=len)
+        return sorted(matches[0].intersection(*matches[1:]))
+
+    def _merged(self,section):
+        """ Generator of the (string, raw digest) entries of a section with the changes merged in order """
+        changes = sorted((fields[section],digest) for digest,fields in self._pending.iteritems() if fields is not None)
+        return heapq.merge(self._entries(section),changes)
+
+    def save(self,path,stamp,covered=0):
+        """
+        Write the index of the data file at path and map the new file.  The index is derived data - a
+        failed write is ignored (the changes stay in memory) and the index rebuilt by the next query.
+        :param stamp: stamp identifying the data file the index describes
+        :param covered: data size the index covers
+        """
+        stamp_digest = self._digest(stamp)
+        temp_path = '{0}{1}.tmp{2}'.format(path,self.SUFFIX,os.getpid())
+        try:
+            with open(temp_path,'wb') as index_file:
+                index_file.write(self.HEADER.pack(self.MAGIC,self.VERSION,stamp_digest,covered,0,0))
+                strings = []
+                size = 0
+                counts = []
+                for section in (HOSTS,USERS):
+                    count = 0
+                    last = offset = None
+                    for value,digest in self._merged(section):
+                        if value != last:
+                            strings.append(value)
+                            offset,last = size,value
+                            size += len(value)
+                        index_file.write(self.ENTRY.pack(offset,len(value),digest))
+                        count += 1
+                    counts.append(count)
+                index_file.write(''.join(strings))
+                index_file.seek(0)
+                index_file.write(self.HEADER.pack(self.MAGIC,self.VERSION,stamp_digest,covered,counts[HOSTS],
+                                                  counts[USERS]))
+            os.rename(temp_path,path + self.SUFFIX)
+            with open(path + self.SUFFIX,'rb') as index_file:
+                mapping = mmap.mmap(index_file.fileno(),0,access=mmap.ACCESS_READ)
+        except (IOError,OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        self.close()
+        self._map = mapping
+        self._counts = tuple(counts)
+        self.covered = covered
+        self._pending = {}
+        return True
@@ -0,0 +1,141 @@
+"""
+  Name: instrument.py
+
+  Purpose: Timers and counters for the storage and crypto operations behind a lookup - opening and
+           closing the data file, the key lookup, unpickling, base64, key derivation and AES - so a slow
+           lookup can be broken down without a profiler.  Instrumentation is off until enabled: every
+           instrumented operation then only checks that the module attribute active is None.
+
+               with instrumented() as stats:
+                   pwd.decrypt()
+               stats.report(sys.stderr)
+
+           Hooks are called with the operation name, elapsed seconds and bytes after every timed
+           operation, e.g. to feed a metrics system.  With profile=True the instrumented code also runs
+           under cProfile and the report ends with the top functions.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+"""
+import time
+from contextlib import contextmanager
+
+__all__ = ['Instrumentation','enable','disable','instrumented']
+__version__ = "0.01"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+active = None  # Instrumentation receiving the timings, None when instrumentation is off
+
+clock = time.time
+
+
+class Instrumentation(object):
+    """ Per operation timers (calls, seconds, bytes) and named counters """
+
+    def __init__(self,profile=False):
+        import threading  # imported here - importing the module must stay cheap
+        self.timers = {}  # operation -> [calls, seconds, bytes]
+        self.counters = {}  # name -> count
+        self.hooks = []
+        self.profile = profile
+        self._profiler = None
+        self._lock = threading.Lock()
+
+    def add_hook(self,hook):
+        """ Call hook(operation, elapsed, nbytes) after every timed operation """
+        self.hooks.append(hook)
+
+    def remove_hook(self,hook):
+        self.hooks.remove(hook)
+
+    def record(self,operation,start,nbytes=0):
+        """ Add an operation started at start (an instrument.clock() value) """
+        elapsed = clock() - start
+        with self._lock:
+            timer = self.timers.get(operation)
+            if timer is None:
+                timer = self.timers[operation] = [0,0.0,0]
+            timer[0] += 1
+            timer[1] += elapsed
+            timer[2] += nbytes
+        for hook in self.hooks:
+            hook(operation,elapsed,nbytes)
+
+    def count(self,name,n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name,0) + n
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def stats(self):
+        """ Timers and counters as a dict """
+        with self._lock:
+            return {'timers':dict((operation,{'calls':calls,'seconds':seconds,'bytes':nbytes})
+                                  for operation,(calls,seconds,nbytes) in self.timers.iteritems()),
+                    'counters':dict(self.counters)}
+
+    def start_profile(self):
+        import cProfile
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def stop_profile(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def report(self,stream,limit=20):
+        """ Write the breakdown of the operations, slowest first, then the top functions when profiled """
+        timers = sorted(self.timers.iteritems(),key=lambda item: -item[1][1])
+        total = sum(seconds for _,seconds,_ in self.timers.itervalues()) or 1.0
+        stream.write('{0:<20} {1:>10} {2:>12} {3:>12} {4:>7} {5:>12}\n'.format('operation','calls','total ms',
+                                                                               'mean us','%','bytes'))
+        for operation,(calls,seconds,nbytes) in timers:
+            stream.write('{0:<20} {1:>10d} {2:>12.3f} {3:>12.1f} {4:>7.1f} {5:>12d}\n'.format(
+                operation,calls,seconds * 1000,seconds / calls * 1e6,seconds / total * 100,nbytes))
+        for name,value in sorted(self.counters.iteritems()):
+            stream.write('{0:<20} {1:>10d}\n'.format(name,value))
+        if self._profiler is not None:
+            import pstats
+            stream.write('\n')
+            pstats.Stats(self._profiler,stream=stream).sort_stats('cumulative').print_stats(limit)
+
+
+def enable(instrumentation=None):
+    """ Start sending the timings to instrumentation (a new Instrumentation by default) - returns it """
+    global active
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    if instrumentation.profile:
+        instrumentation.start_profile()
+    active = instrumentation
+    return instrumentation
+
+
+def disable():
+    """ Stop instrumenting - returns the Instrumentation that was active, or None """
+    global active
+    instrumentation,active = active,None
+    if instrumentation is not None:
+        instrumentation.stop_profile()
+    return instrumentation
+
+
+@contextmanager
+def instrumented(profile=False):
+    """ Instrument the operations run in the with block """
+    instrumentation = enable(Instrumentation(profile))
+    try:
+        yield instrumentation
+    finally:
+        disable()
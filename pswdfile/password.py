@@ -47,25 +47,291 @@ Version History
     Removed print statement
     Code cleanup
     Changed version to 0.xx where xx is a sequential number - major/minor/revision format not needed
+0.11 jwd3 10/17/2026
+    Added PasswordStore to keep the data file open across many operations
+    Added store parameter so Password/Password2 reuse an open PasswordStore session
+0.12 jwd3 10/17/2026
+    Replaced datafile.keys() membership checks with keyed access so lookups and deletes don't scan the file
+0.13 jwd3 10/17/2026
+    Added get_many method to decrypt many username/host pairs with a single open of the data file
+0.14 jwd3 10/17/2026
+    Added PasswordStore import_records/export_records for streaming bulk loads and dumps
+0.15 jwd3 10/17/2026
+    Added iter_records generator with optional field projection and rebuilt get_all on it
+0.16 jwd3 10/17/2026
+    Moved data file access to the storage module and added the backend parameter (shelve or compact)
+0.17 jwd3 10/17/2026
+    Added PasswordReader for read-only lookups from a memory mapped compact data file
+0.18 jwd3 10/17/2026
+    Added cache parameter to use a CredentialCache for decrypted passwords
+0.19 jwd3 10/17/2026
+    Data files are locked while open - added lock_timeout and atomic parameters to PasswordStore
+0.20 jwd3 10/17/2026
+    Encrypted passwords are base64 decoded once and sliced with buffers instead of decoded three times
+    Memoized the key derived from the username and host
+    Fixed Password2 encrypt/decrypt - private key methods were name mangled and decrypt sliced the wrong key
+0.21 jwd3 10/17/2026
+    Added encrypt_many/decrypt_many bulk functions with optional worker processes and rekey_file
+0.22 jwd3 10/17/2026
+    pycrypto and multiprocessing are imported on first use so importing the module stays cheap
+0.23 jwd3 10/17/2026
+    Added find to query the host and username secondary index kept by the storage on every store and remove
+0.24 jwd3 10/17/2026
+    PasswordStore operations are thread safe and commit() group commits the writes of concurrent threads
+    Added compact_ratio to PasswordStore for automatic compaction of compact files
+0.25 jwd3 10/17/2026
+    Added AsyncPasswordStore - non-blocking get/put/remove on a pool of worker threads with request
+    coalescing and a limit on the requests in flight
+0.26 jwd3 10/17/2026
+    Opens, closes, key derivation, base64 and AES report their timings to the active instrumentation
+0.27 jwd3 10/17/2026
+    Added SnapshotReader for in-memory lookups from a snapshot file
+0.28 jwd3 10/17/2026
+    Records are PasswordRecords (see record.py) instead of dicts
+0.29 jwd3 10/17/2026
+    Sharded data files are opened through their .shards manifest
+0.30 jwd3 10/17/2026
+    commit fsyncs every file descriptor the storage flush returns, so shelve commits are durable too
+0.31 jwd3 10/17/2026
+    Renamed __store_record and __retrieve_record to _store_record and _retrieve_record - the name mangling made
+    them unreachable from Password2.save_to_file and get_record
+0.32 jwd3 10/17/2026
+    A written password is put into the CredentialCache after the data file is closed, so the next decrypt hits
+0.33 jwd3 10/17/2026
+    A lookup that times out waiting for a writer reports the error instead of raising LockTimeout
+0.34 jwd3 10/17/2026
+    Added PasswordStore.abort - a with block left by an exception aborts the session instead of committing it
+0.35 jwd3 10/17/2026
+    PasswordStore takes an open datafile - ShardedPasswordStore wraps the shards opened by ShardedStorage
 """
 import os
 import sys
 import base64
-import cPickle
-import shelve
-from Crypto.Hash import SHA256
-from Crypto.Cipher import AES
+import itertools
 
-__all__ = ['Password']
-__version__ = "0.10"
+from pswdfile import instrument
+from pswdfile.record import PasswordRecord
+from pswdfile.storage import open_storage,MappedCompactStorage
+
+__all__ = ['Password','PasswordStore','AsyncPasswordStore','StoreBusy','PasswordReader','SnapshotReader',
+           'PasswordRecord','encrypt_many','decrypt_many','rekey_file']
+__version__ = "0.35"
 __date__ = '2003-08-31'
-__updated__ = '05/17/2017'
+__updated__ = '10/17/2026'
+
+
+_DERIVED_KEY_CACHE_SIZE = 4096
+_derived_keys = {}
+
+_BLOCK_SIZE = 16  # AES block size
+_KEY_SIZE = 32  # SHA256 digest size, the AES-256 key size
+_AES = None
+_SHA256 = None
+
+
+def _crypto():
+    """ pycrypto AES and SHA256 modules - imported on the first encrypt, decrypt or key lookup """
+    global _AES,_SHA256
+    if _AES is None:
+        from Crypto.Cipher import AES
+        from Crypto.Hash import SHA256
+        _AES,_SHA256 = AES,SHA256
+    return _AES,_SHA256
+
+
+def _derive_key(username,host=None):
+    """ 32 byte key created from the username and host - memoized as it is the same for every encrypt """
+    cache_key = (username,host)
+    key = _derived_keys.get(cache_key)
+    if key is None:
+        md = _crypto()[1].new()
+        md.update(username)
+        if host:
+            md.update(host)
+            md.update(host[::-1])
+        md.update(username[::-1])
+        key = md.digest()
+        if len(_derived_keys) >= _DERIVED_KEY_CACHE_SIZE:
+            _derived_keys.clear()
+        _derived_keys[cache_key] = key
+    return key
+
+
+def _generate_key():
+    """ Random 32 byte key """
+    return os.urandom(_KEY_SIZE)
+
+
+def _encrypt(password,key):
+    """ Encrypt with AES CBC - returns the raw iv + ciphertext + key bytes """
+    AES = _crypto()[0]
+    pad = _BLOCK_SIZE - len(password) % _BLOCK_SIZE
+    iv = os.urandom(_BLOCK_SIZE)
+    return iv + AES.new(key,AES.MODE_CBC,iv).encrypt(password + chr(pad) * pad) + key
+
+
+def _decrypt(raw):
+    """ Decrypt raw iv + ciphertext + key bytes - the parts are sliced with buffers instead of copied """
+    AES = _crypto()[0]
+    size = len(raw)
+    iv = buffer(raw,0,_BLOCK_SIZE)
+    data = buffer(raw,_BLOCK_SIZE,size - _BLOCK_SIZE - _KEY_SIZE)
+    key = buffer(raw,size - _KEY_SIZE)
+    plain = AES.new(key,AES.MODE_CBC,iv).decrypt(data)
+    return plain[:-ord(plain[-1])]
+
+
+def _b64decode(encrypted_password):
+    """ Decode either base64 flavor - Password2 writes the urlsafe one """
+    if '-' in encrypted_password or '_' in encrypted_password:
+        return base64.urlsafe_b64decode(encrypted_password)
+    return base64.b64decode(encrypted_password)
+
+
+def _encrypt_chunk(chunk):
+    """ Encrypt a list of (username, host, password) - returns (username, host, encrypted password) """
+    result = []
+    for username,host,password in chunk:
+        key = _derive_key(username,host) if username else _generate_key()
+        result.append((username,host,base64.b64encode(_encrypt(password,key))))
+    return result
+
+
+def _decrypt_chunk(chunk):
+    """ Decrypt a list of (username, host, encrypted password) - returns (username, host, password) """
+    return [(username,host,_decrypt(_b64decode(encrypted_password)))
+            for username,host,encrypted_password in chunk]
+
+
+def _rekey_chunk(chunk):
+    """ Re-encrypt a list of (dbkey, record) with a fresh IV and the key derived from the username and host """
+    result = []
+    for dbkey,record in chunk:
+        password = _decrypt(_b64decode(record['rsakey']))
+        rsakey = base64.b64encode(_encrypt(password,_derive_key(record['username'],record['host'])))
+        result.append((dbkey,PasswordRecord(record['host'],record['username'],rsakey)))
+    return result
+
+
+def _map_chunks(func,items,workers,chunk_size):
+    """ Apply func to chunks of items in this process or in a pool of worker processes, keeping the order """
+    chunks = _batches(items,chunk_size)
+    if workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            for result in pool.imap(func,chunks):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for chunk in chunks:
+            yield func(chunk)
+
+
+def encrypt_many(records,workers=1,chunk_size=1000):
+    """
+    Encrypt many passwords without a data file
+    :param records: iterable of (username, host, password) tuples
+    :param workers: number of worker processes, 1 encrypts in this process
+    :param chunk_size: records per chunk handed to a worker
+    :return: generator of (username, host, encrypted password) tuples in input order
+    """
+    return itertools.chain.from_iterable(_map_chunks(_encrypt_chunk,records,workers,chunk_size))
+
+
+def decrypt_many(records,workers=1,chunk_size=1000):
+    """
+    Decrypt many encrypted passwords without a data file
+    :param records: iterable of (username, host, encrypted password) tuples
+    :param workers: number of worker processes, 1 decrypts in this process
+    :param chunk_size: records per chunk handed to a worker
+    :return: generator of (username, host, password) tuples in input order
+    """
+    return itertools.chain.from_iterable(_map_chunks(_decrypt_chunk,records,workers,chunk_size))
+
+
+def rekey_file(data_file_name=None,data_file_dir=None,backend=None,workers=1,chunk_size=1000,progress=None,
+               lock_timeout=10.0):
+    """
+    Re-encrypt every record of a data file in one transactional pass.  The records are written to a new
+    copy of the file that replaces it only when every record was re-encrypted.
+    :param progress: optional callable(count) called after each chunk
+    :return: number of records re-encrypted
+    """
+    path = os.path.join(data_file_dir or '',data_file_name or ".pddatafile")
+    target = open_storage(path,'n',backend,timeout=lock_timeout,atomic=True)  # holds the exclusive lock
+    count = 0
+    try:
+        source = open_storage(path,'r',target.name,lock=False)
+        try:
+            for chunk in _map_chunks(_rekey_chunk,source.iter_records(),workers,chunk_size):
+                for dbkey,record in chunk:
+                    target.put(dbkey,record)
+                count += len(chunk)
+                if progress:
+                    progress(count)
+        finally:
+            source.close()
+    except:
+        target.abort()
+        raise
+    target.close()
+    return count
+
+
+def _batches(iterable,size):
+    """ Group an iterable into lists of at most size items """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _db_key(username,host=None):
+    """ SHA256 hex digest of username@host used as the record key """
+    SHA256 = _crypto()[1]
+    if host and username:
+        return SHA256.new(username + '@' + host).hexdigest()
+    return SHA256.new(username).hexdigest()
+
+
+def _open_datafile(data_file_dir,data_file_name,mode,backend=None,timeout=10.0,atomic=False):
+    """
+    Open and lock the data file storage - a ShardedStorage over the shards of a sharded file
+    :return: tuple of the open storage (or None) and an error message (or None)
+    """
+    if data_file_dir and os.path.isdir(data_file_dir):
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        path = os.path.join(data_file_dir,data_file_name)
+        try:
+            if os.path.exists(path + '.shards'):  # checked here so unsharded files don't import the shard module
+                from pswdfile.shard import ShardedStorage
+                datafile = ShardedStorage(path,mode,timeout,atomic)
+            else:
+                datafile = open_storage(path,mode,backend,timeout=timeout,atomic=atomic)
+        except:
+            value = sys.exc_info()[1]
+            return None,'Cannot open data file - Error {0!s}'.format(value)
+        if inst is not None:
+            inst.record('open',start)
+        return datafile,None
+    else:
+        return None,'Directory [%s] NOT found' % str(data_file_dir)
 
 
 class Password(object):
     """ This class is used to encrypt and decrypt passwords."""
 
-    def __init__(self,host=None,username=None,password=None,data_file_name=None,data_file_dir=None,mode='r'):
+    def __init__(self,host=None,username=None,password=None,data_file_name=None,data_file_dir=None,mode='r',
+                 store=None,backend=None,cache=None):
         self._host = host
         self._username = username
         self._password = password
@@ -81,7 +347,10 @@ class Password(object):
             self._data_file_name = ".pddatafile"
         self._data_file_dir = data_file_dir
         self.mode = 'c' if mode == 'w' else mode
-        self.key_size = (SHA256.block_size * 3) / 8 + SHA256.digest_size
+        self.key_size = (64 * 3) / 8 + _KEY_SIZE  # SHA256 block size is 64
+        self._store = store  # optional PasswordStore session to reuse instead of opening the file
+        self.backend = backend  # storage backend name, None detects it from the file (default shelve)
+        self._cache = cache  # optional CredentialCache of decrypted passwords
 
     def __del__(self):
         """ When destructed, close file"""
@@ -141,19 +410,13 @@ class Password(object):
         """
         Private method: Generate a random key
         """
-        return os.urandom(self.key_size)[:SHA256.digest_size]
+        return _generate_key()
 
     def __create_key(self):
         """
         Private method: Create the key from the username and host
         """
-        md = SHA256.new()
-        md.update(self._username)
-        if self._host:
-            md.update(self._host)
-            md.update(self._host[::-1])
-        md.update(self._username[::-1])
-        return md.digest()  # create 32byte key
+        return _derive_key(self._username,self._host)
 
     def encrypt(self):
         """
@@ -165,19 +428,24 @@ class Password(object):
             self.error = True
             self.errmsg = 'Missing password to encrypt'
         else:
-            if self._username:
-                key = self.__create_key()
+            inst = instrument.active
+            if inst is None:
+                key = self.__create_key() if self._username else self.__generate_key()
+                self._encrypted_pswd = base64.b64encode(_encrypt(self._password,key))
             else:
-                key = self.__generate_key()
-            pad = AES.block_size - len(self._password) % AES.block_size
-            data = self._password + chr(pad) * pad
-            iv = os.urandom(AES.block_size)
-            cipher = AES.new(key,AES.MODE_CBC,iv)
-            self._encrypted_pswd = base64.b64encode(iv + cipher.encrypt(data) + key)
+                start = instrument.clock()
+                key = self.__create_key() if self._username else self.__generate_key()
+                inst.record('derive key',start)
+                start = instrument.clock()
+                raw = _encrypt(self._password,key)
+                inst.record('aes',start,len(raw))
+                start = instrument.clock()
+                self._encrypted_pswd = base64.b64encode(raw)
+                inst.record('base64',start,len(self._encrypted_pswd))
             self.error = False
             self.errmsg = None
             if self._data_file_dir and self._username:
-                self.__store_record()
+                self._store_record()
         return self._encrypted_pswd
 
     def decrypt(self,encrypted_password=None):
@@ -186,25 +454,64 @@ class Password(object):
         :param encrypted_password:
         :return:
         """
+        from_file = False
         if encrypted_password is None:
             if self._username:
-                self.__retrieve_record()
+                if self._cache is not None:
+                    cached = self._cache.get(self.__data_file_path(),self.__create_db_key())
+                    if cached is not None:
+                        self._password = cached
+                        self.error = False
+                        self.errmsg = None
+                        return self._password
+                self._retrieve_record()
                 encrypted_password = self._encrypted_pswd
+                from_file = True
             else:
                 self._password = 'NF'
                 self.error = True
                 self.errmsg = 'Missing User Name'
         if not self.error:
-            iv = base64.b64decode(encrypted_password)[:AES.block_size]
-            key = base64.b64decode(encrypted_password)[-SHA256.digest_size:]
-            data = base64.b64decode(encrypted_password)[AES.block_size:-SHA256.digest_size]
-            cipher = AES.new(key,AES.MODE_CBC,iv)
-            temp_pswd = cipher.decrypt(data)
-            decrypted_pwd = temp_pswd[:-ord(temp_pswd[-1])]
-            self._password = decrypted_pwd
+            inst = instrument.active
+            if inst is None:
+                self._password = _decrypt(base64.b64decode(encrypted_password))
+            else:
+                start = instrument.clock()
+                raw = base64.b64decode(encrypted_password)
+                inst.record('base64',start,len(encrypted_password))
+                start = instrument.clock()
+                self._password = _decrypt(raw)
+                inst.record('aes',start,len(raw))
             self.error = False
+            if from_file and self._cache is not None:
+                self._cache.put(self.__data_file_path(),self.dbkey,self._password)
         return self._password
 
+    def get_many(self,pairs):
+        """
+        Decrypt the passwords for many username/host pairs with a single open of the data file
+        :param pairs: iterable of (username, host) tuples
+        :return: generator of (username, host, password, errmsg) tuples - password is None on error
+        """
+        if self._store is not None and self._store.isOpen:
+            store = self._store
+        else:
+            store = PasswordStore(data_file_name=self._data_file_name,data_file_dir=self._data_file_dir,mode=self.mode,
+                                  backend=self.backend)
+            store.open()
+        self.error = store.error
+        self.errmsg = store.errmsg
+        try:
+            for username,host in pairs:
+                if self.error:
+                    yield username,host,None,self.errmsg
+                else:
+                    password = store.get(username,host)
+                    yield username,host,password,store.errmsg if store.error else None
+        finally:
+            if store is not self._store:
+                store.close()
+
     def remove_record(self):
         """ Remove a record from the data file """
         if not self.isOpen:
@@ -212,8 +519,11 @@ class Password(object):
         if not self.error:
             if self._username:
                 self.__create_db_key()
-                if self.dbkey in self.datafile.keys():
-                    del self.datafile[self.dbkey]
+                if self._cache is not None:
+                    self._cache.discard(self.__data_file_path(),self.dbkey)
+                if self.datafile.delete(self.dbkey):
+                    if self._store is not None:
+                        self._store.note_write()
                 else:
                     self.error = True
                     self.errmsg = 'Record NOT found.'
@@ -223,47 +533,71 @@ class Password(object):
             if self.isOpen:
                 self.__close_datafile()
 
-    def get_all(self):
-        """ Return a list of all the records """
+    def iter_records(self,fields=None):
+        """
+        Iterate the records in the data file without building a list of them
+        :param fields: optional sequence of record fields to return, e.g. ('host','username')
+        :return: generator of PasswordRecords (dicts of the fields when fields is given)
+        """
         if not self.isOpen:
             self.__open_datafile()
         if not self.error:
-            key_list = self.datafile.keys()
-            entry_list = []
-            for key in key_list:
-                if isinstance(self.datafile[key],str):
-                    rec = cPickle.loads(base64.b64decode(self.datafile[key]))
-                else:
-                    rec = self.datafile[key]
-                entry_list.append(rec)
-            if self.isOpen:
-                self.__close_datafile()
-            return entry_list
-        else:
-            return []
+            try:
+                for _,record in self.datafile.iter_records():
+                    if fields:
+                        record = dict((field,record.get(field)) for field in fields)
+                    yield record
+            finally:
+                if self.isOpen:
+                    self.__close_datafile()
+
+    def find(self,host=None,username=None,prefix=None,fields=None):
+        """
+        Query the records by host and/or username through the secondary index instead of a scan
+        :param host: exact host
+        :param username: exact username
+        :param prefix: username prefix
+        :param fields: optional sequence of record fields to return, e.g. ('host','username')
+        :return: generator of PasswordRecords (dicts of the fields when fields is given) in dbkey order
+        """
+        if not self.isOpen:
+            self.__open_datafile()
+        if not self.error:
+            try:
+                for _,record in self.datafile.find(host,username,prefix):
+                    if fields:
+                        record = dict((field,record.get(field)) for field in fields)
+                    yield record
+            finally:
+                if self.isOpen:
+                    self.__close_datafile()
+
+    def get_all(self):
+        """ Return a list of all the records """
+        return [record for record in self.iter_records()]
+
+    def __data_file_path(self):
+        return os.path.join(self._data_file_dir or '',self._data_file_name)
 
     def __create_db_key(self):
         """ Create the database key for storing """
-        if self._host and self._username:
-            temp_key = self._username + '@' + self._host
-        else:
-            temp_key = self._username
-        self.dbkey = SHA256.new(temp_key).hexdigest()
+        self.dbkey = _db_key(self._username,self._host)
         return self.dbkey
 
-    def __retrieve_record(self):
+    def _retrieve_record(self):
         """ Retrieve a record from the password database """
         if not self.isOpen:
             self.__open_datafile()
         if not self.error:
             if self._username:
                 self.__create_db_key()
-                if self.dbkey in self.datafile.keys():
-                    record = self.datafile[self.dbkey]
-                    if isinstance(record,str):
-                        self.record = cPickle.loads(base64.b64decode(record))
-                    else:
-                        self.record = record
+                errmsg = 'Record does not exist'
+                try:
+                    self.record = self.datafile.get(self.dbkey)
+                except IOError:  # a shelve reader timed out waiting for a writer
+                    self.record = None
+                    errmsg = 'Cannot read data file - Error {0!s}'.format(sys.exc_info()[1])
+                if self.record is not None:
                     self._host = self.record['host']
                     self._username = self.record['username']
                     self._encrypted_pswd = self.record['rsakey']
@@ -271,7 +605,7 @@ class Password(object):
                 else:
                     self._encrypted_pswd = ''
                     self.error = True
-                    self.errmsg = 'Record does not exist'
+                    self.errmsg = errmsg
                     self.record = None
             else:
                 self.error = True
@@ -280,54 +614,63 @@ class Password(object):
             if self.isOpen:
                 self.__close_datafile()
 
-    def __store_record(self):
+    def _store_record(self):
         """ Store the record in the database """
-        self.record = {'host':self._host,'username':self._username,'rsakey':self._encrypted_pswd}
+        self.record = PasswordRecord(self._host,self._username,self._encrypted_pswd)
+        stored = False
         if not self.isOpen:
             self.__open_datafile()
         if not self.error:
             self.__create_db_key()
             try:
-                self.datafile[self.dbkey] = base64.b64encode(cPickle.dumps(self.record))
+                self.datafile.put(self.dbkey,self.record)
                 self.error = False
                 self.errmsg = None
+                stored = True
+                if self._store is not None:
+                    self._store.note_write()
             except:
                 value = sys.exc_info()[1]
                 self.error = False
                 self.errmsg = 'Cannot write to data file - Error {0!s}'.format(value)
         if self.isOpen:
             self.__close_datafile()
+        if stored and not self.error and self._cache is not None:
+            # cached once the file is closed - the close changes the file signature the cache checks
+            self._cache.put(self.__data_file_path(),self.dbkey,self._password)
 
     def __open_datafile(self):
-        """ Open the password file """
-        if os.path.isdir(self._data_file_dir):
-            try:
-                self.datafile = shelve.open(os.path.join(self._data_file_dir,self._data_file_name),flag=self.mode)
-            except:
-                self.isOpen = False
-                self.error = True
-                value = sys.exc_info()[1]
-                self.errmsg = 'Cannot open data file - Error {0!s}'.format(value)
-            else:
-                self.isOpen = True
-                self.error = False
-                self.errmsg = None
-        else:
+        """ Open the password file or attach to the open PasswordStore session """
+        if self._store is not None and self._store.isOpen:
+            self.datafile = self._store.datafile
+            self.isOpen = True
+            self.error = False
+            self.errmsg = None
+            return
+        self.datafile,errmsg = _open_datafile(self._data_file_dir,self._data_file_name,self.mode,self.backend)
+        if errmsg:
             self.isOpen = False
             self.error = True
-            if not os.path.isdir(self._data_file_dir):
-                self.errmsg = 'Directory [%s] NOT found' % str(self._data_file_dir)
-            elif not os.path.isfile(self._data_file_name):
-                self.errmsg = 'File [{0!s}] NOT found in directory {1!s}'.format(self._data_file_name,
-                                                                                 self._data_file_dir)
-            else:
-                self.errmsg = 'Cannot open data file'
+            self.errmsg = errmsg
+        else:
+            self.isOpen = True
+            self.error = False
+            self.errmsg = None
 
     def __close_datafile(self):
         """ explicitly close the data file """
         # data_file_dir and data_file_name have to be set or the file couldn't be open
+        if self._store is not None and self.datafile is self._store.datafile:
+            # the session owns the handle - just detach from it
+            self.isOpen = False
+            return
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
         try:
             self.datafile.close()
+            if inst is not None:
+                inst.record('close',start)
         except:
             self.isOpen = False
             self.error = True
@@ -341,8 +684,9 @@ class Password2(Password):
     """ This class is used to encrypt and decrypt passwords.
         This version uses urlsafe b64 encode and decode and other enhancements."""
 
-    def __init__(self,host=None,username=None,password=None,data_file_name=None,data_file_dir=None,mode='r',key=None):
-        super(Password2,self).__init__(host,username,password,data_file_name,data_file_dir,mode)
+    def __init__(self,host=None,username=None,password=None,data_file_name=None,data_file_dir=None,mode='r',key=None,
+                 store=None,backend=None):
+        super(Password2,self).__init__(host,username,password,data_file_name,data_file_dir,mode,store,backend)
         if key:
             self.key = base64.urlsafe_b64decode(key)
         else:
@@ -367,14 +711,10 @@ class Password2(Password):
             if self.key:
                 key = self.key
             elif self._username:
-                key = self.__create_key()
+                key = _derive_key(self._username,self._host)
             else:
-                key = self.__generate_key()
-            pad = AES.block_size - len(plain_password) % AES.block_size
-            data = plain_password + chr(pad) * pad
-            iv = os.urandom(AES.block_size)
-            cipher = AES.new(key,AES.MODE_CBC,iv)
-            self._encrypted_pswd = base64.urlsafe_b64encode(iv + cipher.encrypt(data) + key)
+                key = _generate_key()
+            self._encrypted_pswd = base64.urlsafe_b64encode(_encrypt(plain_password,key))
             self.error = False
             self.errmsg = None
         return self._encrypted_pswd
@@ -385,7 +725,7 @@ class Password2(Password):
         :return:
         """
         if self._data_file_dir and self._username:
-            self.__store_record()
+            self._store_record()
 
     def decrypt(self,encrypted_password=None):
         """
@@ -398,13 +738,7 @@ class Password2(Password):
             self.error = True
             self.errmsg = 'Missing encrypted password'
         else:
-            iv = base64.urlsafe_b64decode(encrypted_password)[:AES.block_size]
-            key = base64.urlsafe_b64decode(encrypted_password)[SHA256.digest_size:]
-            data = base64.urlsafe_b64decode(encrypted_password)[AES.block_size:SHA256.digest_size]
-            cipher = AES.new(key,AES.MODE_CBC,iv)
-            temp_pswd = cipher.decrypt(data)
-            decrypted_pwd = temp_pswd[:-ord(temp_pswd[-1])]
-            self._password = decrypted_pwd
+            self._password = _decrypt(base64.urlsafe_b64decode(encrypted_password))
             self.error = False
         return self._password
 
@@ -414,8 +748,534 @@ class Password2(Password):
         :return:
         """
         if self._username:
-            self.__retrieve_record()
+            self._retrieve_record()
         else:
             self._password = 'NF'
             self.error = True
             self.errmsg = 'Missing User Name'
+
+
+class PasswordStore(object):
+    """ Session that keeps the data file open across many get/put/remove calls.
+
+        with PasswordStore(data_file_name='.pddatafile',data_file_dir='/tmp',mode='c') as store:
+            store.put('scott','dbhost','tiger')
+            password = store.get('scott','dbhost')
+
+        flush_every controls when writes are synced to disk: 0 syncs only on close,
+        1 syncs after every write and N syncs after every N writes.
+        backend names the storage format (see pswdfile.storage), None detects it from the file.
+        cache is an optional CredentialCache shared by every operation in the session.
+        A writer session locks the data file for the whole session - writers one at a time - and opening
+        waits up to lock_timeout seconds for other writers.  A reader session of a shelve file only takes
+        the shared lock for each lookup, so it never holds writers up.  With atomic=True a session writes
+        to a copy that replaces the file on close - readers only wait for it then.
+        compact_ratio enables automatic compaction of a compact file on close (see CompactStorage).
+        datafile is an already open storage (see pswdfile.storage) for the session to use instead of opening
+        the data file - the session closes it.
+        A with block left by an exception aborts the session (see abort) instead of closing it.
+
+        Threads may share a session - operations are serialized.  A thread that needs its writes on disk
+        calls commit() after them: the writes of every thread are committed together with one fsync
+        (group commit) instead of one fsync per writer."""
+
+    def __init__(self,data_file_name=None,data_file_dir=None,mode='r',flush_every=0,backend=None,cache=None,
+                 lock_timeout=10.0,atomic=False,compact_ratio=None,datafile=None):
+        self._data_file_name = data_file_name or ".pddatafile"
+        self._data_file_dir = data_file_dir
+        self.mode = 'c' if mode == 'w' else mode
+        self.backend = backend
+        self.cache = cache
+        self.lock_timeout = lock_timeout
+        self.atomic = atomic
+        self.flush_every = flush_every
+        self.compact_ratio = compact_ratio
+        self.datafile = datafile
+        self.isOpen = datafile is not None
+        self.error = False
+        self.errmsg = None
+        self._unflushed = 0
+        import threading  # imported here - a single lookup with Password doesn't need it
+        self._lock = threading.RLock()  # serializes the operations of threads sharing the session
+        self._commit = threading.Condition(threading.Lock())
+        self._written = 0  # writes made through the session
+        self._committed = 0  # writes made durable by the last commit
+        self._committing = False
+
+    def __enter__(self):
+        self.open()
+        if self.error:
+            raise IOError(self.errmsg)
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def __del__(self):
+        """ When destructed, close file"""
+        if self.isOpen:
+            self.close()
+
+    @property
+    def data_file_dir(self):
+        return self._data_file_dir
+
+    @property
+    def data_file_name(self):
+        return self._data_file_name
+
+    def is_error(self):
+        return self.error
+
+    def get_error_message(self):
+        return 'ERROR: ' + self.errmsg
+
+    def open(self):
+        """ Open the data file for the session """
+        with self._lock:
+            if not self.isOpen:
+                self.datafile,errmsg = _open_datafile(self._data_file_dir,self._data_file_name,self.mode,
+                                                      self.backend,self.lock_timeout,self.atomic)
+                self.isOpen = errmsg is None
+                self.error = errmsg is not None
+                self.errmsg = errmsg
+                if self.isOpen and self.compact_ratio is not None:
+                    self.datafile.compact_ratio = self.compact_ratio
+
+    def close(self):
+        """ Flush pending writes and close the data file """
+        self.__close(abort=False)
+
+    def abort(self):
+        """
+        Close the data file without committing the session - an atomic session's copy is thrown away, so
+        none of its writes reach the file.  Other sessions skip the final sync but keep the writes already
+        made in place.  Leaving a with block with an exception aborts the session.
+        """
+        self.__close(abort=True)
+        if self.cache is not None:
+            self.cache.clear()  # it may hold passwords written by the session
+
+    def __close(self,abort):
+        with self._commit:
+            while self._committing:  # the fsync of a commit uses the open file
+                self._commit.wait()
+        with self._lock:
+            if self.isOpen:
+                inst = instrument.active
+                if inst is not None:
+                    start = instrument.clock()
+                try:
+                    if abort:
+                        self.datafile.abort()
+                    else:
+                        self.datafile.close()
+                    if inst is not None:
+                        inst.record('close',start)
+                except:
+                    value = sys.exc_info()[1]
+                    self.error = True
+                    self.errmsg = 'Cannot close data file!\nError %s' % str(value)
+                self.isOpen = False
+                self.datafile = None
+                self._unflushed = 0
+
+    def flush(self):
+        """ Sync pending writes to disk without closing the session """
+        with self._lock:
+            if self.isOpen:
+                self.datafile.sync()
+            self._unflushed = 0
+
+    def commit(self):
+        """
+        Make every write made through the session so far durable.  Concurrent callers are committed
+        together: one thread flushes and fsyncs while the others wait for it, and writes keep going
+        while the fsync runs.  Must not be called while a session operation is in progress.
+        """
+        with self._commit:
+            ticket = self._written
+            while self._committed < ticket:
+                if self._committing:
+                    self._commit.wait()
+                    continue
+                self._committing = True
+                covered = self._written
+                self._commit.release()
+                try:
+                    with self._lock:
+                        fds = self.datafile.flush() if self.isOpen else []
+                    for fd in fds:
+                        os.fsync(fd)
+                finally:
+                    self._commit.acquire()
+                    self._committing = False
+                    self._committed = max(self._committed,covered)
+                    self._commit.notify_all()
+
+    def note_write(self):
+        """ Called after each write made through the session to apply the flush policy """
+        with self._commit:
+            self._written += 1
+        self._unflushed += 1
+        if self.flush_every and self._unflushed >= self.flush_every:
+            self.flush()
+
+    def __password(self,username,host,password=None):
+        return Password(host=host,username=username,password=password,data_file_name=self._data_file_name,
+                        data_file_dir=self._data_file_dir,mode=self.mode,store=self,backend=self.backend,
+                        cache=self.cache)
+
+    def __track(self,pwd):
+        """ Copy the error state of the last operation to the session """
+        self.error = pwd.error
+        self.errmsg = pwd.errmsg
+
+    def get(self,username,host=None):
+        """
+        Get the decrypted password for a username and host
+        :return: password or None if not found
+        """
+        with self._lock:
+            pwd = self.__password(username,host)
+            password = pwd.decrypt()
+            self.__track(pwd)
+            return None if self.error else password
+
+    def put(self,username,host,password):
+        """
+        Add or update the password for a username and host
+        :return: encrypted password
+        """
+        with self._lock:
+            pwd = self.__password(username,host,password)
+            encrypted_password = pwd.encrypt()
+            self.__track(pwd)
+            return encrypted_password
+
+    def remove(self,username,host=None):
+        """
+        Remove the entry for a username and host
+        :return: True if removed
+        """
+        with self._lock:
+            pwd = self.__password(username,host)
+            pwd.remove_record()
+            self.__track(pwd)
+            return not self.error
+
+    def import_records(self,records,batch_size=1000,progress=None):
+        """
+        Encrypt and write records in batches, syncing the data file after each batch
+        :param records: iterable of (username, host, password) tuples
+        :param batch_size: number of records written between syncs
+        :param progress: optional callable(written, failed) called after each batch
+        :return: tuple of the number of records written and failed
+        """
+        written = failed = 0
+        errmsg = None
+        for batch in _batches(records,batch_size):
+            for username,host,password in batch:
+                self.put(username,host,password)
+                if self.error:
+                    failed += 1
+                    errmsg = errmsg or self.errmsg
+                else:
+                    written += 1
+            self.flush()
+            if progress:
+                progress(written,failed)
+        self.error = failed > 0
+        self.errmsg = errmsg
+        return written,failed
+
+    def export_records(self):
+        """
+        Decrypt every record in the data file
+        :return: generator of (username, host, password) tuples
+        """
+        pwd = Password()
+        for record in Password(store=self).iter_records():
+            yield record['username'],record['host'],pwd.decrypt(record['rsakey'])
+
+
+class StoreBusy(IOError):
+    """ AsyncPasswordStore has max_pending requests in flight and was asked not to wait """
+
+
+class AsyncPasswordStore(object):
+    """ Non-blocking front end of a PasswordStore session for event driven services.
+
+        Every operation returns at once with a multiprocessing AsyncResult (get(timeout), ready(), wait())
+        while the disk and crypto work runs on a bounded pool of worker threads.  Concurrent gets of the
+        same username/host share one lookup.  At most max_pending requests are in flight - further calls
+        wait for a slot, or raise StoreBusy when block is False.  Writes are group committed (see
+        PasswordStore.commit) unless durable is False.
+
+        with AsyncPasswordStore(data_file_dir='/tmp',workers=4) as store:
+            results = [store.get(username,host) for username,host in pairs]
+            passwords = [result.get() for result in results]
+
+        Operations on the same username/host submitted without waiting for each other may complete in any
+        order - wait for a put before reading the entry back."""
+
+    def __init__(self,data_file_name=None,data_file_dir=None,mode='r',workers=4,max_pending=1000,block=True,
+                 durable=True,backend=None,cache=None,lock_timeout=10.0):
+        import threading
+        from multiprocessing.pool import ThreadPool
+        self._store = PasswordStore(data_file_name=data_file_name,data_file_dir=data_file_dir,mode=mode,
+                                    backend=backend,cache=cache,lock_timeout=lock_timeout)
+        self.workers = workers
+        self.block = block
+        self.durable = durable
+        self.lookups = 0  # gets that ran a lookup
+        self.coalesced = 0  # gets that shared the lookup of an earlier get
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._inflight = {}  # (username, host) -> AsyncResult of the running get
+        self._inflight_lock = threading.Lock()
+        self._pool_class = ThreadPool
+        self._pool = None
+
+    def __enter__(self):
+        self.open()
+        if self.error:
+            raise IOError(self.errmsg)
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+        return False
+
+    @property
+    def error(self):
+        return self._store.error
+
+    @property
+    def errmsg(self):
+        return self._store.errmsg
+
+    def is_error(self):
+        return self._store.is_error()
+
+    def get_error_message(self):
+        return self._store.get_error_message()
+
+    def open(self):
+        """ Open the data file and start the worker threads """
+        self._store.open()
+        if self._store.isOpen and self._pool is None:
+            self._pool = self._pool_class(self.workers)
+
+    def close(self):
+        """ Wait for the requests in flight and close the data file """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._store.close()
+
+    def __acquire(self):
+        """ Take a request slot - waits for one unless block is False """
+        if not self._slots.acquire(self.block):
+            raise StoreBusy('{0:d} requests in flight'.format(self.max_pending))
+
+    def __submit(self,func,*args):
+        """ Run func on a worker - the caller holds a request slot, released by func """
+        try:
+            return self._pool.apply_async(func,args)
+        except:
+            self._slots.release()
+            raise
+
+    def __lookup(self,key,submitted):
+        try:
+            return self._store.get(*key)
+        finally:
+            with self._inflight_lock:
+                if self._inflight.get(key) is submitted[0]:
+                    del self._inflight[key]
+            self._slots.release()
+
+    def __write(self,key,func,*args):
+        with self._inflight_lock:  # later gets must not share a lookup made before the write
+            self._inflight.pop(key,None)
+        try:
+            result = func(*args)
+            if self.durable:
+                self._store.commit()
+            return result
+        finally:
+            self._slots.release()
+
+    def get(self,username,host=None):
+        """
+        Get the decrypted password for a username and host
+        :return: AsyncResult of the password, None if not found
+        """
+        key = (username,host)
+        with self._inflight_lock:
+            result = self._inflight.get(key)
+            if result is not None:
+                self.coalesced += 1
+                return result
+        self.__acquire()  # not holding the lock - workers need it to give their slots back
+        with self._inflight_lock:
+            result = self._inflight.get(key)
+            if result is not None:
+                self._slots.release()
+                self.coalesced += 1
+                return result
+            submitted = []
+            result = self._inflight[key] = self.__submit(self.__lookup,key,submitted)
+            submitted.append(result)
+            self.lookups += 1
+        return result
+
+    def put(self,username,host,password):
+        """
+        Add or update the password for a username and host
+        :return: AsyncResult of the encrypted password
+        """
+        self.__acquire()
+        return self.__submit(self.__write,(username,host),self._store.put,username,host,password)
+
+    def remove(self,username,host=None):
+        """
+        Remove the entry for a username and host
+        :return: AsyncResult of True if removed
+        """
+        self.__acquire()
+        return self.__submit(self.__write,(username,host),self._store.remove,username,host)
+
+    def iter_records(self,fields=None,batch_size=1000):
+        """
+        Iterate the records with the next batch read by a worker while the current one is consumed
+        :param fields: optional sequence of record fields to return, e.g. ('host','username')
+        :return: generator of record dicts
+        """
+        records = Password(store=self._store).iter_records(fields)
+
+        def next_batch():
+            with self._store._lock:
+                return list(itertools.islice(records,batch_size))
+
+        pending = self._pool.apply_async(next_batch)
+        while True:
+            batch = pending.get()
+            if not batch:
+                break
+            pending = self._pool.apply_async(next_batch)
+            for record in batch:
+                yield record
+
+
+class PasswordReader(object):
+    """ Read-only lookups from a compact data file mapped into memory.
+
+        The index is held in a dict and the records are read from the mapping, so a lookup makes no
+        system calls.  Create the reader before forking worker processes to share the mapped pages.
+        Legacy shelve files must be converted first with pwutil migrate.  Raises IOError or ValueError
+        if the file cannot be mapped."""
+
+    def __init__(self,data_file_name=None,data_file_dir=None):
+        self._data_file_name = data_file_name or ".pddatafile"
+        self._data_file_dir = data_file_dir
+        self.datafile = MappedCompactStorage(os.path.join(data_file_dir or '',self._data_file_name))
+        self.error = False
+        self.errmsg = None
+        self._password = Password()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+        return False
+
+    def is_error(self):
+        return self.error
+
+    def get_error_message(self):
+        return 'ERROR: ' + self.errmsg
+
+    def reload(self):
+        """ Pick up records written since the reader was created """
+        self.datafile.reload()
+
+    def close(self):
+        self.datafile.close()
+
+    def get(self,username,host=None):
+        """
+        Get the decrypted password for a username and host
+        :return: password or None if not found
+        """
+        if not username:
+            self.error = True
+            self.errmsg = 'Missing User Name'
+            return None
+        record = self.datafile.get(_db_key(username,host))
+        if record is None:
+            self.error = True
+            self.errmsg = 'Record does not exist'
+            return None
+        self.error = False
+        self.errmsg = None
+        return self._password.decrypt(record['rsakey'])
+
+
+class SnapshotReader(object):
+    """ Lookups from a snapshot file written by pwutil snapshot.
+
+        The snapshot is read and integrity checked once when the reader is created, then a lookup is a
+        perfect hash probe in memory that decrypts only the requested entry - no system calls.  key is
+        the urlsafe base64 key of an encrypted snapshot.  Raises IOError or ValueError if the snapshot
+        cannot be loaded."""
+
+    def __init__(self,path,key=None):
+        from pswdfile.snapshot import Snapshot,decode_key  # imported here - most users never load a snapshot
+        self.snapshot = Snapshot(path,decode_key(key) if key else None)
+        self.error = False
+        self.errmsg = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def is_error(self):
+        return self.error
+
+    def get_error_message(self):
+        return 'ERROR: ' + self.errmsg
+
+    def close(self):
+        self.snapshot = None
+
+    def get(self,username,host=None):
+        """
+        Get the decrypted password for a username and host
+        :return: password or None if not in the snapshot
+        """
+        if not username:
+            self.error = True
+            self.errmsg = 'Missing User Name'
+            return None
+        record = self.snapshot.get(_db_key(username,host))
+        if record is None:
+            self.error = True
+            self.errmsg = 'Record does not exist'
+            return None
+        self.error = False
+        self.errmsg = None
+        return _decrypt(record['ciphertext'])
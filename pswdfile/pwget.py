@@ -0,0 +1,103 @@
+"""
+pwget.py - Lightweight entry point for looking up one password from shell scripts.  It does the same as
+           "pwutil get" without loading click, so each call only pays for the modules the lookup needs.
+
+    pwget FILENAME USERNAME HOST [--socket PATH]
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries, Inc. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History:
+0.01 jwd3 10/17/2026
+    Initial creation
+0.02 jwd3 10/17/2026
+    Looks the password up in the right shard of a sharded file
+"""
+import os
+import sys
+
+from pswdfile import __version__ as pkg_version
+
+__version__ = "0.02"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+USAGE = """Usage: pwget [OPTIONS] FILENAME USERNAME HOST
+
+  Get the password for a host and username
+
+Options:
+  -s, --socket PATH  Ask the credential daemon (pwutil serve) listening on this socket
+  --version          Show the version and exit.
+  -h, --help         Show this message and exit.
+"""
+
+
+def parse_args(argv):
+    """
+    Parse the command line
+    :return: tuple of the positional arguments and the socket path (or None)
+    """
+    args = []
+    socket_path = None
+    argv = iter(argv)
+    for arg in argv:
+        if arg in ('-s','--socket'):
+            socket_path = next(argv,None)
+            if socket_path is None:
+                raise ValueError('Option {0} requires an argument.'.format(arg))
+        elif arg.startswith('--socket='):
+            socket_path = arg.split('=',1)[1]
+        elif arg == '--':
+            args.extend(argv)
+        elif arg.startswith('-') and arg != '-':
+            raise ValueError('no such option: {0}'.format(arg))
+        else:
+            args.append(arg)
+    if len(args) != 3:
+        raise ValueError('Expected FILENAME USERNAME HOST, got {0:d} argument(s).'.format(len(args)))
+    return args,socket_path
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if '-h' in argv or '--help' in argv:
+        sys.stdout.write(USAGE)
+        return 0
+    if '--version' in argv:
+        sys.stdout.write('pwget, version {0}\n'.format(pkg_version))
+        return 0
+    try:
+        (filename,username,host),socket_path = parse_args(argv)
+    except ValueError as e:
+        sys.stderr.write('{0}Error: {1!s}\n'.format(USAGE.split('\n\n')[0] + '\n',e))
+        return 2
+    filename = os.path.realpath(filename)
+    if socket_path:
+        from pswdfile.client import Client
+        pwd = Client(socket_path,filename)
+        password = pwd.get(username,host)
+    elif os.path.exists(filename + '.shards'):  # sharded - checked here so unsharded lookups don't import shard
+        from pswdfile.shard import ShardedPasswordStore
+        pwd = ShardedPasswordStore(data_file_dir=os.path.dirname(filename),data_file_name=os.path.basename(filename))
+        pwd.open()
+        password = pwd.get(username,host)
+        pwd.close()
+    else:
+        from pswdfile.password import Password
+        pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='r')
+        pwd.host = host
+        pwd.username = username
+        password = pwd.decrypt()
+    if pwd.is_error():
+        sys.stdout.write('{0!s}\n'.format(pwd.get_error_message()))
+        return 1
+    sys.stdout.write('{0!s}\n'.format(password))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -38,22 +38,157 @@ Version History:
     Changed version to 0.xx where xx is sequential number - major/minor/revisions not needed
     Replaced argparse with click
     Removed adminuser check
+0.11 jwd3 10/17/2026
+    Added get-many command to resolve many username/host pairs in one run as JSON lines
+0.12 jwd3 10/17/2026
+    Added import and export commands for CSV and JSON lines files
+0.13 jwd3 10/17/2026
+    Changed list to stream entries and added --limit and --match options
+0.14 jwd3 10/17/2026
+    Added migrate command to copy a password file into another storage format
+0.15 jwd3 10/17/2026
+    Changed get and list to open the file read-only
+0.16 jwd3 10/17/2026
+    Added serve command to run the credential daemon and the --socket option on get
+0.17 jwd3 10/17/2026
+    Added rekey command to re-encrypt every entry in one transactional pass
+0.18 jwd3 10/17/2026
+    csv and json are imported by the commands that use them - pycrypto and shelve are loaded on first use
+    by the password and storage modules, see pwget for a click-free get
+0.19 jwd3 10/17/2026
+    Added --host and --user options to list that query the secondary index
+0.20 jwd3 10/17/2026
+    Added compact command to rewrite a file with only its live entries
+0.21 jwd3 10/17/2026
+    Added --profile to print a breakdown of the storage and crypto time of any command and the stats command
+0.22 jwd3 10/17/2026
+    Added reshard command to split a file into shards - get, add, update, remove, list, import and export
+    use the shards of a sharded file
+0.23 jwd3 10/17/2026
+    Added snapshot command to write selected entries to a snapshot file for SnapshotReader
+0.24 jwd3 10/17/2026
+    Added --backend to choose the storage format of new files - sqlite is one of the choices
+0.25 jwd3 10/17/2026
+    Added batch and shell commands to run many commands through one open session
+0.26 jwd3 10/17/2026
+    Added manifest, diff and sync commands to compare files and copy only the entries that differ
+0.27 jwd3 10/17/2026
+    migrate, compact and stats work on sharded files
+0.28 jwd3 10/17/2026
+    upsert and open_store take the backend as a parameter so they work outside a pwutil command
+0.29 jwd3 10/17/2026
+    import checks every row before writing and names the line of a bad one
+0.30 jwd3 10/17/2026
+    batch and shell commit with store.commit() - the commit command and --commit-every
+0.31 jwd3 10/17/2026
+    stats reports the file size (every file of the data file) apart from the data size of the backend
 """
 import sys
 import os
+import fnmatch
+import itertools
 import click
 
-from pswdfile.password import Password
+from pswdfile import instrument
+from pswdfile.password import Password,PasswordStore,rekey_file
+from pswdfile.shard import (ShardedPasswordStore,ShardedStorage,is_sharded,reshard_file,iter_shard_records,
+                            open_data_file,compact_shards,shard_path)
+from pswdfile.storage import BACKENDS,open_storage,copy_records,compact_file
 from pswdfile import __version__ as pkg_version
 
-__version__ = "0.10"
+__version__ = "0.31"
 __date__ = '01/20/2005'
-__updated__ = '05/17/2017'
+__updated__ = '10/17/2026'
 
 
-def upsert(filename,host,username,password):
-    """Add entry or update if exists"""
-    pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='c')
+def read_pairs(stream):
+    """Yield (username, host) pairs from lines of "username host" - blank lines and # comments are skipped"""
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            fields = line.split(None,1)
+            yield fields[0],fields[1].strip() if len(fields) > 1 else None
+
+
+def _utf8(value):
+    return value.encode('utf-8') if isinstance(value,unicode) else value
+
+
+def read_records(stream,file_format):
+    """Yield (username, host, password) tuples from a CSV file with a header row or a JSON lines file - raises
+    click.BadParameter naming the line of a row that is not valid JSON or has no username or password"""
+    def invalid(number,problem):
+        return click.BadParameter('line {0:d}: {1}'.format(number,problem),param_hint='INPUT_FILE')
+
+    if file_format == 'csv':
+        import csv
+        reader = csv.DictReader(stream)
+        rows = ((reader.line_num,row) for row in reader)
+    else:
+        import json
+
+        def parse():
+            for number,line in enumerate(stream,1):
+                if line.strip():
+                    try:
+                        yield number,json.loads(line)
+                    except ValueError as e:
+                        raise invalid(number,'not valid JSON - {0!s}'.format(e))
+        rows = parse()
+    for number,row in rows:
+        if not isinstance(row,dict):
+            raise invalid(number,'not a JSON object')
+        for field in ('username','password'):
+            if not isinstance(row.get(field),basestring) or not row[field]:
+                raise invalid(number,'no {0}'.format(field))
+        yield _utf8(row['username']),_utf8(row.get('host') or None),_utf8(row['password'])
+
+
+def checked_input(stream,file_format):
+    """Check every row of stream with read_records before anything is written, so a bad row fails the import
+    without writing any entry.  Returns a copy of stream to import from - held in a temporary file once it
+    grows past a megabyte, so memory stays bounded for any input size."""
+    import tempfile
+    spool = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+
+    def copy():
+        for line in stream:
+            spool.write(line)
+            yield line
+    for _ in read_records(copy(),file_format):
+        pass
+    spool.seek(0)
+    return spool
+
+
+def new_file_backend(filename,backend=None):
+    """Storage format to create the file with - backend (the --backend option, None for shelve) for a new file,
+    None (the format of the file is detected) for an existing one"""
+    if backend is None or any(os.path.exists(filename + suffix)
+                              for storage_class in BACKENDS.values() for suffix in storage_class.SUFFIXES):
+        return None
+    return backend
+
+
+def open_store(filename,mode,flush_every=0,backend=None):
+    """Open a PasswordStore (ShardedPasswordStore for a sharded file) session on the file, created in the backend
+    format when it does not exist - check is_error() before use"""
+    store_class = ShardedPasswordStore if is_sharded(filename) else PasswordStore
+    store = store_class(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename),
+                        mode=mode, flush_every=flush_every, backend=new_file_backend(filename,backend))
+    store.open()
+    return store
+
+
+def upsert(filename,host,username,password,backend=None):
+    """Add entry or update if exists - a new file is created in the backend format (default shelve)"""
+    if is_sharded(filename):
+        store = open_store(filename,'c')
+        store.put(username,host,password)
+        store.close()
+        return (1,store.get_error_message()) if store.is_error() else (0,None)
+    pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='c',
+                   backend=new_file_backend(filename,backend))
     pwd.host = host
     pwd.username = username
     pwd.password = password
@@ -64,37 +199,137 @@ def upsert(filename,host,username,password):
         return 0,None
 
 
+# batch and shell commands - name: (arguments, usage)
+BATCH_COMMANDS = {'get':((2,),'get USERNAME HOST'),
+                  'add':((3,),'add USERNAME HOST PASSWORD'),
+                  'update':((3,),'update USERNAME HOST PASSWORD'),
+                  'remove':((2,),'remove USERNAME HOST'),
+                  'list':((0,1),'list [PATTERN] - username@host entries, optionally matching a shell pattern'),
+                  'commit':((0,),'commit - make the writes so far durable')}
+
+
+def run_batch(store,lines,commit_every=0):
+    """Execute batch commands against an open store - blank lines and # comments are skipped. Arguments are
+    split like a shell does, so quote a password with spaces.  The commit command and every commit_every
+    writes (0 only the commit command) commit the writes so far with store.commit().
+    :return: generator of result dicts with the line number, command and ok flag plus the password (get),
+             the entries (list) or the error"""
+    import shlex
+    writes = 0
+    for number,line in enumerate(lines,1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        result = {'line':number,'command':None,'ok':False}
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            result['error'] = 'Cannot parse the command - {0!s}'.format(e)
+            yield result
+            continue
+        command,args = args[0],args[1:]
+        result['command'] = command
+        store.error,store.errmsg = False,None  # the error state of the last command only
+        if command not in BATCH_COMMANDS:
+            result['error'] = 'Unknown command [{0}]'.format(command)
+        elif len(args) not in BATCH_COMMANDS[command][0]:
+            result['error'] = 'Usage: {0}'.format(BATCH_COMMANDS[command][1])
+        elif command == 'get':
+            password = store.get(*args)
+            if not store.is_error():
+                result['password'] = password
+        elif command in ('add','update'):
+            store.put(*args)
+        elif command == 'remove':
+            store.remove(*args)
+        elif command == 'list':
+            records = store if isinstance(store,ShardedPasswordStore) else Password(store=store)
+            entries = ("{}@{}".format(record.get('username'),record.get('host'))
+                       for record in records.iter_records(fields=('username','host')))
+            result['entries'] = [entry for entry in entries if not args or fnmatch.fnmatchcase(entry,args[0])]
+        else:
+            store.commit()
+        if 'error' not in result:
+            result['ok'] = not store.is_error()
+            if store.is_error():
+                result['error'] = store.errmsg
+            elif command in ('add','update','remove'):
+                writes += 1
+                if commit_every and writes % commit_every == 0:
+                    store.commit()
+        yield result
+
+
+def print_report(instrumentation):
+    """Stop instrumenting and print the breakdown to stderr"""
+    instrument.disable()
+    instrumentation.report(click.get_text_stream('stderr'))
+
+
 @click.group()
 @click.version_option(version=pkg_version)
-def main():
+@click.option('--profile',is_flag=True,
+              help='Print where the command spent its time (storage and crypto operations, then cProfile) to stderr')
+@click.option('--backend',type=click.Choice(sorted(BACKENDS)),default=None,
+              help='Storage format of files created by add, update and import (default shelve) - the format of '
+                   'an existing file is detected')
+@click.pass_context
+def main(ctx,profile,backend):
     """Manage encrypted passwords for host and username in a file"""
-    pass
+    ctx.obj = backend
+    if profile:
+        instrumentation = instrument.enable(instrument.Instrumentation(profile=True))
+        ctx.call_on_close(lambda: print_report(instrumentation))
 
 
 @main.command()
 @click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
 @click.argument('username')
 @click.argument('host')
-def get(filename,username,host):
+@click.option('--socket','-s','socket_path',type=click.Path(dir_okay=False),default=None,
+              help='Ask the credential daemon (pwutil serve) listening on this socket')
+def get(filename,username,host,socket_path):
     """Get the password for a host and username"""
-    pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='c')
-    pwd.host = host
-    pwd.username = username
-    password = pwd.decrypt()
+    if socket_path:
+        from pswdfile.client import Client
+        pwd = Client(socket_path,filename)
+        password = pwd.get(username,host)
+    elif is_sharded(filename):
+        pwd = open_store(filename,'r')
+        password = pwd.get(username,host)
+        pwd.close()
+    else:
+        pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='r')
+        pwd.host = host
+        pwd.username = username
+        password = pwd.decrypt()
     if pwd.is_error():
         click.echo(pwd.get_error_message())
     else:
         click.echo(password)
 
 
+@main.command('get-many')
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--input','-i','input_file',type=click.File('r'),default='-',
+              help='File of "username host" lines (default stdin)')
+def get_many(filename,input_file):
+    """Get the passwords for many username/host pairs as JSON lines"""
+    import json
+    pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='r')
+    for username,host,password,errmsg in pwd.get_many(read_pairs(input_file)):
+        click.echo(json.dumps({'username':username,'host':host,'password':password,'error':errmsg}))
+
+
 @main.command()
 @click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
 @click.argument('username')
 @click.argument('host')
 @click.argument('password')
-def add(filename,username,host,password):
+@click.pass_obj
+def add(backend,filename,username,host,password):
     """Add new entry in password file"""
-    rc,errm = upsert(filename,host,username,password)
+    rc,errm = upsert(filename,host,username,password,backend)
     if rc:
         message = "Failed to add entry [{hostname}/{username}]\n{errm}"
         message = message.format(errm=errm, hostname=host, username=username)
@@ -108,9 +343,10 @@ def add(filename,username,host,password):
 @click.argument('username')
 @click.argument('host')
 @click.argument('password')
-def update(filename,username,host,password):
+@click.pass_obj
+def update(backend,filename,username,host,password):
     """Update existing entry in password file"""
-    rc, errm = upsert(filename, host, username, password)
+    rc, errm = upsert(filename, host, username, password, backend)
     if rc:
         message = "Failed to add/update entry [{hostname}/{username}]\n{errm}"
         message = message.format(errm=errm, hostname=host, username=username)
@@ -125,10 +361,16 @@ def update(filename,username,host,password):
 @click.argument('host')
 def remove(filename,username,host):
     """Remove entry from password file"""
-    pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='c')
-    pwd.host = host
-    pwd.username = username
-    pwd.remove_record()
+    if is_sharded(filename):
+        pwd = open_store(filename,'c')
+        pwd.remove(username,host)
+        pwd.close()
+    else:
+        pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename),
+                       mode='c')
+        pwd.host = host
+        pwd.username = username
+        pwd.remove_record()
     if pwd.is_error():
         message = "Failed to remove entry [{hostname}/{username}]\n{em}".format(em=pwd.get_error_message(),
                                                                                 hostname=host,
@@ -140,16 +382,419 @@ def remove(filename,username,host):
 
 @main.command()
 @click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
-def list(filename):
+@click.option('--limit','-n',type=click.IntRange(0),default=None,help='Maximum number of entries to list')
+@click.option('--match','-m',default=None,help='Only list username@host entries matching this shell pattern')
+@click.option('--host','-H',default=None,help='Only list entries for this host (uses the index)')
+@click.option('--user','-u','username',default=None,help='Only list entries for this username (uses the index)')
+def list(filename,limit,match,host,username):
     """List entries in password file"""
-    pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename), mode='c')
-    record_list = pwd.get_all()
+    if is_sharded(filename):
+        pwd = open_store(filename,'r')  # the shards are read in parallel
+    else:
+        pwd = Password(data_file_dir=os.path.dirname(filename), data_file_name=os.path.basename(filename),
+                       mode='r')
+    if host is not None or username is not None:
+        records = pwd.find(host=_utf8(host),username=_utf8(username),fields=('username','host'))
+    else:
+        records = pwd.iter_records(fields=('username','host'))
+    entries = ("{}@{}".format(record.get('username'),record.get('host')) for record in records)
+    if match:
+        entries = (entry for entry in entries if fnmatch.fnmatchcase(entry,match))
+    for entry in itertools.islice(entries,limit):
+        click.echo(entry)
     if pwd.is_error():
         message = "Failed to get all entries from the file\n{em}".format(em=pwd.get_error_message())
         click.echo(message)
+    if isinstance(pwd,ShardedPasswordStore):
+        pwd.close()
+
+
+@main.command('import')
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('input_file',type=click.File('rb'),default='-')
+@click.option('--format','-f','file_format',type=click.Choice(['csv','jsonl']),default='csv',
+              help='Input format - CSV with username,host,password columns or JSON lines')
+@click.option('--batch-size','-b',type=click.IntRange(1),default=1000,help='Records written between syncs')
+@click.option('--quiet','-q',is_flag=True,help='Do not report progress')
+@click.pass_obj
+def import_file(backend,filename,input_file,file_format,batch_size,quiet):
+    """Add or update entries from a CSV or JSON lines file"""
+    def progress(written,failed):
+        if not quiet:
+            click.echo("{} entries imported, {} failed".format(written,failed),err=True)
+
+    records = checked_input(input_file,file_format)
+    store = open_store(filename,'c',backend=backend)
+    if store.is_error():
+        click.echo("Failed to open the file\n{em}".format(em=store.get_error_message()))
+        return
+    with store:
+        written,failed = store.import_records(read_records(records,file_format),batch_size,progress)
+        if failed:
+            click.echo("Failed to import {} entries\n{}".format(failed,store.get_error_message()))
+        else:
+            click.echo("{} Entries Imported".format(written))
+
+
+@main.command('export')
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('output_file',type=click.File('wb'),default='-')
+@click.option('--format','-f','file_format',type=click.Choice(['csv','jsonl']),default='csv',
+              help='Output format - CSV with username,host,password columns or JSON lines')
+def export_file(filename,output_file,file_format):
+    """Write all entries with decrypted passwords to a CSV or JSON lines file"""
+    store = open_store(filename,'r')
+    if store.is_error():
+        click.echo("Failed to open the file\n{em}".format(em=store.get_error_message()))
+        return
+    with store:
+        if file_format == 'csv':
+            import csv
+            writer = csv.writer(output_file)
+            writer.writerow(['username','host','password'])
+            for record in store.export_records():
+                writer.writerow(record)
+        else:
+            import json
+            for username,host,password in store.export_records():
+                output_file.write(json.dumps({'username':username,'host':host,'password':password}) + '\n')
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--input','-i','input_file',type=click.File('r'),default='-',help='File of commands (default stdin)')
+@click.option('--commit-every','-c',type=click.IntRange(0),default=0,
+              help='Commit after this many writes (default only at the end)')
+@click.pass_obj
+def batch(backend,filename,input_file,commit_every):
+    """Run get, add, update, remove, list and commit commands, one per line, through one open session and
+    print a JSON result line for each - exits 1 when a command failed"""
+    import json
+    store = open_store(filename,'c',backend=backend)
+    if store.is_error():
+        click.echo(json.dumps({'line':0,'command':None,'ok':False,'error':store.errmsg}))
+        sys.exit(1)
+    failed = 0
+    try:
+        for result in run_batch(store,input_file,commit_every):
+            failed += not result['ok']
+            click.echo(json.dumps(result))
+    finally:
+        store.error = False
+        store.close()
+    if store.is_error():
+        click.echo(json.dumps({'line':0,'command':'close','ok':False,'error':store.errmsg}))
+    if failed or store.is_error():
+        sys.exit(1)
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--commit-every','-c',type=click.IntRange(0),default=1,
+              help='Commit after this many writes (default every write, 0 only on exit)')
+@click.pass_obj
+def shell(backend,filename,commit_every):
+    """Interactive session on the file - type help for the commands"""
+    store = open_store(filename,'c',backend=backend)
+    if store.is_error():
+        click.echo("Failed to open the file\n{em}".format(em=store.get_error_message()))
+        return
+    interactive = sys.stdin.isatty()
+    if interactive:
+        import readline  # line editing and history for raw_input
+
+    def read_lines():
+        while True:
+            try:
+                line = raw_input('pwutil> ' if interactive else '')
+            except EOFError:
+                if interactive:
+                    click.echo()
+                return
+            if line.strip() in ('quit','exit'):
+                return
+            if line.strip() == 'help':
+                for name in sorted(BATCH_COMMANDS):
+                    click.echo(BATCH_COMMANDS[name][1])
+                click.echo('quit')
+                yield ''
+            else:
+                yield line
+
+    messages = {'add':'Entry Added','update':'Entry Updated','remove':'Entry Deleted','commit':'Committed'}
+    try:
+        for result in run_batch(store,read_lines(),commit_every):
+            if not result['ok']:
+                click.echo('ERROR: ' + result['error'])
+            elif result['command'] == 'get':
+                click.echo(result['password'])
+            elif result['command'] == 'list':
+                for entry in result['entries']:
+                    click.echo(entry)
+            else:
+                click.echo(messages[result['command']])
+    finally:
+        store.error = False
+        store.close()
+    if store.is_error():
+        click.echo(store.get_error_message())
+
+
+@main.command()
+@click.argument('source',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('target',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--backend','-B',type=click.Choice(sorted(BACKENDS)),default='compact',
+              help='Storage format of the target file')
+@click.option('--batch-size','-b',type=click.IntRange(1),default=1000,help='Records written between syncs')
+def migrate(source,target,backend,batch_size):
+    """Copy all entries into a file in another storage format"""
+    try:
+        source_storage = open_data_file(source,'r')
+    except Exception as e:
+        click.echo("Failed to open the source file\nERROR: {}".format(e))
+        return
+    try:
+        target_storage = open_data_file(target,'c',backend)
+    except Exception as e:
+        source_storage.close()
+        click.echo("Failed to open the target file\nERROR: {}".format(e))
+        return
+    try:
+        count = copy_records(source_storage,target_storage,batch_size)
+    finally:
+        target_storage.close()
+        source_storage.close()
+    click.echo("{} Entries Migrated".format(count))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--workers','-w',type=click.IntRange(1),default=1,help='Worker processes for the encryption')
+@click.option('--batch-size','-b',type=click.IntRange(1),default=1000,help='Records per batch handed to a worker')
+@click.option('--quiet','-q',is_flag=True,help='Do not report progress')
+def rekey(filename,workers,batch_size,quiet):
+    """Re-encrypt every entry with a fresh IV in one transactional pass"""
+    def progress(count):
+        if not quiet:
+            click.echo("{} entries re-encrypted".format(count),err=True)
+
+    try:
+        count = rekey_file(os.path.basename(filename),os.path.dirname(filename),workers=workers,
+                           chunk_size=batch_size,progress=progress)
+    except Exception as e:
+        click.echo("Failed to re-encrypt the file - it was not changed\nERROR: {}".format(e))
+    else:
+        click.echo("{} Entries Re-encrypted".format(count))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--threshold','-t',type=click.FloatRange(0.0,1.0),default=None,
+              help='Only compact when at least this fraction of the stored records is replaced or deleted')
+def compact(filename,threshold):
+    """Rewrite the file with only its live entries, dropping replaced and deleted ones"""
+    try:
+        if is_sharded(filename):  # the threshold applies to each shard
+            before,after = compact_shards(filename,threshold)
+        else:
+            if threshold is not None:
+                storage = open_storage(filename,'r')
+                try:
+                    ratio = storage.garbage_ratio()
+                finally:
+                    storage.close()
+                if ratio is not None and ratio < threshold:
+                    click.echo("Garbage ratio {:.2f} is below the threshold - not compacted".format(ratio))
+                    return
+            before,after = compact_file(filename)
+    except Exception as e:
+        click.echo("Failed to compact the file - it was not changed\nERROR: {}".format(e))
+    else:
+        click.echo("Compacted {} bytes to {} bytes".format(before,after))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('shards',type=click.IntRange(1,256))
+@click.option('--backend','-B',type=click.Choice(sorted(BACKENDS)),default=None,
+              help='Storage format of the shards (default the current format)')
+@click.option('--quiet','-q',is_flag=True,help='Do not report progress')
+def reshard(filename,shards,backend,quiet):
+    """Split the file (or its shards) into SHARDS shard files - readers keep working while it runs"""
+    def progress(count):
+        if not quiet:
+            click.echo("{} entries copied".format(count),err=True)
+
+    try:
+        count = reshard_file(filename,shards,backend,progress=progress)
+    except Exception as e:
+        click.echo("Failed to reshard the file - it was not changed\nERROR: {}".format(e))
     else:
-        for entry in record_list:
-            click.echo("{}@{}".format(entry.get('username'),entry.get('host')))
+        click.echo("{} Entries Resharded into {} shards".format(count,shards))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('output',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--host','-H','host_pattern',default=None,help='Only include hosts matching this shell pattern')
+@click.option('--user','-u','user_pattern',default=None,help='Only include usernames matching this shell pattern')
+@click.option('--key-file','-k',type=click.Path(dir_okay=False),default=None,
+              help='Encrypt the snapshot with the key in this file - a new key is written to it if it does not exist')
+def snapshot(filename,output,host_pattern,user_pattern,key_file):
+    """Write the selected entries to a snapshot file for in-memory lookups (SnapshotReader)"""
+    from pswdfile.snapshot import write_snapshot,generate_key,decode_key
+    key = None
+    try:
+        if key_file:
+            if not os.path.exists(key_file):
+                fd = os.open(key_file,os.O_WRONLY | os.O_CREAT | os.O_EXCL,0o600)
+                with os.fdopen(fd,'w') as new_key_file:
+                    new_key_file.write(generate_key() + '\n')
+            with open(key_file) as existing_key_file:
+                key = decode_key(existing_key_file.read())
+        if is_sharded(filename):
+            records = iter_shard_records(filename)
+            storage = None
+        else:
+            storage = open_storage(filename,'r')
+            records = storage.iter_records()
+        try:
+            selected = ((dbkey,record) for dbkey,record in records
+                        if (host_pattern is None or fnmatch.fnmatchcase(record['host'] or '',host_pattern)) and
+                        (user_pattern is None or fnmatch.fnmatchcase(record['username'],user_pattern)))
+            count = write_snapshot(output,selected,key)
+        finally:
+            if storage is not None:
+                storage.close()
+    except Exception as e:
+        click.echo("Failed to write the snapshot\nERROR: {}".format(e))
+    else:
+        click.echo("{} Entries written to the snapshot".format(count))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('output_file',type=click.File('wb'),default='-')
+@click.option('--root','-r',is_flag=True,help='Only print the record count and the root digest')
+def manifest(filename,output_file,root):
+    """Write the digest of every entry by dbkey with the root digest of the file - files holding the same
+    entries have the same root"""
+    from pswdfile.sync import file_manifest
+    try:
+        record_manifest = file_manifest(filename)
+    except Exception as e:
+        click.echo("Failed to read the file\nERROR: {}".format(e))
+        sys.exit(2)
+    if root:
+        click.echo("{} {}".format(len(record_manifest),record_manifest.root()))
+    else:
+        record_manifest.save(output_file)
+
+
+@main.command()
+@click.argument('source',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('target',type=click.Path(dir_okay=False,resolve_path=True))
+def diff(source,target):
+    """List the entries to add, change and remove to make TARGET hold the entries of SOURCE - each is a
+    password file or a manifest written by pwutil manifest.  Exits 1 when they differ."""
+    from pswdfile.sync import file_manifest,diff_manifests
+    try:
+        source_manifest = file_manifest(source)
+        target_manifest = file_manifest(target)
+    except Exception as e:
+        click.echo("Failed to read the files\nERROR: {}".format(e))
+        sys.exit(2)
+    counts = {'added':0,'changed':0,'removed':0}
+    for change,dbkey in diff_manifests(source_manifest,target_manifest):
+        counts[change] += 1
+        click.echo("{} {}".format(change,dbkey))
+    click.echo("{added} added, {changed} changed, {removed} removed".format(**counts),err=True)
+    if any(counts.values()):
+        sys.exit(1)
+
+
+@main.command()
+@click.argument('source',type=click.Path(dir_okay=False,resolve_path=True))
+@click.argument('target',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--backend','-B',type=click.Choice(sorted(BACKENDS)),default=None,
+              help='Storage format of a new target file (default the format of the source)')
+@click.option('--batch-size','-b',type=click.IntRange(1),default=1000,help='Records written between syncs')
+def sync(source,target,backend,batch_size):
+    """Bring TARGET up to date with SOURCE, writing only the entries added, changed or removed - the manifest of
+    each file is cached in <file>.mft, so a file is only scanned again once it changed"""
+    from pswdfile.sync import sync_files
+    if is_sharded(source) or is_sharded(target):
+        click.echo("Failed to sync the files\nERROR: Sharded files can't be synced - use pwutil diff")
+        return
+    try:
+        counts = sync_files(source,target,backend,batch_size=batch_size)
+    except Exception as e:
+        click.echo("Failed to sync the files\nERROR: {}".format(e))
+    else:
+        click.echo("Synced: {added} added, {changed} changed, {removed} removed".format(**counts))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--lookups','-n',type=click.IntRange(0),default=100,help='Entries looked up for the timing breakdown')
+@click.option('--session',is_flag=True,help='Look the entries up through one open session like a service would '
+                                            'instead of opening the file for each like pwutil get')
+def stats(filename,lookups,session):
+    """Show the size of the file and where the time of a lookup goes"""
+    try:
+        storage = open_data_file(filename,'r')
+    except Exception as e:
+        click.echo("Failed to open the file\nERROR: {}".format(e))
+        return
+    try:
+        paths = [filename]
+        if isinstance(storage,ShardedStorage):
+            paths = [shard_path(filename,storage.generation,i) for i in range(storage.shards)]
+        size = sum(os.path.getsize(path + suffix) for path in paths for suffix in BACKENDS[storage.name].SUFFIXES
+                   if os.path.exists(path + suffix))
+        click.echo("Backend: {}\nFile size: {} bytes".format(storage.name,size))
+        if isinstance(storage,ShardedStorage):
+            click.echo("Shards: {}".format(storage.shards))
+        if hasattr(storage,'stats'):
+            for name,value in sorted(storage.stats().items()):
+                click.echo("{}: {}{}".format(name.capitalize(),value,' bytes' if name.endswith('size') else ''))
+        ratio = storage.garbage_ratio()
+        if ratio is not None:
+            click.echo("Garbage ratio: {:.2f}".format(ratio))
+        pairs = [(record['username'],record['host'])
+                 for _,record in itertools.islice(storage.iter_records(),lookups)]
+    finally:
+        storage.close()
+    if not pairs:
+        return
+    data_file_dir,data_file_name = os.path.dirname(filename),os.path.basename(filename)
+    click.echo("\nTimings of {} lookups{}:".format(len(pairs),' in one session' if session else ''))
+    with instrument.instrumented() as instrumentation:
+        if session:
+            with PasswordStore(data_file_dir=data_file_dir,data_file_name=data_file_name) as store:
+                for username,host in pairs:
+                    store.get(username,host)
+        else:
+            for username,host in pairs:
+                Password(host=host,username=username,data_file_dir=data_file_dir,data_file_name=data_file_name,
+                         mode='r').decrypt()
+    instrumentation.report(click.get_text_stream('stdout'))
+
+
+@main.command()
+@click.argument('filename',type=click.Path(dir_okay=False,resolve_path=True))
+@click.option('--socket','-s','socket_path',type=click.Path(dir_okay=False),required=True,
+              help='Unix domain socket to listen on')
+@click.option('--poll-interval',type=click.FloatRange(0.1),default=1.0,
+              help='Seconds between checks of the file for changes')
+def serve(filename,socket_path,poll_interval):
+    """Serve lookups for the password file over a Unix domain socket"""
+    from pswdfile.daemon import serve as run_server
+    try:
+        run_server(filename,socket_path,poll_interval)
+    except Exception as e:
+        click.echo("Failed to start the credential daemon\nERROR: {}".format(e))
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,147 @@
+"""
+  Name: record.py
+
+  Purpose: PasswordRecord - the host, username and rsakey (base64 encrypted password) of one entry, the
+           record every storage backend returns and Password writes.  It keeps its fields in __slots__
+           instead of a dict per record, and hosts are interned so the records of a host share one string.
+           It can be read like the dicts used before it (record['host'], record.get('host'), dict(record)).
+
+           encode/decode is the binary form a shelve file stores a record in - a marker byte, the host and
+           username lengths and the fields - in place of a pickled dict.  decode_value also reads the
+           legacy shelve values (pickled dicts and base64 pickled dicts) and pickle_value writes them, for
+           shelve files older installs still read.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+0.02 jwd3 10/17/2026
+    Added pickle_value and is_encoded
+"""
+import base64
+import cPickle
+import struct
+
+__all__ = ['PasswordRecord','as_record','decode_value','pickle_value','is_encoded']
+__version__ = "0.02"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+MARKER = '\x01'  # not a pickle opcode, so an encoded record can't be mistaken for a legacy value
+HEADER = struct.Struct('>cBHH')  # marker, flags, host length, username length - followed by host, username, rsakey
+FLAG_HOST = 0x01
+
+
+def _utf8(value):
+    return value.encode('utf-8') if isinstance(value,unicode) else value
+
+
+class PasswordRecord(object):
+    """ One entry of a password file - compares equal to a dict with the same fields """
+
+    FIELDS = ('host','username','rsakey')
+    __slots__ = FIELDS
+
+    def __init__(self,host,username,rsakey):
+        self.host = intern(host) if type(host) is str else host
+        self.username = username
+        self.rsakey = rsakey
+
+    @classmethod
+    def from_dict(cls,record):
+        return cls(record.get('host'),record['username'],record['rsakey'])
+
+    def __reduce__(self):
+        return PasswordRecord,(self.host,self.username,self.rsakey)
+
+    def __getitem__(self,field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self,field)
+
+    def get(self,field,default=None):
+        return getattr(self,field) if field in self.FIELDS else default
+
+    def __contains__(self,field):
+        return field in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def items(self):
+        return [(field,getattr(self,field)) for field in self.FIELDS]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self,other):
+        if isinstance(other,PasswordRecord):
+            return (self.host,self.username,self.rsakey) == (other.host,other.username,other.rsakey)
+        if isinstance(other,dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self,other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None  # like the dicts it replaces
+
+    def __repr__(self):
+        return 'PasswordRecord(host={0!r}, username={1!r}, rsakey={2!r})'.format(self.host,self.username,self.rsakey)
+
+    def encode(self):
+        """ Binary form of the record """
+        host = _utf8(self.host) or ''
+        username = _utf8(self.username)
+        flags = FLAG_HOST if self.host is not None else 0
+        return HEADER.pack(MARKER,flags,len(host),len(username)) + host + username + _utf8(self.rsakey)
+
+    @classmethod
+    def decode(cls,value):
+        """ Record from its binary form - raises ValueError when value is not one """
+        if value[:1] != MARKER or len(value) < HEADER.size:
+            raise ValueError('Not an encoded password record')
+        _,flags,host_len,user_len = HEADER.unpack_from(value)
+        start = HEADER.size
+        return cls(value[start:start + host_len] if flags & FLAG_HOST else None,
+                   value[start + host_len:start + host_len + user_len],value[start + host_len + user_len:])
+
+
+def as_record(record):
+    """ PasswordRecord for a PasswordRecord or a record dict """
+    return record if isinstance(record,PasswordRecord) else PasswordRecord.from_dict(record)
+
+
+def is_encoded(value):
+    """ True when a shelve value is an encoded record, False for a legacy pickled one """
+    return value[:1] == MARKER
+
+
+def pickle_value(record):
+    """ Shelve value of a record as earlier versions wrote it - the base64 of the pickled record dict, pickled
+        again like shelve does """
+    record = dict((field,_utf8(value)) for field,value in as_record(record).items())  # str fields like encode
+    return cPickle.dumps(base64.b64encode(cPickle.dumps(record)))
+
+
+def decode_value(value):
+    """ Record from a value stored in a shelve file - an encoded record or a legacy pickled record dict,
+        itself pickled by shelve and optionally base64 encoded in between """
+    if is_encoded(value):
+        return PasswordRecord.decode(value)
+    record = cPickle.loads(value)
+    if isinstance(record,str):
+        record = cPickle.loads(base64.b64decode(record))
+    return as_record(record)
@@ -0,0 +1,671 @@
+"""
+  Name: shard.py
+
+  Purpose: Password files split across N shard files for credential sets too large for a single data file.
+           A record goes to shard int(dbkey[:8], 16) % N, so the shard of a username/host is known without
+           a lookup.  Each shard is an ordinary data file of any backend with its own lock: a writer only
+           opens (and locks) the shards it writes to, so processes writing to different shards don't wait
+           for each other, and threads sharing a ShardedPasswordStore only serialize per shard.  Listing
+           reads the shards in parallel.
+
+           <data file>.shards is the manifest - the generation, shard count and backend - and the shards are
+           <data file>.g<generation>.s<shard>.  reshard_file copies the records into a new generation with
+           another shard count and switches to it by renaming the manifest.  Readers keep working while it
+           runs; writers hold a shared lock on the manifest, so a reshard waits for open writers and new
+           writers wait for the reshard.
+
+           ShardedStorage is the storage interface over the shards - Password and PasswordStore open it for a
+           sharded file (see open_data_file), so every entry point reads and writes sharded files.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+0.02 jwd3 10/17/2026
+    Added iter_shard_records
+0.03 jwd3 10/17/2026
+    reshard_file holds the WriteLock of an unsharded source so atomic writers are excluded too
+0.04 jwd3 10/17/2026
+    ShardedPasswordStore readers open a shard on first use and read the manifest again when a shard can't be opened
+0.05 jwd3 10/17/2026
+    Added ShardedStorage, open_data_file and compact_shards so every entry point reads and writes sharded files
+0.06 jwd3 10/17/2026
+    ShardedStorage.flush returns the file descriptors of the shards instead of fsyncing them
+0.07 jwd3 10/17/2026
+    Added ShardedPasswordStore.abort - a with block left by an exception aborts every shard
+0.08 jwd3 10/17/2026
+    ShardedPasswordStore opens and switches its shards with ShardedStorage instead of a copy of that logic
+    ShardedStorage writers open every shard in index order for iter_records and find
+"""
+import os
+import sys
+
+from pswdfile.password import Password,PasswordStore,_db_key
+from pswdfile.storage import (ShelveStorage,FileLock,WriteLock,LockTimeout,detect_backend,open_storage,compact_file,
+                              remove_data_file)
+
+__all__ = ['ShardedPasswordStore','ShardedStorage','is_sharded','read_manifest','create_shards','reshard_file',
+           'shard_index','iter_shard_records','open_data_file','compact_shards']
+__version__ = "0.08"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+MANIFEST_SUFFIX = '.shards'
+DEFAULT_SHARDS = 8
+
+
+def is_sharded(path):
+    """ True when the data file at path is split into shards """
+    return os.path.exists(path + MANIFEST_SUFFIX)
+
+
+def shard_index(dbkey,count):
+    """ Shard of a dbkey """
+    return int(dbkey[:8],16) % count
+
+
+def shard_path(path,generation,index):
+    return '{0}.g{1:d}.s{2:02d}'.format(path,generation,index)
+
+
+def read_manifest(path):
+    """
+    Read the manifest of a sharded data file
+    :return: tuple of the generation, shard count and backend name - None when the file is not sharded
+    """
+    try:
+        with open(path + MANIFEST_SUFFIX) as manifest:
+            generation,count,backend = manifest.read().split()
+        return int(generation),int(count),backend
+    except (IOError,ValueError):
+        return None
+
+
+def _write_manifest(path,generation,count,backend):
+    """ Replace the manifest with a rename so readers see the old or the new one """
+    temp_path = '{0}{1}.tmp{2}'.format(path,MANIFEST_SUFFIX,os.getpid())
+    with open(temp_path,'w') as manifest:
+        manifest.write('{0:d} {1:d} {2}\n'.format(generation,count,backend))
+        manifest.flush()
+        os.fsync(manifest.fileno())
+    os.rename(temp_path,path + MANIFEST_SUFFIX)
+
+
+def iter_shard_records(path,timeout=10.0):
+    """ Generator of the (dbkey, record) tuples of every shard of a sharded data file, one shard at a time """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise IOError('Data file [{0!s}] is not sharded'.format(path))
+    generation,count,backend = manifest
+    for i in range(count):
+        storage = open_storage(shard_path(path,generation,i),'r',backend,timeout=timeout)
+        try:
+            for item in storage.iter_records():
+                yield item
+        finally:
+            storage.close()
+
+
+def create_shards(path,count=DEFAULT_SHARDS,backend=None,timeout=10.0):
+    """
+    Create an empty sharded data file unless it already exists
+    :return: the manifest tuple of the data file
+    """
+    manifest_lock = FileLock(path + MANIFEST_SUFFIX,exclusive=True,timeout=timeout).acquire()
+    try:
+        manifest = read_manifest(path)
+        if manifest is None:
+            backend = backend or ShelveStorage.name
+            for i in range(count):
+                open_storage(shard_path(path,1,i),'n',backend,timeout=timeout).close()
+            _write_manifest(path,1,count,backend)
+            manifest = 1,count,backend
+        return manifest
+    finally:
+        manifest_lock.release()
+
+
+def reshard_file(path,count,backend=None,timeout=10.0,progress=None):
+    """
+    Copy the records of a data file - sharded or not - into count new shards and switch to them.  The
+    old files are removed once the new shards are in place (waiting up to timeout seconds for shelve
+    readers to close them); on error they are left unchanged.
+    :param backend: backend of the new shards, None keeps the current one
+    :param progress: optional callable(count) called after each source file is copied
+    :return: number of records copied
+    """
+    manifest_lock = FileLock(path + MANIFEST_SUFFIX,exclusive=True,timeout=timeout).acquire()
+    source_lock = None
+    try:
+        manifest = read_manifest(path)
+        if manifest is None:
+            if not any(os.path.exists(path + suffix) for suffix in ShelveStorage.SUFFIXES):
+                raise IOError('Data file [{0!s}] NOT found'.format(path))
+            # writers of an unsharded file don't know the manifest - hold their lock while copying
+            source_lock = WriteLock(path,timeout).acquire()
+            generation,sources,source_backend = 0,[path],detect_backend(path)
+        else:
+            generation,shards,source_backend = manifest
+            sources = [shard_path(path,generation,i) for i in range(shards)]
+        backend = backend or source_backend
+        generation += 1
+        targets = []
+        copied = 0
+        try:
+            for i in range(count):
+                target_path = shard_path(path,generation,i)
+                targets.append(open_storage(target_path,'n',backend,timeout=timeout,atomic=True))
+            for source_path in sources:
+                source = open_storage(source_path,'r',source_backend,lock=source_lock is None,timeout=timeout)
+                try:
+                    for dbkey,record in source.iter_records():
+                        targets[shard_index(dbkey,count)].put(dbkey,record)
+                        copied += 1
+                finally:
+                    source.close()
+                if progress:
+                    progress(copied)
+        except:
+            for target in targets:
+                target.abort()
+            raise
+        for target in targets:
+            target.close()
+        _write_manifest(path,generation,count,backend)
+    finally:
+        if source_lock is not None:
+            source_lock.release()
+        manifest_lock.release()
+    for source_path in sources:
+        try:
+            remove_data_file(source_path,source_backend,timeout)
+        except (IOError,OSError):
+            pass  # still open by a shelve reader - the reshard is done, only the old file is left behind
+    return copied
+
+
+class ShardedStorage(object):
+    """ Storage over the shards of a sharded data file, so code written for one storage (Password,
+        PasswordStore, migrate, the credential daemon) works on a sharded file.  get, put and delete go to
+        the shard of the dbkey and iter_records and find read every shard.  A shard is opened - and locked
+        like any data file - the first time it is used.  A writer holds a shared lock on the manifest, like
+        ShardedPasswordStore, and closes the shards it holds before it waits for a shard locked by another
+        writer.  A reader that can't open a shard reads the manifest again, since a reshard may have
+        replaced the shards.  With atomic=True each shard is committed on its own.
+
+        This is the one place the shards of a generation are opened and switched - ShardedPasswordStore
+        uses it too, with a PasswordStore session over each shard (see _open_shard). """
+
+    def __init__(self,path,mode='r',timeout=10.0,atomic=False):
+        if mode == 'n':
+            raise IOError("Sharded data file [{0!s}] can't be recreated - use reshard_file".format(path))
+        self.path = path
+        self.mode = mode
+        self.timeout = timeout
+        self.atomic = atomic
+        self.compact_ratio = None  # passed to the compact shards opened by a writer
+        self.lock = None
+        if mode != 'r':
+            self.lock = FileLock(path + MANIFEST_SUFFIX,exclusive=False,timeout=timeout).acquire()
+        manifest = read_manifest(path)
+        if manifest is None:
+            self.close()
+            raise IOError('Data file [{0!s}] is not sharded'.format(path))
+        self.generation,self.shards,self.name = manifest
+        self._storages = [None] * self.shards
+
+    def _reload_manifest(self):
+        """ Switch a reader to the shards of a manifest written since it was read - False when it is unchanged """
+        manifest = read_manifest(self.path)
+        if self.mode != 'r' or manifest is None or manifest == (self.generation,self.shards,self.name):
+            return False
+        self.__close_shards()
+        self.generation,self.shards,self.name = manifest
+        self._storages = [None] * self.shards
+        return True
+
+    def _open_shard(self,index,timeout):
+        """ Open and lock a shard - anything with the close and abort of a storage may be returned """
+        storage = open_storage(shard_path(self.path,self.generation,index),self.mode,self.name,timeout=timeout,
+                               atomic=self.atomic)
+        if self.compact_ratio is not None and hasattr(storage,'compact_ratio'):
+            storage.compact_ratio = self.compact_ratio
+        return storage
+
+    def _storage(self,index,ordered=False):
+        """
+        The open storage of a shard.  A writer that holds other shards does not wait for a shard locked by
+        another writer: it closes the shards it holds first, so a writer never waits while holding a shard.
+        ordered - the caller opens the shards in index order and may wait.
+        """
+        storage = self._storages[index]
+        if storage is None:
+            if not ordered and self.mode != 'r' and any(self._storages):
+                try:
+                    storage = self._open_shard(index,0)
+                except LockTimeout:
+                    self.__close_shards()
+            if storage is None:
+                storage = self._open_shard(index,self.timeout)
+            self._storages[index] = storage
+        return storage
+
+    def _shard(self,dbkey):
+        for attempt in range(3):
+            try:
+                return self._storage(shard_index(dbkey,self.shards))
+            except (IOError,OSError):
+                if attempt == 2 or not self._reload_manifest():
+                    raise
+
+    def _all_shards(self):
+        """ List of the storage of every shard, opened in index order """
+        for attempt in range(3):
+            if self.mode != 'r' and not all(self._storages):
+                self.__close_shards()  # then take every shard in index order
+            try:
+                return [self._storage(i,ordered=True) for i in range(self.shards)]
+            except (IOError,OSError):
+                if attempt == 2 or not self._reload_manifest():
+                    raise
+
+    def __contains__(self,dbkey):
+        return dbkey in self._shard(dbkey)
+
+    def get(self,dbkey):
+        """ Return the record for dbkey or None if it does not exist """
+        return self._shard(dbkey).get(dbkey)
+
+    def put(self,dbkey,record):
+        self._shard(dbkey).put(dbkey,record)
+
+    def delete(self,dbkey):
+        """ Delete the record for dbkey - returns False if it does not exist """
+        return self._shard(dbkey).delete(dbkey)
+
+    def iter_records(self):
+        """ Generator of (dbkey, record) tuples, one shard at a time """
+        for storage in self._all_shards():
+            for item in storage.iter_records():
+                yield item
+
+    def find(self,host=None,username=None,prefix=None):
+        """ Query the secondary index of every shard - see Storage.find """
+        import heapq
+        return heapq.merge(*[storage.find(host,username,prefix) for storage in self._all_shards()])
+
+    def garbage_ratio(self):
+        return None
+
+    def sync(self):
+        for storage in self._storages:
+            if storage is not None:
+                storage.sync()
+
+    def flush(self):
+        """ Flush every open shard - returns the file descriptors of all of them to fsync """
+        fds = []
+        for storage in self._storages:
+            if storage is not None:
+                fds.extend(storage.flush())
+        return fds
+
+    def __close_shards(self,abort=False):
+        storages,self._storages = self._storages,[None] * len(self._storages)
+        error = None
+        for storage in storages:
+            if storage is not None:
+                try:
+                    storage.abort() if abort else storage.close()
+                except Exception:
+                    error = error or sys.exc_info()
+        if error is not None:
+            raise error[0],error[1],error[2]
+
+    def close(self):
+        try:
+            self.__close_shards()
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+                self.lock = None
+
+    def abort(self):
+        try:
+            self.__close_shards(abort=True)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+                self.lock = None
+
+
+def open_data_file(path,mode='r',backend=None,timeout=10.0,atomic=False):
+    """ open_storage for a data file that may be sharded - a ShardedStorage when it is """
+    if is_sharded(path):
+        return ShardedStorage(path,mode,timeout,atomic)
+    return open_storage(path,mode,backend,timeout=timeout,atomic=atomic)
+
+
+def compact_shards(path,threshold=None,timeout=10.0):
+    """
+    compact_file every shard of a sharded data file
+    :param threshold: only compact the shards with at least this garbage ratio
+    :return: tuple of the size in bytes of the shards before and after
+    """
+    manifest_lock = FileLock(path + MANIFEST_SUFFIX,exclusive=False,timeout=timeout).acquire()  # like a writer
+    try:
+        manifest = read_manifest(path)
+        if manifest is None:
+            raise IOError('Data file [{0!s}] is not sharded'.format(path))
+        generation,count,backend = manifest
+        before = after = 0
+        for i in range(count):
+            path_i = shard_path(path,generation,i)
+            if threshold is not None:
+                storage = open_storage(path_i,'r',backend,timeout=timeout)
+                try:
+                    ratio = storage.garbage_ratio()
+                finally:
+                    storage.close()
+                if ratio is not None and ratio < threshold:
+                    continue
+            shard_before,shard_after = compact_file(path_i,backend,timeout=timeout)
+            before += shard_before
+            after += shard_after
+        return before,after
+    finally:
+        manifest_lock.release()
+
+
+class ShardedPasswordStore(object):
+    """ PasswordStore session over a sharded data file.
+
+        with ShardedPasswordStore(data_file_dir='/tmp',mode='c',shards=16) as store:
+            store.put('scott','dbhost','tiger')
+            password = store.get('scott','dbhost')
+
+        mode is 'r' or 'c' - 'c' creates the file with shards shards (DEFAULT_SHARDS by default) when it
+        does not exist, shards is ignored for an existing file (see reshard_file).  A shard is opened the
+        first time it is used - a lookup opens one shard.  A writer keeps it until the session is closed or
+        it has to wait for a shard held by another writer.  A reader that can't open a shard reads the
+        manifest again, since a reshard may have replaced the shards it read.  iter_records, find and get_all
+        read up to workers shards in parallel.  The shards are opened, locked and switched to a new generation
+        by a ShardedStorage (see _ShardSessions) and each is used through a PasswordStore session - the other
+        parameters are passed to it."""
+
+    def __init__(self,data_file_name=None,data_file_dir=None,mode='r',shards=None,workers=4,flush_every=0,
+                 backend=None,cache=None,lock_timeout=10.0):
+        import threading  # imported here like PasswordStore
+        self._data_file_name = data_file_name or ".pddatafile"
+        self._data_file_dir = data_file_dir
+        self.mode = 'r' if mode == 'r' else 'c'
+        self.shards = shards
+        self.workers = workers
+        self.flush_every = flush_every
+        self.backend = backend
+        self.cache = cache
+        self.lock_timeout = lock_timeout
+        self.isOpen = False
+        self.error = False
+        self.errmsg = None
+        self._shards = None  # _ShardSessions while open
+        self._open_lock = threading.Lock()  # serializes opening and switching the shards
+
+    def __enter__(self):
+        self.open()
+        if self.error:
+            raise IOError(self.errmsg)
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def __del__(self):
+        if self.isOpen:
+            self.close()
+
+    @property
+    def path(self):
+        return os.path.join(self._data_file_dir or '',self._data_file_name)
+
+    @property
+    def data_file_dir(self):
+        return self._data_file_dir
+
+    def is_error(self):
+        return self.error
+
+    def get_error_message(self):
+        return 'ERROR: ' + self.errmsg
+
+    def __fail(self,errmsg):
+        self.error = True
+        self.errmsg = errmsg
+
+    def __fail_open(self):
+        self.__fail('Cannot open data file - Error {0!s}'.format(sys.exc_info()[1]))
+
+    def __track(self,session):
+        """ Copy the error state of the last operation to the session """
+        self.error = session.error
+        self.errmsg = session.errmsg
+
+    def open(self):
+        """ Open the sharded data file for the session """
+        if self.isOpen:
+            return
+        if not (self._data_file_dir and os.path.isdir(self._data_file_dir)):
+            self.__fail('Directory [%s] NOT found' % str(self._data_file_dir))
+            return
+        try:
+            if self.mode != 'r' and not is_sharded(self.path):
+                create_shards(self.path,self.shards or DEFAULT_SHARDS,self.backend,self.lock_timeout)
+            self._shards = _ShardSessions(self)
+        except (IOError,OSError):
+            self.__fail_open()
+            return
+        self.shards,self.backend = self._shards.shards,self._shards.name
+        self.isOpen = True
+        self.error = False
+        self.errmsg = None
+
+    def close(self):
+        """ Flush pending writes and close every shard """
+        self.__close(abort=False)
+
+    def abort(self):
+        """ Abort the session of every shard (see PasswordStore.abort) """
+        self.__close(abort=True)
+
+    def __close(self,abort):
+        shards,self._shards = self._shards,None
+        errmsg = None
+        if shards is not None:
+            sessions = self.__open_sessions(shards)
+            if abort:
+                shards.abort()
+            else:
+                shards.close()
+            errmsg = next((session.errmsg for session in sessions if session.error),None)
+        if self.isOpen and errmsg:
+            self.__fail(errmsg)
+        self.isOpen = False
+
+    @staticmethod
+    def __open_sessions(shards):
+        return [session for session in shards._storages if session is not None]
+
+    def __shard(self,username,host):
+        """ The session of the shard holding username/host, None after setting the error when it is not open """
+        if not self.isOpen:
+            if not self.error:
+                self.__fail('Data file is not open')
+            return None
+        if not username:
+            self.__fail('Missing User Name')
+            return None
+        try:
+            with self._open_lock:
+                return self._shards._shard(_db_key(username,host))
+        except (IOError,OSError):
+            self.__fail_open()
+            return None
+
+    def get(self,username,host=None):
+        """
+        Get the decrypted password for a username and host
+        :return: password or None if not found
+        """
+        session = self.__shard(username,host)
+        if session is None:
+            return None
+        password = session.get(username,host)
+        self.__track(session)
+        return password
+
+    def put(self,username,host,password):
+        """
+        Add or update the password for a username and host
+        :return: encrypted password
+        """
+        session = self.__shard(username,host)
+        if session is None:
+            return None
+        encrypted_password = session.put(username,host,password)
+        self.__track(session)
+        return encrypted_password
+
+    def remove(self,username,host=None):
+        """
+        Remove the entry for a username and host
+        :return: True if removed
+        """
+        session = self.__shard(username,host)
+        if session is None:
+            return False
+        removed = session.remove(username,host)
+        self.__track(session)
+        return removed
+
+    def flush(self):
+        """ Sync the pending writes of every open shard """
+        if self._shards is not None:
+            for session in self.__open_sessions(self._shards):
+                session.flush()
+
+    def commit(self):
+        """ Make every write made through the session so far durable (see PasswordStore.commit) """
+        if self._shards is not None:
+            for session in self.__open_sessions(self._shards):
+                session.commit()
+
+    def __fan_out(self,read):
+        """ Generator of read(session) for every shard in shard order - up to workers shards are read at once """
+        if not self.isOpen:
+            if not self.error:
+                self.__fail('Data file is not open')
+            return
+        try:
+            with self._open_lock:
+                sessions = self._shards._all_shards()
+        except (IOError,OSError):
+            self.__fail_open()
+            return
+        if self.workers > 1 and len(sessions) > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(self.workers,len(sessions)))
+            try:
+                for result in pool.imap(read,sessions):
+                    yield result
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for session in sessions:
+                yield read(session)
+
+    def iter_records(self,fields=None):
+        """
+        Iterate the records of every shard
+        :param fields: optional sequence of record fields to return, e.g. ('host','username')
+        :return: generator of record dicts
+        """
+        def read(session):
+            with session._lock:
+                return [record for record in Password(store=session).iter_records(fields)]
+
+        for records in self.__fan_out(read):
+            for record in records:
+                yield record
+
+    def find(self,host=None,username=None,prefix=None,fields=None):
+        """
+        Query the secondary index of every shard (see Password.find)
+        :return: generator of record dicts in dbkey order within each shard
+        """
+        def read(session):
+            with session._lock:
+                return [record for record in Password(store=session).find(host,username,prefix,fields)]
+
+        for records in self.__fan_out(read):
+            for record in records:
+                yield record
+
+    def get_all(self):
+        """ Return a list of all the records """
+        return [record for record in self.iter_records()]
+
+    def import_records(self,records,batch_size=1000,progress=None):
+        """ Encrypt and write records in batches, see PasswordStore.import_records """
+        written = failed = 0
+        errmsg = None
+        for username,host,password in records:
+            self.put(username,host,password)
+            if self.error:
+                failed += 1
+                errmsg = errmsg or self.errmsg
+            else:
+                written += 1
+            if (written + failed) % batch_size == 0:
+                self.flush()
+                if progress:
+                    progress(written,failed)
+        self.flush()
+        if progress and (written + failed) % batch_size:
+            progress(written,failed)
+        self.error = failed > 0
+        self.errmsg = errmsg
+        return written,failed
+
+    def export_records(self):
+        """
+        Decrypt every record in the data file
+        :return: generator of (username, host, password) tuples
+        """
+        pwd = Password()
+        for record in self.iter_records():
+            yield record['username'],record['host'],pwd.decrypt(record['rsakey'])
+
+
+class _ShardSessions(ShardedStorage):
+    """ ShardedStorage whose shards are PasswordStore sessions over the shard storage, for ShardedPasswordStore """
+
+    def __init__(self,store):
+        self.store = store
+        super(_ShardSessions,self).__init__(store.path,store.mode,store.lock_timeout)
+
+    def _open_shard(self,index,timeout):
+        storage = super(_ShardSessions,self)._open_shard(index,timeout)
+        store = self.store
+        return PasswordStore(data_file_name=os.path.basename(shard_path(self.path,self.generation,index)),
+                             data_file_dir=store.data_file_dir,mode=self.mode,flush_every=store.flush_every,
+                             backend=self.name,cache=store.cache,lock_timeout=timeout,datafile=storage)
@@ -0,0 +1,238 @@
+"""
+  Name: snapshot.py
+
+  Purpose: Snapshot files - a small read-only copy of selected records for batch jobs that only need a few
+           credentials.  A job loads the whole snapshot with one read, checks its integrity and then looks
+           entries up without any I/O.
+
+           Layout: a header, the displacement table and the slot table of a perfect hash of the dbkeys,
+           then the records.  A dbkey goes to bucket h % buckets, h being the first word of the SHA256
+           dbkey; the displacement d of a bucket places each of its keys in slot crc32(dbkey, d) % count
+           (or slot -d - 1 for a bucket of one key), so a lookup reads one displacement and one slot and
+           compares the dbkey stored there.  A record is the host, username and raw ciphertext
+           as in the data file, so a password is only decrypted when it is looked up.
+
+           With a key (32 bytes, see generate_key) each record is also encrypted with AES-256 CBC under
+           that key, hiding the hosts and usernames, and the checksum in the header is an HMAC-SHA256 of
+           everything after the header instead of a SHA256.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+"""
+import os
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+import zlib
+
+__all__ = ['Snapshot','write_snapshot','generate_key','decode_key']
+__version__ = "0.01"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+MAGIC = 'PWDS'
+VERSION = 1
+HEADER = struct.Struct('>4sBB2xIIQ32s')  # magic, version, flags, record count, buckets, created, checksum
+SLOT = struct.Struct('>32sII')  # raw dbkey digest, record offset, record length
+RECORD = struct.Struct('>BHH')  # flags, host length, username length - followed by host, username, ciphertext
+BUCKET = struct.Struct('>I')  # bucket hash - the first word of the dbkey digest
+FLAG_ENCRYPTED = 0x01
+FLAG_HOST = 0x02
+_BLOCK_SIZE = 16
+_MAX_DISPLACEMENT = 1 << 20
+
+
+def generate_key():
+    """ New random snapshot key, urlsafe base64 encoded """
+    return base64.urlsafe_b64encode(os.urandom(32))
+
+
+def decode_key(key):
+    """ Raw 32 byte key from its urlsafe base64 form - raises ValueError when it is not one """
+    try:
+        raw = base64.urlsafe_b64decode(key.strip())
+    except TypeError:
+        raw = ''
+    if len(raw) != 32:
+        raise ValueError('Snapshot key must be 32 bytes, urlsafe base64 encoded')
+    return raw
+
+
+def _aes(key,iv):
+    from Crypto.Cipher import AES  # imported on use like the password module
+    return AES.new(key,AES.MODE_CBC,iv)
+
+
+def _seal(key,data):
+    pad = _BLOCK_SIZE - len(data) % _BLOCK_SIZE
+    iv = os.urandom(_BLOCK_SIZE)
+    return iv + _aes(key,iv).encrypt(data + chr(pad) * pad)
+
+
+def _open(key,data):
+    plain = _aes(key,data[:_BLOCK_SIZE]).decrypt(data[_BLOCK_SIZE:])
+    return plain[:-ord(plain[-1])]
+
+
+def _checksum(key,body):
+    if key is None:
+        return hashlib.sha256(body).digest()
+    return hmac.new(key,body,hashlib.sha256).digest()
+
+
+def _displaced(digest,d,count):
+    return (zlib.crc32(digest,d) & 0xffffffff) % count
+
+
+def _perfect_hash(digests):
+    """
+    Displacement table of a minimal perfect hash of the digests
+    :return: tuple of the displacements by bucket and the digests by slot
+    """
+    count = len(digests)
+    buckets = [[] for _ in xrange(max(1,count))]
+    for digest in digests:
+        buckets[BUCKET.unpack_from(digest)[0] % len(buckets)].append(digest)
+    displacements = [0] * len(buckets)
+    slots = [None] * count
+    order = sorted(xrange(len(buckets)),key=lambda b: -len(buckets[b]))
+    free = None
+    for b in order:
+        bucket = buckets[b]
+        if len(bucket) > 1:
+            for d in xrange(1,_MAX_DISPLACEMENT):
+                placed = set()
+                for digest in bucket:
+                    slot = _displaced(digest,d,count)
+                    if slots[slot] is not None or slot in placed:
+                        break
+                    placed.add(slot)
+                else:
+                    for digest in bucket:
+                        slots[_displaced(digest,d,count)] = digest
+                    displacements[b] = d
+                    break
+            else:
+                raise ValueError('No displacement found for a bucket of {0:d} keys'.format(len(bucket)))
+        elif bucket:
+            if free is None:  # single key buckets come last - they fill the slots left in order
+                free = (slot for slot in xrange(count) if slots[slot] is None)
+            slot = next(free)
+            slots[slot] = bucket[0]
+            displacements[b] = -slot - 1
+    return displacements,slots
+
+
+def write_snapshot(path,records,key=None):
+    """
+    Write a snapshot file
+    :param records: iterable of (dbkey, record) tuples as returned by Storage.iter_records
+    :param key: optional raw 32 byte key to encrypt the records with
+    :return: number of records written
+    """
+    payloads = {}
+    for dbkey,record in records:
+        rsakey = record['rsakey']
+        if '-' in rsakey or '_' in rsakey:
+            ciphertext = base64.urlsafe_b64decode(rsakey)
+        else:
+            ciphertext = base64.b64decode(rsakey)
+        host = record['host']
+        username = record['username']
+        host = host.encode('utf-8') if isinstance(host,unicode) else host or ''
+        username = username.encode('utf-8') if isinstance(username,unicode) else username
+        payload = RECORD.pack(FLAG_HOST if record['host'] is not None else 0,len(host),len(username))
+        payload += host + username + ciphertext
+        payloads[binascii.unhexlify(dbkey)] = _seal(key,payload) if key is not None else payload
+    displacements,slots = _perfect_hash(sorted(payloads))
+    count = len(slots)
+    table = struct.pack('>{0:d}i'.format(len(displacements)),*displacements)
+    entries = []
+    data = []
+    offset = 0
+    for digest in slots:
+        payload = payloads[digest]
+        entries.append(SLOT.pack(digest,offset,len(payload)))
+        data.append(payload)
+        offset += len(payload)
+    body = table + ''.join(entries) + ''.join(data)
+    flags = FLAG_ENCRYPTED if key is not None else 0
+    header = HEADER.pack(MAGIC,VERSION,flags,count,len(displacements),int(time.time()),_checksum(key,body))
+    temp_path = '{0}.tmp{1}'.format(path,os.getpid())
+    try:
+        with open(temp_path,'wb') as snapshot_file:
+            snapshot_file.write(header + body)
+        os.rename(temp_path,path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+class Snapshot(object):
+    """ Records of a snapshot file held in memory - raises IOError when the file can't be read and
+        ValueError when it is not a snapshot, fails its integrity check or needs a key that wasn't given """
+
+    def __init__(self,path,key=None):
+        with open(path,'rb') as snapshot_file:
+            data = snapshot_file.read()
+        if len(data) < HEADER.size:
+            raise ValueError('[{0!s}] is not a snapshot file'.format(path))
+        magic,version,flags,self.count,self._buckets,self.created,checksum = HEADER.unpack_from(data,0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('[{0!s}] is not a snapshot file'.format(path))
+        self.encrypted = bool(flags & FLAG_ENCRYPTED)
+        if self.encrypted and key is None:
+            raise ValueError('Snapshot [{0!s}] is encrypted - a key is required'.format(path))
+        self._key = key if self.encrypted else None
+        if not hmac.compare_digest(_checksum(self._key,buffer(data,HEADER.size)),checksum):
+            raise ValueError('Snapshot [{0!s}] failed its integrity check - damaged or wrong key'.format(path))
+        self._data = data
+        self._table = HEADER.size
+        self._slots = self._table + 4 * self._buckets
+        self._records = self._slots + SLOT.size * self.count
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self,digest):
+        """ Slot the perfect hash gives a digest """
+        bucket = BUCKET.unpack_from(digest)[0] % self._buckets
+        d = struct.unpack_from('>i',self._data,self._table + 4 * bucket)[0]
+        return -d - 1 if d < 0 else _displaced(digest,d,self.count)
+
+    def _record(self,offset,length):
+        payload = self._data[self._records + offset:self._records + offset + length]
+        if self._key is not None:
+            payload = _open(self._key,payload)
+        flags,host_len,user_len = RECORD.unpack_from(payload,0)
+        start = RECORD.size
+        return {'host':payload[start:start + host_len] if flags & FLAG_HOST else None,
+                'username':payload[start + host_len:start + host_len + user_len],
+                'ciphertext':payload[start + host_len + user_len:]}
+
+    def get(self,dbkey):
+        """ Return the record (host, username and raw ciphertext) for dbkey or None if it is not in the snapshot """
+        if not self.count:
+            return None
+        digest = binascii.unhexlify(dbkey)
+        stored,offset,length = SLOT.unpack_from(self._data,self._slots + SLOT.size * self._slot(digest))
+        if stored != digest:
+            return None
+        return self._record(offset,length)
+
+    def iter_records(self):
+        """ Generator of (dbkey, record) tuples in slot order """
+        for i in xrange(self.count):
+            digest,offset,length = SLOT.unpack_from(self._data,self._slots + SLOT.size * i)
+            yield binascii.hexlify(digest),self._record(offset,length)
@@ -0,0 +1,1411 @@
+"""
+  Name: storage.py
+
+  Purpose: Storage backends for the password records.  A record is a PasswordRecord (see record.py) with
+           the fields host, username and rsakey (the base64 encrypted password) stored under the SHA256
+           hex dbkey created by Password - put also takes a dict with those keys.  Every backend supports
+           get, put, delete, iter_records, sync and close.
+
+           shelve  - the original format, records in a shelve (default)
+           compact - binary records appended to a single data file plus a sorted index file
+                     (<data file>.idx) searched with a binary search over an mmap
+           sqlite  - a SQLite database in WAL mode with indexed dbkey, host and username columns
+
+           MappedCompactStorage is a read-only view of a compact file held entirely in an mmap with
+           an in-memory hash index, for processes that only read.
+
+           open_storage locks the data file: writers are serialized by an exclusive lock on <data file>.wlock
+           and shelve readers take a shared lock on <data file>.lock for each operation, opening the shelve
+           again when a writer changed the file since the last one - a long lived reader never blocks writers.
+           A writer that changes the file in place also holds <data file>.lock exclusively for its session.
+           With atomic=True a writer works on a copy of the file that is renamed into place on close (or
+           thrown away by abort), so a crash never leaves a half written file - it only takes <data file>.lock
+           while it renames, so readers keep reading the old file during the session.  Compact readers
+           take no lock - the data file is only appended to and the index is replaced by a rename, so they
+           never see a torn write - and neither do SQLite readers, which always read the last commit.
+
+           The shelve and compact backends keep the host and username secondary index in <data file>.hix
+           (see index.py) up to date on put and delete, and save it when the data file is closed - and during
+           the session once enough changes are pending, so they aren't all held in memory.  find()
+           queries it.  The sqlite backend answers find() from the indexes of its table.
+
+           A compact file is a journal: sync appends nothing but an fsync, so a batch of writes costs one
+           fsync, and the index files are snapshots rewritten only once the changes since the last one reach
+           CHECKPOINT_RECORDS or a quarter of the indexed records - records after a snapshot are replayed on
+           open.  compact_file rewrites a file with only its live records.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation - moved shelve access out of password.py and added the compact format
+0.02 jwd3 10/17/2026
+    Added MappedCompactStorage read-only mmap view of a compact file
+0.03 jwd3 10/17/2026
+    Added FileLock shared/exclusive locking and the atomic commit mode for shelve writers
+0.04 jwd3 10/17/2026
+    Added the atomic commit mode to CompactStorage and abort to discard an atomic working copy
+    Compact data and index files carry a generation id so a reader never pairs an index with another data file
+0.05 jwd3 10/17/2026
+    shelve (and the dbm modules behind it) is imported when a shelve file is opened
+0.06 jwd3 10/17/2026
+    put and delete maintain the host and username secondary index (<data file>.hix) and added find
+0.07 jwd3 10/17/2026
+    CompactStorage.sync only fsyncs the appended records - the index is checkpointed every CHECKPOINT_RECORDS
+    Added compact_file and the optional compact_ratio automatic compaction of compact files
+0.08 jwd3 10/17/2026
+    get, put and delete report their timings, bytes and misses to the active instrumentation (see instrument.py)
+0.09 jwd3 10/17/2026
+    Added remove_data_file to delete a data file with its index and lock files
+0.10 jwd3 10/17/2026
+    Added the sqlite backend (SqliteStorage) - detect_backend recognizes SQLite files
+0.11 jwd3 10/17/2026
+    Records are PasswordRecords - shelve files store them encoded instead of pickled, pickled records are still read
+0.12 jwd3 10/17/2026
+    Added CompactStorage._journal for the record manifests of sync.py - remove_data_file removes <data file>.mft
+    SQLite files have a meta table with a file id and a generation bumped by every write transaction, their stamp
+0.13 jwd3 10/17/2026
+    Shared locks open the lock file read-only and read without a lock when it can't be opened or created
+0.14 jwd3 10/17/2026
+    Writers are serialized by WriteLock on <data file>.wlock - an atomic writer only takes the lock readers wait on
+    (<data file>.lock) while it commits, so readers keep reading the old file during the session
+0.15 jwd3 10/17/2026
+    CompactStorage checkpoints once the pending changes reach a quarter of the index, so imports aren't quadratic
+0.16 jwd3 10/17/2026
+    flush returns a list of file descriptors - ShelveStorage returns its dbm files so PasswordStore.commit is durable
+0.17 jwd3 10/17/2026
+    Writers save the secondary index when the shelve syncs or the compact index is checkpointed, not only on close
+0.18 jwd3 10/17/2026
+    Shelve files that hold pickled records are written with pickled records so older installs can read them
+0.19 jwd3 10/17/2026
+    Shelve readers hold the shared lock only for each operation and reopen the shelve after a writer changed it
+0.20 jwd3 10/17/2026
+    Compact file version 2 - records carry a CRC32 and replay stops at the first torn or damaged record
+0.21 jwd3 10/17/2026
+    Opening a missing shelve file for reading raises IOError like the other backends
+0.22 jwd3 10/17/2026
+    stats names the sizes 'data size', 'database size' and 'wal size'
+"""
+import os
+import base64
+import binascii
+import errno
+import fcntl
+import mmap
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+
+from pswdfile import instrument
+from pswdfile.record import PasswordRecord,as_record,decode_value,pickle_value,is_encoded
+
+__all__ = ['ShelveStorage','CompactStorage','MappedCompactStorage','SqliteStorage','FileLock','WriteLock','LockTimeout',
+           'BACKENDS',
+           'detect_backend','open_storage','copy_records','compact_file','remove_data_file']
+__version__ = "0.22"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+
+def _iter_keys(datafile):
+    """
+    Iterate the keys of an open shelve without building the full key list when the dbm supports it
+    """
+    db = getattr(datafile,'dict',datafile)
+    if hasattr(db,'firstkey'):  # gdbm
+        key = db.firstkey()
+        while key is not None:
+            yield key
+            key = db.nextkey(key)
+    elif hasattr(db,'iterkeys'):
+        for key in db.iterkeys():
+            yield key
+    else:
+        for key in db.keys():
+            yield key
+
+
+def _utf8(value):
+    return value.encode('utf-8') if isinstance(value,unicode) else value
+
+
+class LockTimeout(IOError):
+    """ The data file lock could not be acquired in time """
+
+
+@contextmanager
+def _unlocked():
+    yield
+
+
+class FileLock(object):
+    """ flock based lock on <data file>.lock - shared for readers, exclusive for writers """
+
+    def __init__(self,path,exclusive=True,timeout=10.0,suffix='.lock'):
+        self.path = path + suffix
+        self.exclusive = exclusive
+        self.timeout = timeout
+        self._file = None
+
+    def _open(self):
+        if self.exclusive:
+            return open(self.path,'a')
+        try:
+            return open(self.path,'r')  # flock works on a read-only descriptor
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        return open(self.path,'a')
+
+    def acquire(self):
+        """ Wait up to timeout seconds for the lock - raises LockTimeout.  A shared lock is skipped when the lock
+            file can't be opened or created (a reader of a file in a directory it can't write) - the read
+            goes ahead unlocked as it did before files were locked. """
+        try:
+            self._file = self._open()
+        except IOError as e:
+            if self.exclusive or e.errno not in (errno.EACCES,errno.EPERM,errno.EROFS):
+                raise
+            return self
+        operation = (fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        deadline = time.time() + self.timeout
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(self._file.fileno(),operation)
+                return self
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN,errno.EACCES):
+                    self.release()
+                    raise
+            if time.time() >= deadline:
+                self.release()
+                raise LockTimeout('Timed out after {0}s waiting for lock [{1!s}]'.format(self.timeout,self.path))
+            time.sleep(delay)
+            delay = min(delay * 2,0.05)
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # closing the file releases the flock
+            self._file = None
+
+
+class WriteLock(object):
+    """ Lock of a writer session.  Writers are serialized by an exclusive lock on <data file>.wlock.  A writer
+        that changes the data file in place also holds the exclusive lock on <data file>.lock that readers
+        share for the whole session; an atomic writer takes it only to rename its copy into place. """
+
+    SUFFIX = '.wlock'
+
+    def __init__(self,path,timeout=10.0,atomic=False):
+        self.writer_lock = FileLock(path,exclusive=True,timeout=timeout,suffix=self.SUFFIX)
+        self.file_lock = FileLock(path,exclusive=True,timeout=timeout)
+        self.atomic = atomic
+        self.paths = (self.file_lock.path,self.writer_lock.path)
+
+    def acquire(self):
+        """ Wait up to timeout seconds for each lock - raises LockTimeout """
+        self.writer_lock.acquire()
+        if not self.atomic:
+            try:
+                self.file_lock.acquire()
+            except:
+                self.writer_lock.release()
+                raise
+        return self
+
+    @contextmanager
+    def committing(self):
+        """ Hold the lock readers share while an atomic writer renames its copy over the data file """
+        if self.atomic:
+            self.file_lock.acquire()
+        try:
+            yield
+        finally:
+            if self.atomic:
+                self.file_lock.release()
+
+    def release(self):
+        self.file_lock.release()
+        self.writer_lock.release()
+
+
+class Storage(object):
+    """ Base class for the storage backends - releases the data file lock on close and maintains the
+        secondary index """
+
+    name = None
+    lock = None
+    _secondary = None  # SecondaryIndex once loaded - put and delete keep it up to date
+    _new_file = False  # the data file was created empty by this open
+    _index_stale = False  # writes were made before the index was loaded
+    _index_checkpointed = False  # the secondary index was saved during the session
+    JOURNALED = False  # the secondary index can catch up with records appended after it was saved
+    CHECKPOINT_RECORDS = 1000  # changes a journaled index may lag behind the data file
+
+    def sync(self):
+        pass
+
+    def flush(self):
+        """ Write buffered changes to the operating system and return the list of file descriptors to fsync to
+            make them durable, empty when there is nothing to fsync.  Lets a caller fsync outside its own lock. """
+        self.sync()
+        return []
+
+    def close(self):
+        if self._secondary is not None:
+            self._secondary.close()
+            self._secondary = None
+        if self.lock is not None:
+            self.lock.release()
+            self.lock = None
+
+    def garbage_ratio(self):
+        """ Fraction of the stored records that are replaced or deleted, None when the backend can't tell """
+        return None
+
+    def _secondary_stamp(self):
+        """ Tuple of the stamp identifying the data the secondary index describes and the data size it covers """
+        from pswdfile.cache import file_signature
+        return file_signature(self.path),0
+
+    def _replay_secondary(self,index,end):
+        """ Bring a loaded secondary index up to the data size end - False when it can't be """
+        return index.covered == end
+
+    def _load_secondary_index(self):
+        from pswdfile.index import SecondaryIndex
+        if self._new_file:
+            return SecondaryIndex()
+        if self._index_stale:
+            return None
+        stamp,end = self._secondary_stamp()
+        index = SecondaryIndex.load(self.path,stamp)
+        if index is not None and not self._replay_secondary(index,end):
+            index.close()
+            return None
+        return index
+
+    def _writable_index(self):
+        """ The index to update on a write - None when there is no valid index (it is rebuilt on the next find) """
+        if self._secondary is None and not self._index_stale:
+            self._secondary = self._load_secondary_index()
+            self._index_stale = self._secondary is None
+        return self._secondary
+
+    def _index_put(self,dbkey,record):
+        if self._writable_index() is not None:
+            self._secondary.add(dbkey,record['host'],record['username'])
+
+    def _index_delete(self,dbkey):
+        if self._writable_index() is not None:
+            self._secondary.discard(dbkey)
+
+    def _checkpoint_index(self):
+        """ Save the index of a writer during the session once its changes reach CHECKPOINT_RECORDS or a quarter
+            of the saved index, so an import doesn't hold every change in memory until close.  An atomic session
+            saves it next to its working copy - _save_index saves it over the index of the data file on close. """
+        index = self._secondary
+        if index is not None and self.mode != 'r' and len(index) >= max(self.CHECKPOINT_RECORDS,index.indexed // 4):
+            if index.save(self._work_path,*self._secondary_stamp()):
+                self._index_checkpointed = True
+
+    def _save_index(self):
+        """ Save the index of a writer once the data file is closed (and committed) - a journaled index is
+            saved once it lags CHECKPOINT_RECORDS changes behind or was checkpointed to a working copy """
+        index = self._secondary
+        if index is not None and self.mode != 'r':
+            if self._index_checkpointed and (not self.JOURNALED or self._work_path != self.path):
+                index.save(self.path,*self._secondary_stamp())  # the checkpoint doesn't describe the closed file
+            elif index.dirty and (not self.JOURNALED or index.covered is None or
+                                  len(index) >= self.CHECKPOINT_RECORDS):
+                index.save(self.path,*self._secondary_stamp())
+        self._remove_work_index()
+
+    def _remove_work_index(self):
+        """ Remove the index an atomic session checkpointed next to its working copy """
+        if self._index_checkpointed and self._work_path != self.path:
+            from pswdfile.index import SecondaryIndex
+            self._remove_files(self._work_path,(SecondaryIndex.SUFFIX,))
+
+    def secondary_index(self):
+        """ The SecondaryIndex of the data file - loaded from <data file>.hix or rebuilt with a scan """
+        if self._secondary is None:
+            self._secondary = self._load_secondary_index()
+            if self._secondary is None:
+                from pswdfile.index import SecondaryIndex
+                stamp = self._secondary_stamp()  # taken first - a change during the scan invalidates it
+                self._secondary = SecondaryIndex.build(self.iter_records())
+                self._index_stale = False
+                if self.mode == 'r':
+                    self._secondary.save(self.path,*stamp)
+        return self._secondary
+
+    def find(self,host=None,username=None,prefix=None):
+        """
+        Query the secondary index
+        :param host: exact host
+        :param username: exact username
+        :param prefix: username prefix
+        :return: generator of (dbkey, record) tuples in dbkey order
+        """
+        for dbkey in self.secondary_index().find(host,username,prefix):
+            record = self.get(dbkey)
+            if record is not None:
+                yield dbkey,record
+
+    def abort(self):
+        """ Close without committing an atomic working copy - other storage just closes """
+        self.close()
+
+    def _committing(self):
+        """ Context of the rename of an atomic working copy over the data file - holds the lock readers wait on """
+        return self.lock.committing() if isinstance(self.lock,WriteLock) else _unlocked()
+
+    @staticmethod
+    def _copy_files(source,target,suffixes):
+        """ Copy source + suffix to target + suffix for every suffix that exists """
+        for suffix in suffixes:
+            if os.path.exists(source + suffix):
+                with open(source + suffix,'rb') as source_file,open(target + suffix,'wb') as target_file:
+                    target_file.write(source_file.read())
+
+    @staticmethod
+    def _commit_files(source,target,suffixes):
+        """ fsync and rename source + suffix over target + suffix in suffix order """
+        for suffix in suffixes:
+            if os.path.exists(source + suffix):
+                with open(source + suffix,'rb') as work_file:
+                    os.fsync(work_file.fileno())
+                os.rename(source + suffix,target + suffix)
+
+    @staticmethod
+    def _remove_files(path,suffixes):
+        for suffix in suffixes:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+class ShelveStorage(Storage):
+    """ Records stored in a shelve file, encoded by PasswordRecord.encode - records written as (base64)
+        pickled dicts by earlier versions are still read.  A file that holds pickled records is written with
+        pickled records too, so older installs can still read it - a rewrite (compact_file, rekey_file)
+        keeps its format and pwutil migrate into a new shelve file converts it.
+
+        With atomic=True the shelve is opened on a copy of the data file (every file the dbm uses)
+        which is renamed over the original on close.
+
+        A reader opened by open_storage holds the shared lock only while an operation runs, and opens the
+        shelve again when the file signature changed since the last operation."""
+
+    name = 'shelve'
+    SUFFIXES = ('','.db','.dat','.dir','.bak','.pag')  # files the dbm flavors create for a path
+    read_lock = None  # shared FileLock a reader takes for each operation (see open_storage)
+    _reading_depth = 0
+
+    def __init__(self,path,mode='r',atomic=False):
+        self.path = path
+        self.mode = mode
+        self._work_path = path
+        if mode == 'r' and not any(os.path.exists(path + suffix) for suffix in self.SUFFIXES):
+            # an IOError like the other backends - a reader of a sharded file reads the manifest again on it
+            raise IOError('Shelve data file [{0!s}] NOT found'.format(path))
+        if atomic and mode != 'r':
+            self._work_path = '{0}.tmp{1}'.format(path,os.getpid())
+            if mode != 'n':
+                self._copy_files(path,self._work_path,self.SUFFIXES)
+        self._new_file = mode == 'n' or (mode == 'c' and not any(os.path.exists(path + suffix)
+                                                                   for suffix in self.SUFFIXES))
+        self._flush_fds = []
+        self._pickled = None  # the file holds pickled records, None until the first put checks
+        import shelve  # imported here so compact file users never load the dbm modules
+        self.datafile = shelve.open(self._work_path,flag=mode)
+        self.db = self.datafile.dict  # records are stored encoded (see record.py) without the shelve pickling
+
+    def _start_reading(self,read_lock):
+        """ Called by open_storage while it holds read_lock - every operation takes it again """
+        from pswdfile.cache import file_signature
+        self.read_lock = read_lock
+        self._signature = file_signature(self.path)
+
+    @contextmanager
+    def _reading(self):
+        """ Hold the shared lock of a reader for one operation - the shelve is opened again first when a
+            writer changed the file since the last operation """
+        if self.read_lock is None or self._reading_depth:
+            yield
+            return
+        from pswdfile.cache import file_signature
+        self.read_lock.acquire()
+        self._reading_depth += 1
+        try:
+            signature = file_signature(self.path)
+            if signature != self._signature:
+                self.__reopen(signature)
+            yield
+        finally:
+            self._reading_depth -= 1
+            self.read_lock.release()
+
+    def __reopen(self,signature):
+        import shelve
+        self.datafile.close()
+        if self._secondary is not None:  # describes the file as it was
+            self._secondary.close()
+            self._secondary = None
+        self.datafile = shelve.open(self.path,flag='r')
+        self.db = self.datafile.dict
+        self._signature = signature
+
+    def __contains__(self,dbkey):
+        with self._reading():
+            return dbkey in self.db
+
+    def get(self,dbkey):
+        """ Return the record for dbkey or None if it does not exist """
+        with self._reading():
+            return self.__get(dbkey)
+
+    def __get(self,dbkey):
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        try:
+            value = self.db[dbkey]
+        except KeyError:
+            if inst is not None:
+                inst.record('lookup',start)
+                inst.count('misses')
+            return None
+        if inst is None:
+            return decode_value(value)
+        inst.record('lookup',start,len(value))
+        start = instrument.clock()
+        record = decode_value(value)
+        inst.record('decode',start)
+        return record
+
+    def put(self,dbkey,record):
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        record = as_record(record)
+        value = pickle_value(record) if self._pickled_records() else record.encode()
+        if inst is not None:
+            inst.record('encode',start)
+            start = instrument.clock()
+        self.db[dbkey] = value
+        if inst is not None:
+            inst.record('write',start,len(value))
+        self._index_put(dbkey,record)
+
+    def _pickled_records(self):
+        """ True when records are written pickled - the file holds pickled records of an earlier version.  A
+            rewrite of an existing file (mode 'n' with atomic) checks the file it replaces. """
+        if self._pickled is None:
+            if self._work_path != self.path and self.mode == 'n':
+                if any(os.path.exists(self.path + suffix) for suffix in self.SUFFIXES):
+                    import shelve
+                    original = shelve.open(self.path,flag='r')
+                    try:
+                        self._pickled = self._holds_pickled(original)
+                    finally:
+                        original.close()
+            elif not self._new_file:
+                self._pickled = self._holds_pickled(self.datafile)
+            self._pickled = bool(self._pickled)
+        return self._pickled
+
+    @staticmethod
+    def _holds_pickled(datafile):
+        """ True when the first record of an open shelve is pickled """
+        for dbkey in _iter_keys(datafile):
+            return not is_encoded(datafile.dict[dbkey])
+        return False
+
+    def delete(self,dbkey):
+        """ Delete the record for dbkey - returns False if it does not exist """
+        self._index_delete(dbkey)
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        try:
+            del self.db[dbkey]
+        except KeyError:
+            return False
+        finally:
+            if inst is not None:
+                inst.record('delete',start)
+        return True
+
+    def iter_records(self):
+        """ Generator of (dbkey, record) tuples - a reader holds the shared lock until it is exhausted or closed """
+        with self._reading():
+            for dbkey in _iter_keys(self.datafile):
+                yield dbkey,decode_value(self.db[dbkey])
+
+    def find(self,host=None,username=None,prefix=None):
+        with self._reading():
+            for item in super(ShelveStorage,self).find(host,username,prefix):
+                yield item
+
+    def sync(self):
+        self.datafile.sync()
+        self._checkpoint_index()
+
+    def flush(self):
+        """ Sync the shelve and return descriptors of its files and their directory - the dbm modules don't
+            expose theirs, so the files are opened again.  They stay open until the next flush or close. """
+        self.sync()
+        self.__close_flush_fds()
+        if self.mode == 'r':
+            return []
+        paths = [self._work_path + suffix for suffix in self.SUFFIXES if os.path.exists(self._work_path + suffix)]
+        for path in paths + [os.path.dirname(os.path.abspath(self._work_path))]:  # the dir for renamed files
+            try:
+                self._flush_fds.append(os.open(path,os.O_RDONLY))
+            except OSError:
+                pass  # removed since the check - the dbm replaces files like .dir on sync
+        return list(self._flush_fds)
+
+    def __close_flush_fds(self):
+        fds,self._flush_fds = self._flush_fds,[]
+        for fd in fds:
+            os.close(fd)
+
+    def close(self):
+        try:
+            self.__close_flush_fds()
+            self.datafile.close()
+            if self._work_path != self.path:
+                # commit - move every file of the working copy over the original once the readers let go of it
+                try:
+                    with self._committing():
+                        self._commit_files(self._work_path,self.path,self.SUFFIXES)
+                except LockTimeout:
+                    self._remove_files(self._work_path,self.SUFFIXES)
+                    self._remove_work_index()
+                    raise
+            self._save_index()
+        finally:
+            super(ShelveStorage,self).close()
+
+    def abort(self):
+        try:
+            self.__close_flush_fds()
+            self.datafile.close()
+            if self._work_path != self.path:
+                self._remove_files(self._work_path,self.SUFFIXES)
+                self._remove_work_index()
+        finally:
+            super(ShelveStorage,self).close()
+
+
+class CompactStorage(Storage):
+    """ Records stored in a compact binary layout with a sorted index file.
+
+        Data file: an 8 byte file header followed by records appended one after the other.  Each record
+        has a fixed header (CRC32, raw 32 byte dbkey digest, flags, host length, username length, ciphertext
+        length) followed by the host, username and the raw (not base64) ciphertext bytes.  The CRC32 covers
+        the rest of the header and the bytes that follow it - version 1 files have records without it and
+        are still read and appended to.  Updates and deletes append a new record or a tombstone so the data
+        file is only ever appended to.
+
+        Index file: a header with the entry count and the data file size it covers followed by
+        (digest, offset) entries sorted by digest.  Lookups binary search the mmapped index.  Changes
+        made since the index was written are kept in memory and merged into a new index on sync.
+        Records appended after the indexed data size (e.g. a crash before sync) are recovered on open, up to
+        the first one that is torn or damaged (see _valid) - a writer truncates the file there.
+        Both headers carry the generation id of the data file, an index from another generation is ignored.
+        The index is only rewritten (checkpointed) once the changes not in it reach CHECKPOINT_RECORDS or
+        a quarter of its entries, so a small update costs an append and an fsync and a large import
+        rewrites the index a logarithmic number of times.  The index header counts every record in the data
+        file, replaced and deleted ones included, for garbage_ratio.
+
+        compact_ratio enables automatic compaction: on close a writer rewrites the file with compact_file
+        once at least COMPACT_MIN_RECORDS records are stored and garbage_ratio() reaches compact_ratio.
+
+        With atomic=True the data and index files are copied to a working file that is renamed into
+        place on close."""
+
+    name = 'compact'
+    MAGIC = 'PWDC'
+    INDEX_MAGIC = 'PWDI'
+    VERSION = 2
+    VERSIONS = (1,2)  # versions read - a file is appended to in its own version
+    INDEX_VERSION = 2
+    FILE_HEADER = struct.Struct('>4sB3xQ')
+    RECORD_CRC = struct.Struct('>I')  # starts the records of version 2 files
+    RECORD_HEADER = struct.Struct('>32sBHHI')
+    INDEX_HEADER = struct.Struct('>4sB3xIQQQ')  # magic, version, entries, data size, generation, records
+    INDEX_ENTRY = struct.Struct('>32sQ')
+    FLAG_DELETED = 0x01
+    FLAG_HOST = 0x02
+    FLAG_URLSAFE = 0x04
+    SUFFIXES = ('','.idx')  # data file first - a reader that sees the new data with the old index rescans
+    JOURNALED = True
+    COMPACT_MIN_RECORDS = 1000
+    compact_ratio = None
+
+    def __init__(self,path,mode='r',atomic=False):
+        self.path = path
+        self.mode = mode
+        self._work_path = path
+        self._pending = {}  # digest -> offset of changes not in the index yet, None when deleted
+        self._index = None
+        self._index_count = 0
+        self._records = 0  # records in the data file, replaced and deleted ones included
+        self._live = 0  # records that are neither replaced nor deleted
+        exists = os.path.exists(path)
+        if mode == 'r' and not exists:
+            raise IOError('Compact data file [{0!s}] NOT found'.format(path))
+        if atomic and mode != 'r':
+            self._work_path = '{0}.tmp{1}'.format(path,os.getpid())
+            if mode != 'n':
+                self._copy_files(path,self._work_path,self.SUFFIXES)
+        self.index_path = self._work_path + '.idx'
+        self._new_file = mode == 'n' or not exists
+        if mode == 'n' or not os.path.exists(self._work_path):
+            with open(self._work_path,'wb') as data:
+                generation, = struct.unpack('>Q',os.urandom(8))
+                data.write(self.FILE_HEADER.pack(self.MAGIC,self.VERSION,generation))
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        self.data = open(self._work_path,'rb' if mode == 'r' else 'r+b')
+        header = self.data.read(self.FILE_HEADER.size)
+        if len(header) < self.FILE_HEADER.size or self.FILE_HEADER.unpack(header)[0] != self.MAGIC:
+            self.data.close()
+            raise ValueError('[{0!s}] is not a compact password file'.format(path))
+        _,self.version,self.generation = self.FILE_HEADER.unpack(header)
+        if self.version not in self.VERSIONS:
+            self.data.close()
+            raise ValueError('Compact password file [{0!s}] has unsupported version {1:d}'.format(path,self.version))
+        self._crc_size = self._crc_bytes(self.version)
+        self._header_size = self._crc_size + self.RECORD_HEADER.size
+        self._load_index()
+
+    @classmethod
+    def is_compact(cls,path):
+        """ True when path is a compact data file """
+        try:
+            with open(path,'rb') as data:
+                return data.read(len(cls.MAGIC)) == cls.MAGIC
+        except IOError:
+            return False
+
+    def _load_index(self):
+        """ mmap the index file and recover records appended after it was written """
+        indexed_size = self.FILE_HEADER.size
+        if os.path.exists(self.index_path):
+            with open(self.index_path,'rb') as index_file:
+                self._index = mmap.mmap(index_file.fileno(),0,access=mmap.ACCESS_READ)
+            magic = version = generation = None
+            if len(self._index) >= self.INDEX_HEADER.size:
+                magic,version,count,size,generation,records = self.INDEX_HEADER.unpack_from(self._index,0)
+            if (magic == self.INDEX_MAGIC and version == self.INDEX_VERSION and generation == self.generation and
+                    len(self._index) == self.INDEX_HEADER.size + count * self.INDEX_ENTRY.size):
+                self._index_count,indexed_size = count,size
+                self._records,self._live = records,count
+            else:
+                # the index is derived data - ignore a damaged one and rebuild it from the data file
+                self._index.close()
+                self._index = None
+        # replay the journal - records appended after the index was written
+        for digest,flags,offset in self._scan(indexed_size):
+            deleted = flags & self.FLAG_DELETED
+            self._live += (0 if deleted else 1) - (self._offset(digest) is not None)
+            self._records += 1
+            self._pending[digest] = None if deleted else offset
+        self._end = self._scan_end  # end of the records this storage sees
+        if self.mode != 'r' and self._scan_end < os.fstat(self.data.fileno()).st_size:
+            # drop a record torn by a failed write so appends start on a record boundary
+            self.data.truncate(self._scan_end)
+
+    def _scan(self,offset,size=None):
+        """ Generator of (digest, flags, offset) for the complete and valid records from offset to size (default
+            the end of the data file) - it stops at the first torn or damaged record """
+        if size is None:
+            size = os.fstat(self.data.fileno()).st_size
+        self.data.seek(offset)
+        while offset + self._header_size <= size:
+            header = self.data.read(self._header_size)
+            digest,flags,host_len,user_len,cipher_len = self.RECORD_HEADER.unpack_from(header,self._crc_size)
+            end = offset + self._header_size + host_len + user_len + cipher_len
+            if end > size or not self._valid(header + self.data.read(end - offset - self._header_size),0,
+                                             self._crc_size):
+                break
+            yield digest,flags,offset
+            offset = end
+            self.data.seek(offset)
+        self._scan_end = offset
+
+    @staticmethod
+    def _crc_bytes(version):
+        """ Size of the CRC32 that starts each record of a file of version """
+        return CompactStorage.RECORD_CRC.size if version >= 2 else 0
+
+    @classmethod
+    def _valid(cls,buf,offset,crc_size):
+        """ True when the complete record at offset in buf is well formed and its CRC32 (if it has one) matches.
+            A record has a non zero digest and known flags, a tombstone has no fields and a password has a
+            username and a ciphertext - so a zero filled tail left by a crash is never taken for records. """
+        start = offset + crc_size
+        digest,flags,host_len,user_len,cipher_len = cls.RECORD_HEADER.unpack_from(buf,start)
+        if digest == '\0' * len(digest) or flags & ~(cls.FLAG_DELETED | cls.FLAG_HOST | cls.FLAG_URLSAFE):
+            return False
+        if flags & cls.FLAG_DELETED:
+            if flags != cls.FLAG_DELETED or host_len or user_len or cipher_len:
+                return False
+        elif not user_len or not cipher_len or (host_len and not flags & cls.FLAG_HOST):
+            return False
+        if crc_size:
+            end = start + cls.RECORD_HEADER.size + host_len + user_len + cipher_len
+            return cls.RECORD_CRC.unpack_from(buf,offset)[0] == zlib.crc32(buf[start:end]) & 0xffffffff
+        return True
+
+    def _index_lookup(self,digest):
+        """ Binary search the index for digest - returns the record offset or None """
+        low,high = 0,self._index_count
+        while low < high:
+            middle = (low + high) // 2
+            position = self.INDEX_HEADER.size + middle * self.INDEX_ENTRY.size
+            key = self._index[position:position + 32]
+            if key < digest:
+                low = middle + 1
+            elif key > digest:
+                high = middle
+            else:
+                return self.INDEX_ENTRY.unpack_from(self._index,position)[1]
+        return None
+
+    def _offset(self,digest):
+        if digest in self._pending:
+            return self._pending[digest]
+        return self._index_lookup(digest)
+
+    def _read(self,offset):
+        self.data.seek(offset)
+        header = self.data.read(self._header_size)
+        host_len,user_len,cipher_len = self.RECORD_HEADER.unpack_from(header,self._crc_size)[2:]
+        return self._decode(header + self.data.read(host_len + user_len + cipher_len),0,self._crc_size)
+
+    @classmethod
+    def _decode(cls,buf,offset,crc_size):
+        """ Decode the record at offset in buf - returns (dbkey, record) """
+        digest,flags,host_len,user_len,cipher_len = cls.RECORD_HEADER.unpack_from(buf,offset + crc_size)
+        start = offset + crc_size + cls.RECORD_HEADER.size
+        encode = base64.urlsafe_b64encode if flags & cls.FLAG_URLSAFE else base64.b64encode
+        record = PasswordRecord(buf[start:start + host_len] if flags & cls.FLAG_HOST else None,
+                                buf[start + host_len:start + host_len + user_len],
+                                encode(buf[start + host_len + user_len:start + host_len + user_len + cipher_len]))
+        return binascii.hexlify(digest),record
+
+    def _append(self,digest,flags,host='',username='',ciphertext=''):
+        host = _utf8(host)
+        username = _utf8(username)
+        self.data.seek(0,os.SEEK_END)
+        offset = self.data.tell()
+        record = (self.RECORD_HEADER.pack(digest,flags,len(host),len(username),len(ciphertext)) +
+                  host + username + ciphertext)
+        if self._crc_size:
+            record = self.RECORD_CRC.pack(zlib.crc32(record) & 0xffffffff) + record
+        self.data.write(record)
+        self._records += 1
+        self._end = self.data.tell()
+        return offset
+
+    def _merged_entries(self):
+        """ Generator of (digest, offset) in digest order merging the index with the pending changes """
+        pending = sorted(self._pending.iteritems())
+        p = 0
+        for i in xrange(self._index_count):
+            position = self.INDEX_HEADER.size + i * self.INDEX_ENTRY.size
+            digest,offset = self.INDEX_ENTRY.unpack_from(self._index,position)
+            while p < len(pending) and pending[p][0] < digest:
+                if pending[p][1] is not None:
+                    yield pending[p]
+                p += 1
+            if p < len(pending) and pending[p][0] == digest:
+                if pending[p][1] is not None:
+                    yield pending[p]
+                p += 1
+            else:
+                yield digest,offset
+        for digest,offset in pending[p:]:
+            if offset is not None:
+                yield digest,offset
+
+    def __contains__(self,dbkey):
+        return self._offset(binascii.unhexlify(dbkey)) is not None
+
+    def get(self,dbkey):
+        """ Return the record for dbkey or None if it does not exist """
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        offset = self._offset(binascii.unhexlify(dbkey))
+        if offset is None:
+            if inst is not None:
+                inst.record('lookup',start)
+                inst.count('misses')
+            return None
+        record = self._read(offset)[1]
+        if inst is not None:
+            inst.record('lookup',start,self.data.tell() - offset)
+        return record
+
+    def put(self,dbkey,record):
+        rsakey = record['rsakey']
+        if not record['username'] or not rsakey:
+            raise ValueError('A compact record needs a username and a password')
+        flags = 0
+        if record['host'] is not None:
+            flags |= self.FLAG_HOST
+        if '-' in rsakey or '_' in rsakey:
+            flags |= self.FLAG_URLSAFE
+            ciphertext = base64.urlsafe_b64decode(rsakey)
+        else:
+            ciphertext = base64.b64decode(rsakey)
+        digest = binascii.unhexlify(dbkey)
+        if self._offset(digest) is None:
+            self._live += 1
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        offset = self._append(digest,flags,record['host'] or '',record['username'],ciphertext)
+        self._pending[digest] = offset
+        if inst is not None:
+            inst.record('write',start,self._end - offset)
+        self._index_put(dbkey,record)
+
+    def delete(self,dbkey):
+        """ Delete the record for dbkey - returns False if it does not exist """
+        digest = binascii.unhexlify(dbkey)
+        if self._offset(digest) is None:
+            return False
+        self._index_delete(dbkey)
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        self._append(digest,self.FLAG_DELETED)
+        if inst is not None:
+            inst.record('delete',start)
+        self._pending[digest] = None
+        self._live -= 1
+        return True
+
+    def iter_records(self):
+        """ Generator of (dbkey, record) tuples in dbkey order """
+        for _,offset in self._merged_entries():
+            yield self._read(offset)
+
+    def garbage_ratio(self):
+        return 1.0 - float(self._live) / self._records if self._records else 0.0
+
+    def stats(self):
+        """ Dict of the record counts and the data size - the bytes of the records this storage sees """
+        return {'records':self._records,'live':self._live,'data size':self._end,'unindexed':len(self._pending)}
+
+    def sync(self):
+        """ Flush and fsync the appended records - one fsync commits every record written since the last
+            sync.  The index is checkpointed once enough changes are not in it (see _checkpoint_due). """
+        for fd in self.flush():
+            os.fsync(fd)
+
+    def flush(self):
+        if self.mode == 'r':
+            return []
+        if self._checkpoint_due():
+            self.checkpoint()
+        self.data.flush()
+        return [self.data.fileno()]
+
+    def _checkpoint_due(self):
+        """ True once the pending changes reach CHECKPOINT_RECORDS or a quarter of the index - a fixed count
+            would rewrite the whole index every CHECKPOINT_RECORDS records of an import """
+        return len(self._pending) >= max(self.CHECKPOINT_RECORDS,self._index_count // 4)
+
+    def checkpoint(self):
+        """ Write a new index merging the pending changes """
+        if self.mode == 'r' or not self._pending:
+            return
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        self.data.seek(0,os.SEEK_END)
+        data_size = self.data.tell()
+        temp_path = self.index_path + '.tmp'
+        count = 0
+        with open(temp_path,'wb') as index_file:
+            index_file.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC,self.INDEX_VERSION,0,data_size,self.generation,
+                                                    self._records))
+            for digest,offset in self._merged_entries():
+                index_file.write(self.INDEX_ENTRY.pack(digest,offset))
+                count += 1
+            index_file.seek(0)
+            index_file.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC,self.INDEX_VERSION,count,data_size,
+                                                    self.generation,self._records))
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.rename(temp_path,self.index_path)
+        if self._index is not None:
+            self._index.close()
+        with open(self.index_path,'rb') as index_file:
+            self._index = mmap.mmap(index_file.fileno(),0,access=mmap.ACCESS_READ)
+        self._index_count = count
+        self._pending = {}
+        self._checkpoint_index()
+
+    def close(self):
+        try:
+            try:
+                self.sync()
+                if self._index is None or self._work_path != self.path or len(self._pending) >= self.CHECKPOINT_RECORDS:
+                    # always leave an index for a new file or a rewritten copy, and don't leave readers more
+                    # than CHECKPOINT_RECORDS changes to replay on open
+                    self.checkpoint()
+            finally:
+                self.__close_files()
+            if self._work_path != self.path:
+                self._commit_files(self._work_path,self.path,self.SUFFIXES)
+            self._save_index()
+            if (self.mode != 'r' and self.compact_ratio is not None and self._records >= self.COMPACT_MIN_RECORDS and
+                    self.garbage_ratio() >= self.compact_ratio):
+                compact_file(self.path,self.name,lock=False)  # this storage still holds the lock
+        finally:
+            super(CompactStorage,self).close()
+
+    def _secondary_stamp(self):
+        # the generation identifies the data file and records after the covered size are replayed
+        return self.generation,self._end
+
+    def _journal(self,start,end):
+        """ Generator of (dbkey, record) for the changes appended from data size start to end, None for a delete """
+        for digest,flags,offset in self._scan(start,end):
+            if flags & self.FLAG_DELETED:
+                yield binascii.hexlify(digest),None
+            else:
+                yield self._read(offset)
+
+    def _replay_secondary(self,index,end):
+        if index.covered > end:
+            return False
+        for dbkey,record in self._journal(index.covered,end):
+            if record is None:
+                index.discard(dbkey)
+            else:
+                index.add(dbkey,record['host'],record['username'])
+        return True
+
+    def abort(self):
+        try:
+            self.__close_files()
+            if self._work_path != self.path:
+                self._remove_files(self._work_path,self.SUFFIXES)
+                self._remove_work_index()
+        finally:
+            super(CompactStorage,self).close()
+
+    def __close_files(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        self.data.close()
+
+
+class MappedCompactStorage(Storage):
+    """ Read-only view of a compact data file for processes that only read.
+
+        The data file is mapped into memory once and the index is loaded into a dict, so a lookup is
+        a dict access and a slice of the mapping with no system calls.  Processes forked after it is
+        opened share the mapped pages through the page cache.  The view does not see records written
+        after it was opened - call reload() to pick them up."""
+
+    name = CompactStorage.name
+    mode = 'r'
+
+    def __init__(self,path):
+        self.path = path
+        self.data = None
+        self.reload()
+
+    def reload(self):
+        """ Map the current data file and rebuild the index """
+        # CompactStorage in read mode checks the format and merges unindexed records with the index
+        storage = CompactStorage(self.path,'r')
+        try:
+            offsets = dict(storage._merged_entries())
+            # map the file the index was built from, after it was built, so it covers every record
+            data = mmap.mmap(storage.data.fileno(),0,access=mmap.ACCESS_READ)
+        finally:
+            storage.close()
+        if self.data is not None:
+            self.data.close()
+        self.data = data
+        self.offsets = offsets
+        self.generation = storage.generation
+        self._end = storage._end
+        self._crc_size = storage._crc_size
+
+    def __contains__(self,dbkey):
+        return binascii.unhexlify(dbkey) in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self,dbkey):
+        """ Return the record for dbkey or None if it does not exist """
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        offset = self.offsets.get(binascii.unhexlify(dbkey))
+        if offset is None:
+            if inst is not None:
+                inst.record('lookup',start)
+                inst.count('misses')
+            return None
+        record = CompactStorage._decode(self.data,offset,self._crc_size)[1]
+        if inst is not None:
+            inst.record('lookup',start)
+        return record
+
+    def _secondary_stamp(self):
+        return self.generation,self._end
+
+    def _replay_secondary(self,index,end):
+        if index.covered > end:
+            return False
+        offset = index.covered
+        while offset < end:
+            digest,flags,host_len,user_len,cipher_len = CompactStorage.RECORD_HEADER.unpack_from(
+                self.data,offset + self._crc_size)
+            if flags & CompactStorage.FLAG_DELETED:
+                index.discard(binascii.hexlify(digest))
+            else:
+                dbkey,record = CompactStorage._decode(self.data,offset,self._crc_size)
+                index.add(dbkey,record['host'],record['username'])
+            offset += self._crc_size + CompactStorage.RECORD_HEADER.size + host_len + user_len + cipher_len
+        return True
+
+    def put(self,dbkey,record):
+        raise IOError('Mapped compact file [{0!s}] is read-only'.format(self.path))
+
+    def delete(self,dbkey):
+        raise IOError('Mapped compact file [{0!s}] is read-only'.format(self.path))
+
+    def iter_records(self):
+        """ Generator of (dbkey, record) tuples in dbkey order """
+        for digest in sorted(self.offsets):
+            yield CompactStorage._decode(self.data,self.offsets[digest],self._crc_size)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        super(MappedCompactStorage,self).close()
+
+
+class SqliteStorage(Storage):
+    """ Records stored in a SQLite database in WAL mode.
+
+        Table records: dbkey (primary key, the table is clustered on it), host, username and rsakey with
+        indexes on host and username, so find() is answered by SQLite instead of a .hix file.  Statements
+        are parameterized and reuse the prepared statements cached by the connection.
+
+        A writer keeps a transaction open from its first write to the next sync, so a batch of writes
+        is one commit.  Readers see the last commit and never wait for a writer - the write ahead log
+        lets them read while it writes - so they take no file lock.
+
+        With atomic=True the whole session is one transaction committed on close (or rolled back by
+        abort), mode 'n' included, so readers keep seeing the old records until then.
+
+        Table meta: a random file id and a generation every write transaction bumps.  They identify the
+        committed records for the manifest cache - the file signature of a database changes whenever it
+        is opened, since its write ahead log is created on open and removed on close."""
+
+    name = 'sqlite'
+    MAGIC = 'SQLite format 3\0'
+    SUFFIXES = ('','-wal','-shm')
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS records (dbkey TEXT PRIMARY KEY,host TEXT,username TEXT NOT NULL,'
+              'rsakey TEXT NOT NULL) WITHOUT ROWID',
+              'CREATE INDEX IF NOT EXISTS records_host ON records (host)',
+              'CREATE INDEX IF NOT EXISTS records_username ON records (username)',
+              'CREATE TABLE IF NOT EXISTS meta (id TEXT NOT NULL,generation INTEGER NOT NULL)')
+    INIT_META = 'INSERT INTO meta (id,generation) SELECT ?,0 WHERE NOT EXISTS (SELECT 1 FROM meta)'
+    SELECT = 'SELECT host,username,rsakey FROM records WHERE dbkey = ?'
+    INSERT = 'INSERT OR REPLACE INTO records (dbkey,host,username,rsakey) VALUES (?,?,?,?)'
+    DELETE = 'DELETE FROM records WHERE dbkey = ?'
+    BUSY_TIMEOUT = 10.0  # seconds a statement waits on a lock held by another connection
+    _stamp = None  # stamp of the committed records, kept on close
+
+    def __init__(self,path,mode='r',atomic=False):
+        self.path = path
+        self.mode = mode
+        self.atomic = atomic and mode != 'r'
+        exists = os.path.exists(path)
+        if mode == 'r' and not exists:
+            raise IOError('SQLite data file [{0!s}] NOT found'.format(path))
+        if exists and not self.is_sqlite(path) and os.path.getsize(path):
+            raise ValueError('[{0!s}] is not a SQLite password file'.format(path))
+        self._new_file = mode == 'n' or not exists
+        import sqlite3  # imported here so shelve and compact file users never load it
+        # transactions are managed here (isolation_level None) and shared sessions serialize their threads
+        self.db = sqlite3.connect(path,timeout=self.BUSY_TIMEOUT,isolation_level=None,check_same_thread=False)
+        self.db.text_factory = str
+        self._in_transaction = False
+        try:
+            if mode == 'r':
+                self.db.execute('PRAGMA query_only = 1')
+            else:
+                self.db.execute('PRAGMA journal_mode = WAL')
+                self.db.execute('PRAGMA synchronous = FULL')  # a commit is durable once sync returns
+                for statement in self.SCHEMA:
+                    self.db.execute(statement)
+                self.db.execute(self.INIT_META,(binascii.hexlify(os.urandom(16)),))
+                if self.atomic:
+                    self._begin()
+                if mode == 'n':
+                    self._begin()
+                    self.db.execute('DELETE FROM records')
+        except:
+            self.db.close()
+            raise
+
+    @classmethod
+    def is_sqlite(cls,path):
+        """ True when path is a SQLite database """
+        try:
+            with open(path,'rb') as data:
+                return data.read(len(cls.MAGIC)) == cls.MAGIC
+        except IOError:
+            return False
+
+    def _begin(self):
+        if not self._in_transaction:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.execute('UPDATE meta SET generation = generation + 1')
+            self._in_transaction = True
+
+    def _commit(self):
+        if self._in_transaction:
+            self.db.execute('COMMIT')
+            self._in_transaction = False
+
+    @staticmethod
+    def _record(row):
+        return PasswordRecord(*row)
+
+    def __contains__(self,dbkey):
+        return self.db.execute(self.SELECT,(dbkey,)).fetchone() is not None
+
+    def get(self,dbkey):
+        """ Return the record for dbkey or None if it does not exist """
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        row = self.db.execute(self.SELECT,(dbkey,)).fetchone()
+        if inst is not None:
+            inst.record('lookup',start,len(row[2]) if row is not None else 0)
+            if row is None:
+                inst.count('misses')
+        return self._record(row) if row is not None else None
+
+    def put(self,dbkey,record):
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        self._begin()
+        self.db.execute(self.INSERT,(dbkey,_utf8(record['host']),_utf8(record['username']),record['rsakey']))
+        if inst is not None:
+            inst.record('write',start,len(record['rsakey']))
+
+    def delete(self,dbkey):
+        """ Delete the record for dbkey - returns False if it does not exist """
+        inst = instrument.active
+        if inst is not None:
+            start = instrument.clock()
+        self._begin()
+        deleted = self.db.execute(self.DELETE,(dbkey,)).rowcount > 0
+        if inst is not None:
+            inst.record('delete',start)
+        return deleted
+
+    def iter_records(self):
+        """ Generator of (dbkey, record) tuples in dbkey order """
+        for row in self.db.execute('SELECT dbkey,host,username,rsakey FROM records ORDER BY dbkey'):
+            yield row[0],self._record(row[1:])
+
+    def find(self,host=None,username=None,prefix=None):
+        """ Query the host and username indexes of the records table - see Storage.find """
+        clauses = []
+        params = []
+        if host is not None:
+            clauses.append('host = ?')
+            params.append(_utf8(host))
+        if username is not None:
+            clauses.append('username = ?')
+            params.append(_utf8(username))
+        if prefix:
+            # GLOB is case sensitive so SQLite turns it into a range scan of the username index
+            clauses.append('username GLOB ?')
+            params.append(''.join('[' + c + ']' if c in '*?[' else c for c in _utf8(prefix)) + '*')
+        query = 'SELECT dbkey,host,username,rsakey FROM records'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        for row in self.db.execute(query + ' ORDER BY dbkey',params).fetchall():
+            yield row[0],self._record(row[1:])
+
+    def garbage_ratio(self):
+        """ Fraction of the database pages that are free """
+        pages = self.db.execute('PRAGMA page_count').fetchone()[0]
+        return float(self.db.execute('PRAGMA freelist_count').fetchone()[0]) / pages if pages else 0.0
+
+    def stats(self):
+        """ Dict of the record count and the database and write ahead log sizes """
+        return {'records':self.db.execute('SELECT COUNT(*) FROM records').fetchone()[0],
+                'database size':os.path.getsize(self.path),
+                'wal size':os.path.getsize(self.path + '-wal') if os.path.exists(self.path + '-wal') else 0}
+
+    def _secondary_stamp(self):
+        # the stamp of the last commit once closed
+        if self._stamp is None:
+            import sqlite3
+            try:
+                return self.db.execute('SELECT id,generation FROM meta').fetchone(),0
+            except sqlite3.OperationalError:  # a file written before the meta table, opened by a reader
+                return super(SqliteStorage,self)._secondary_stamp()
+        return self._stamp
+
+    def sync(self):
+        """ Commit the writes made since the last sync - an atomic session only commits on close """
+        if not self.atomic:
+            self._commit()
+
+    def close(self):
+        try:
+            self._commit()
+            self._stamp = self._secondary_stamp()
+            if self.mode == 'n' and not self._new_file and self.garbage_ratio():
+                self.db.execute('VACUUM')  # a rewritten file gives back the pages of the old records
+            self.db.close()
+        finally:
+            super(SqliteStorage,self).close()
+
+    def abort(self):
+        try:
+            if self._in_transaction:
+                self.db.execute('ROLLBACK')
+                self._in_transaction = False
+            self.db.close()
+        finally:
+            super(SqliteStorage,self).close()
+
+
+BACKENDS = {ShelveStorage.name:ShelveStorage,CompactStorage.name:CompactStorage,SqliteStorage.name:SqliteStorage}
+
+
+def detect_backend(path):
+    """ Name of the backend for an existing data file - shelve when it is neither a compact nor a SQLite file """
+    if CompactStorage.is_compact(path):
+        return CompactStorage.name
+    if SqliteStorage.is_sqlite(path):
+        return SqliteStorage.name
+    return ShelveStorage.name
+
+
+def open_storage(path,mode='r',backend=None,lock=True,timeout=10.0,atomic=False):
+    """
+    Open the data file with the named backend
+    :param backend: name in BACKENDS, None detects the format of an existing file (default shelve)
+    :param lock: lock the data file - a WriteLock for writers held while it is open, shared for each operation
+                 of a shelve reader
+    :param timeout: seconds to wait for the lock before raising LockTimeout
+    :param atomic: writers work on a copy that is renamed over the data file on close
+    """
+    backend = backend or detect_backend(path)
+    file_lock = None
+    if lock and mode != 'r':
+        file_lock = WriteLock(path,timeout,atomic).acquire()
+    elif lock and backend == ShelveStorage.name:
+        file_lock = FileLock(path,exclusive=False,timeout=timeout).acquire()
+    try:
+        storage = BACKENDS[backend](path,mode,atomic)
+    except:
+        if file_lock is not None:
+            file_lock.release()
+        raise
+    if mode == 'r' and file_lock is not None:
+        storage._start_reading(file_lock)  # the reader takes the lock again for each operation
+        file_lock.release()
+        file_lock = None
+    storage.lock = file_lock
+    return storage
+
+
+def _files_size(path,suffixes):
+    return sum(os.path.getsize(path + suffix) for suffix in suffixes if os.path.exists(path + suffix))
+
+
+def compact_file(path,backend=None,lock=True,timeout=10.0,batch_size=1000):
+    """
+    Rewrite a data file with only its live records - replaced and deleted records are dropped.  The records
+    are copied to a new copy of the file that replaces it only when every record was copied.
+    :param lock: take the exclusive lock, False when the caller already holds it
+    :return: tuple of the size in bytes of the data file before and after
+    """
+    backend = backend or detect_backend(path)
+    suffixes = BACKENDS[backend].SUFFIXES
+    before = _files_size(path,suffixes)
+    target = open_storage(path,'n',backend,lock=lock,timeout=timeout,atomic=True)
+    try:
+        source = open_storage(path,'r',backend,lock=False)
+        try:
+            copy_records(source,target,batch_size)
+        finally:
+            source.close()
+    except:
+        target.abort()
+        raise
+    target.close()
+    return before,_files_size(path,suffixes)
+
+
+def remove_data_file(path,backend=None,timeout=10.0):
+    """
+    Delete a data file with its index, manifest and lock files.  Waits up to timeout seconds for the writers and
+    shelve readers that have it open - compact readers keep reading the deleted file through their open handles.
+    """
+    from pswdfile.index import SecondaryIndex
+    from pswdfile.sync import CACHE_SUFFIX
+    backend = backend or detect_backend(path)
+    file_lock = WriteLock(path,timeout).acquire()
+    try:
+        Storage._remove_files(path,BACKENDS[backend].SUFFIXES + (SecondaryIndex.SUFFIX,CACHE_SUFFIX))
+    finally:
+        file_lock.release()
+    for lock_path in file_lock.paths:
+        if os.path.exists(lock_path):
+            os.remove(lock_path)
+
+
+def copy_records(source,target,batch_size=1000,progress=None):
+    """
+    Copy every record from one open storage to another without decrypting, syncing every batch_size records
+    :return: number of records copied
+    """
+    count = 0
+    for dbkey,record in source.iter_records():
+        target.put(dbkey,record)
+        count += 1
+        if count % batch_size == 0:
+            target.sync()
+            if progress:
+                progress(count)
+    target.sync()
+    if progress and count % batch_size:
+        progress(count)
+    return count
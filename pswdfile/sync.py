@@ -0,0 +1,329 @@
+"""
+  Name: sync.py
+
+  Purpose: Incremental sync of password files.  A record manifest holds a SHA256 digest of every record
+           (its encoded PasswordRecord - host, username and ciphertext) by dbkey, grouped into 256 buckets
+           by the first byte of the dbkey.  A bucket digest hashes the sorted entries of the bucket and the
+           root digest hashes the bucket digests (a two level Merkle tree), so two files with the same root
+           hold the same records and a diff only compares the entries of the buckets whose digests differ.
+
+           sync_files brings a target file up to date with a source file by writing only the records that
+           were added or changed and deleting the ones that were removed.  The records are streamed to build
+           the manifests - only the dbkeys and digests are kept in memory - and copied without decrypting.
+
+           The manifest of a data file is cached in <data file>.mft with the stamp of the data file, like the
+           secondary index: it is used while the data file is unchanged, the records a compact file appended
+           since are replayed into it, and it is rebuilt with a scan otherwise.  sync_files caches the
+           manifest of the target as it leaves it, so a later sync only scans a source that changed.
+
+           Manifest file: a header line "pswdfile-manifest <version> <records> <root digest>" followed by a
+           "<dbkey> <digest>" line per record in dbkey order.
+
+@author:     Jason DeCorte
+
+@copyright:  2015 DeCorte Industries.com. All rights reserved.
+
+@contact:    jdecorte@decorteindustries.com
+
+Version History
+0.01 jwd3 10/17/2026
+    Initial creation
+"""
+import os
+import binascii
+import bisect
+import hashlib
+import struct
+
+from pswdfile.record import as_record
+from pswdfile.storage import BACKENDS,open_storage
+
+__all__ = ['RecordManifest','record_digest','storage_manifest','load_manifest','file_manifest','diff_manifests',
+           'sync_files','is_manifest']
+__version__ = "0.01"
+__date__ = '10/17/2026'
+__updated__ = '10/17/2026'
+
+MAGIC = 'pswdfile-manifest'
+VERSION = 1
+BUCKETS = 256
+CACHE_SUFFIX = '.mft'
+CACHE_MAGIC = 'PWDM'
+CACHE_HEADER = struct.Struct('>4sB3x20sQI')  # magic, version, stamp digest, covered data size, entries
+ENTRY_SIZE = 64  # raw dbkey followed by the raw record digest
+_EMPTY_BUCKET = hashlib.sha256('').digest()
+
+
+def record_digest(record):
+    """ Raw SHA256 digest of a record (a PasswordRecord or a record dict) """
+    return hashlib.sha256(as_record(record).encode()).digest()
+
+
+class RecordManifest(object):
+    """ Record digests by dbkey in 256 buckets with a Merkle rollup.  An entry is the raw 32 byte dbkey
+        followed by the raw 32 byte record digest in one string. """
+
+    def __init__(self,covered=0):
+        self.buckets = [[] for _ in xrange(BUCKETS)]
+        self.covered = covered  # data size of a compact file the manifest covers
+        self.dirty = False  # changed since it was loaded from the cache
+        self._digests = None
+        self._sorted = True
+
+    @classmethod
+    def from_records(cls,records):
+        """ Manifest of an iterable of (dbkey, record) tuples """
+        manifest = cls()
+        for dbkey,record in records:
+            manifest.add(dbkey,record_digest(record))
+        return manifest
+
+    def add(self,dbkey,digest):
+        """ Add the entry of a dbkey that is not in the manifest """
+        entry = binascii.unhexlify(dbkey) + digest
+        self.buckets[ord(entry[0])].append(entry)
+        self._digests = None
+        self._sorted = False
+        self.dirty = True
+
+    def _find(self,raw):
+        """ Tuple of the bucket of a raw dbkey, the position of its entry (or where it goes) and whether it is there """
+        self._sort()
+        bucket = self.buckets[ord(raw[0])]
+        i = bisect.bisect_left(bucket,raw)
+        return bucket,i,i < len(bucket) and bucket[i][:32] == raw
+
+    def set(self,dbkey,record):
+        """ Add or replace the entry of a record """
+        raw = binascii.unhexlify(dbkey)
+        bucket,i,found = self._find(raw)
+        if found:
+            bucket[i] = raw + record_digest(record)
+        else:
+            bucket.insert(i,raw + record_digest(record))
+        self._digests = None
+        self.dirty = True
+
+    def discard(self,dbkey):
+        bucket,i,found = self._find(binascii.unhexlify(dbkey))
+        if found:
+            del bucket[i]
+            self._digests = None
+            self.dirty = True
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def _sort(self):
+        if not self._sorted:
+            for bucket in self.buckets:
+                bucket.sort()
+            self._sorted = True
+
+    def bucket_digests(self):
+        """ List of the digests of the buckets - the hash of the sorted entries of each """
+        if self._digests is None:
+            self._sort()
+            self._digests = [hashlib.sha256(''.join(bucket)).digest() if bucket else _EMPTY_BUCKET
+                             for bucket in self.buckets]
+        return self._digests
+
+    def root(self):
+        """ Hex root digest - equal for files holding the same records """
+        return hashlib.sha256(''.join(self.bucket_digests())).hexdigest()
+
+    def entries(self,bucket=None):
+        """ Generator of (dbkey, hex digest) tuples in dbkey order, of one bucket or all of them """
+        self._sort()
+        for entries in (self.buckets if bucket is None else [self.buckets[bucket]]):
+            for entry in entries:
+                yield binascii.hexlify(entry[:32]),binascii.hexlify(entry[32:])
+
+    def save(self,stream):
+        """ Write the manifest file to an open file """
+        stream.write('{0} {1:d} {2:d} {3}\n'.format(MAGIC,VERSION,len(self),self.root()))
+        for dbkey,digest in self.entries():
+            stream.write('{0} {1}\n'.format(dbkey,digest))
+
+    @staticmethod
+    def _digest(stamp):
+        return hashlib.sha1(repr(stamp)).digest()
+
+    @classmethod
+    def load_cache(cls,path,stamp):
+        """ Cached manifest of the data file at path - None when it is missing, damaged or for another stamp """
+        try:
+            with open(path + CACHE_SUFFIX,'rb') as cache_file:
+                data = cache_file.read()
+        except IOError:
+            return None
+        if len(data) < CACHE_HEADER.size:
+            return None
+        magic,version,digest,covered,count = CACHE_HEADER.unpack_from(data)
+        if (magic != CACHE_MAGIC or version != VERSION or digest != cls._digest(stamp) or
+                len(data) != CACHE_HEADER.size + count * ENTRY_SIZE):
+            return None
+        manifest = cls(covered)
+        buckets = manifest.buckets
+        for offset in xrange(CACHE_HEADER.size,len(data),ENTRY_SIZE):  # saved in order, so the buckets stay sorted
+            buckets[ord(data[offset])].append(data[offset:offset + ENTRY_SIZE])
+        return manifest
+
+    def save_cache(self,path,stamp,covered=0):
+        """
+        Write the manifest of the data file at path to <data file>.mft.  The cache is derived data - a failed
+        write is ignored and the manifest rebuilt the next time.
+        :param stamp: stamp identifying the data file the manifest describes
+        :param covered: data size the manifest covers
+        """
+        self._sort()
+        temp_path = '{0}{1}.tmp{2}'.format(path,CACHE_SUFFIX,os.getpid())
+        try:
+            with open(temp_path,'wb') as cache_file:
+                cache_file.write(CACHE_HEADER.pack(CACHE_MAGIC,VERSION,self._digest(stamp),covered,len(self)))
+                for bucket in self.buckets:
+                    cache_file.write(''.join(bucket))
+            os.rename(temp_path,path + CACHE_SUFFIX)
+        except (IOError,OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        self.covered = covered
+        self.dirty = False
+        return True
+
+
+def storage_manifest(storage):
+    """ Manifest of an open storage - from the cache when it is current (or a compact file only appended to
+        since), built with a scan and cached otherwise """
+    stamp,end = storage._secondary_stamp()  # taken first - a change during the scan invalidates the cache
+    manifest = RecordManifest.load_cache(storage.path,stamp)
+    if manifest is not None and manifest.covered != end:
+        if storage.JOURNALED and manifest.covered < end:
+            for dbkey,record in storage._journal(manifest.covered,end):
+                if record is None:
+                    manifest.discard(dbkey)
+                else:
+                    manifest.set(dbkey,record)
+        else:
+            manifest = None
+    if manifest is None:
+        manifest = RecordManifest.from_records(storage.iter_records())
+    if manifest.dirty:
+        manifest.save_cache(storage.path,stamp,end)
+    return manifest
+
+
+def is_manifest(path):
+    """ True when path is a manifest file """
+    try:
+        with open(path,'rb') as manifest_file:
+            return manifest_file.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+
+def load_manifest(path):
+    """ Read a manifest file - raises ValueError when it is not one or its root does not match its entries """
+    with open(path,'rb') as manifest_file:
+        header = manifest_file.readline().split()
+        if len(header) != 4 or header[0] != MAGIC or header[1] != str(VERSION):
+            raise ValueError('[{0!s}] is not a manifest file'.format(path))
+        manifest = RecordManifest()
+        for line in manifest_file:
+            dbkey,digest = line.split()
+            manifest.add(dbkey,binascii.unhexlify(digest))
+    if len(manifest) != int(header[2]) or manifest.root() != header[3]:
+        raise ValueError('Manifest [{0!s}] is damaged - its entries do not match its root digest'.format(path))
+    return manifest
+
+
+def file_manifest(path,timeout=10.0):
+    """ Manifest of a data file (sharded or not) or manifest file """
+    from pswdfile.shard import is_sharded,iter_shard_records  # the shard module loads the password module
+    if is_manifest(path):
+        return load_manifest(path)
+    if is_sharded(path):
+        return RecordManifest.from_records(iter_shard_records(path,timeout))
+    storage = open_storage(path,'r',timeout=timeout)
+    try:
+        return storage_manifest(storage)
+    finally:
+        storage.close()
+
+
+def diff_manifests(source,target):
+    """
+    Records to change to make target hold the records of source - only the buckets with different digests
+    are compared
+    :return: generator of (change, dbkey) tuples in dbkey order, change is 'added', 'changed' or 'removed'
+    """
+    source_digests = source.bucket_digests()
+    target_digests = target.bucket_digests()
+    for bucket in xrange(BUCKETS):
+        if source_digests[bucket] == target_digests[bucket]:
+            continue
+        source_entries = source.entries(bucket)
+        target_entries = target.entries(bucket)
+        source_entry = next(source_entries,None)
+        target_entry = next(target_entries,None)
+        while source_entry is not None or target_entry is not None:
+            if target_entry is None or (source_entry is not None and source_entry[0] < target_entry[0]):
+                yield 'added',source_entry[0]
+                source_entry = next(source_entries,None)
+            elif source_entry is None or target_entry[0] < source_entry[0]:
+                yield 'removed',target_entry[0]
+                target_entry = next(target_entries,None)
+            else:
+                if source_entry[1] != target_entry[1]:
+                    yield 'changed',source_entry[0]
+                source_entry = next(source_entries,None)
+                target_entry = next(target_entries,None)
+
+
+def sync_files(source,target,backend=None,timeout=10.0,batch_size=1000):
+    """
+    Make the target data file hold the same records as the source data file by writing only the differences.
+    The target is locked for the whole sync and created when it does not exist.
+    :param backend: backend of a new target file, None for the backend of the source
+    :return: dict of the number of records added, changed and removed
+    """
+    counts = {'added':0,'changed':0,'removed':0}
+    source_storage = open_storage(source,'r',timeout=timeout)
+    try:
+        if any(os.path.exists(target + suffix)
+               for storage_class in BACKENDS.values() for suffix in storage_class.SUFFIXES):
+            backend = None  # the format of an existing target is detected
+        else:
+            backend = backend or source_storage.name
+        target_storage = open_storage(target,'c',backend,timeout=timeout)
+        try:
+            source_manifest = storage_manifest(source_storage)
+            target_manifest = storage_manifest(target_storage)
+            changes = list(diff_manifests(source_manifest,target_manifest))
+            for change,dbkey in changes:
+                record = source_storage.get(dbkey) if change != 'removed' else None
+                if record is None:
+                    target_storage.delete(dbkey)
+                    target_manifest.discard(dbkey)
+                else:
+                    target_storage.put(dbkey,record)
+                    target_manifest.set(dbkey,record)
+                counts[change] += 1
+                if sum(counts.values()) % batch_size == 0:
+                    target_storage.sync()
+        except:
+            target_storage.abort()
+            raise
+        # hold the lock until the manifest of the target is cached with the stamp of the data it describes
+        file_lock,target_storage.lock = target_storage.lock,None
+        try:
+            target_storage.close()
+            if target_manifest.dirty:
+                target_manifest.save_cache(target,*target_storage._secondary_stamp())
+        finally:
+            if file_lock is not None:
+                file_lock.release()
+    finally:
+        source_storage.close()
+    return counts
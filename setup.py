@@ -5,7 +5,7 @@ version = "3.0.1"
 setup(
     name='pswdfile',
     version=version,
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks','tests']),
     url='https://github.com/wjdecorte/pswdfile',
     license='GNU General Public License (GPL)',
     author='jwd3',
@@ -27,7 +27,8 @@ setup(
     include_package_data=True,
     entry_points = {
         'console_scripts': [
-            'pwutil = pswdfile.pwutil:main'
+            'pwutil = pswdfile.pwutil:main',
+            'pwget = pswdfile.pwget:main'
         ]
     },
     scripts=[
@@ -0,0 +1,5 @@
+"""
+Unit tests for the pswdfile package.  Run them from the repository root:
+
+    python -m unittest discover -s tests -t .
+"""
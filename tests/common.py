@@ -0,0 +1,28 @@
+"""
+Helpers shared by the test modules
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from pswdfile.password import PasswordStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TempDirTestCase(unittest.TestCase):
+    """ Test case with a temporary directory (self.dir) removed after each test """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='pswdfile-test-')
+        self.addCleanup(shutil.rmtree,self.dir,True)
+
+    def path(self,name='.pddatafile'):
+        return os.path.join(self.dir,name)
+
+    def populate(self,entries,name='.pddatafile',backend=None):
+        """ Write (username, host, password) tuples to a data file in one session """
+        with PasswordStore(data_file_name=name,data_file_dir=self.dir,mode='c',backend=backend) as store:
+            for username,host,password in entries:
+                store.put(username,host,password)
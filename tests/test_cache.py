@@ -0,0 +1,85 @@
+"""
+CredentialCache - TTL expiry, LRU eviction and invalidation when the data file changes
+"""
+from pswdfile import cache as cache_module
+from pswdfile.cache import CredentialCache
+from pswdfile.password import PasswordStore
+from tests.common import TempDirTestCase
+
+
+class Clock(object):
+
+    now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class CacheTest(TempDirTestCase):
+
+    def setUp(self):
+        super(CacheTest,self).setUp()
+        self.clock = Clock()
+        self.addCleanup(setattr,cache_module,'time',cache_module.time)
+        cache_module.time = self.clock
+        self.file = self.path()
+        open(self.file,'w').close()
+
+    def test_ttl(self):
+        cache = CredentialCache(ttl=10)
+        cache.put(self.file,'a','tiger')
+        self.clock.now += 9
+        self.assertEqual(cache.get(self.file,'a'),'tiger')
+        self.clock.now += 2
+        self.assertIsNone(cache.get(self.file,'a'))
+
+    def test_expired_entries_wiped_on_any_access(self):
+        cache = CredentialCache(ttl=10)
+        cache.put(self.file,'a','tiger')
+        cache.put(self.file,'b','lion')
+        secret = cache._entries[(self.file,'a')]
+        self.clock.now += 5
+        cache.put(self.file,'c','bear')
+        self.clock.now += 6  # a and b expired, c did not
+        self.assertEqual(cache.get(self.file,'c'),'bear')
+        self.assertEqual(len(cache),1)
+        self.assertEqual(secret,bytearray(5))  # overwritten with zeros
+        self.assertEqual(cache.stats()['evictions'],2)
+
+    def test_lru(self):
+        cache = CredentialCache(max_entries=2)
+        cache.put(self.file,'a','tiger')
+        cache.put(self.file,'b','lion')
+        cache.get(self.file,'a')
+        cache.put(self.file,'c','bear')
+        self.assertIsNone(cache.get(self.file,'b'))
+        self.assertEqual(cache.get(self.file,'a'),'tiger')
+        self.assertEqual(cache.get(self.file,'c'),'bear')
+
+    def test_replace_refreshes_ttl(self):
+        cache = CredentialCache(ttl=10)
+        cache.put(self.file,'a','tiger')
+        self.clock.now += 8
+        cache.put(self.file,'a','lion')
+        self.clock.now += 8
+        self.assertEqual(cache.get(self.file,'a'),'lion')
+
+
+class InvalidationTest(TempDirTestCase):
+
+    def test_write_by_another_session(self):
+        self.populate([('scott','dbhost','tiger')])
+        cache = CredentialCache()
+        with PasswordStore(data_file_dir=self.dir,cache=cache) as reader:
+            self.assertEqual(reader.get('scott','dbhost'),'tiger')
+            self.assertEqual(len(cache),1)
+            self.populate([('scott','dbhost','lion')])
+            self.assertEqual(reader.get('scott','dbhost'),'lion')
+
+    def test_remove_discards(self):
+        self.populate([('scott','dbhost','tiger')])
+        cache = CredentialCache()
+        with PasswordStore(data_file_dir=self.dir,mode='c',cache=cache) as store:
+            self.assertEqual(store.get('scott','dbhost'),'tiger')
+            store.remove('scott','dbhost')
+            self.assertIsNone(store.get('scott','dbhost'))
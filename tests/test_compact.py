@@ -0,0 +1,124 @@
+"""
+Compact files - journal replay on open and recovery from a torn or damaged tail
+"""
+import hashlib
+import os
+import struct
+import zlib
+
+from pswdfile.storage import CompactStorage,MappedCompactStorage
+from tests.common import TempDirTestCase
+
+
+def dbkey(name):
+    return hashlib.sha256(name).hexdigest()
+
+
+def record(name):
+    return {'host':'dbhost','username':name,'rsakey':'c2VjcmV0'}
+
+
+class CompactRecoveryTest(TempDirTestCase):
+
+    def setUp(self):
+        super(CompactRecoveryTest,self).setUp()
+        self.file = self.path('.pdcompact')
+
+    def crash(self,names,deleted=()):
+        """ Write names (and delete deleted) and stop without closing - nothing is checkpointed """
+        storage = CompactStorage(self.file,'c')
+        for name in names:
+            storage.put(dbkey(name),record(name))
+        for name in deleted:
+            storage.delete(dbkey(name))
+        storage.sync()
+        storage.data.close()
+        return storage._end
+
+    def names(self,mode='r'):
+        storage = CompactStorage(self.file,mode)
+        try:
+            return sorted(rec['username'] for _,rec in storage.iter_records())
+        finally:
+            storage.close()
+
+    def append(self,data):
+        with open(self.file,'ab') as data_file:
+            data_file.write(data)
+
+    def test_replay_without_index(self):
+        self.crash(['scott','jones','adams'],deleted=['jones'])
+        self.assertFalse(os.path.exists(self.file + '.idx'))
+        self.assertEqual(self.names(),['adams','scott'])
+
+    def test_replay_after_checkpoint(self):
+        storage = CompactStorage(self.file,'c')
+        storage.put(dbkey('scott'),record('scott'))
+        storage.close()
+        storage = CompactStorage(self.file,'c')
+        storage.put(dbkey('jones'),record('jones'))
+        storage.sync()
+        storage.data.close()
+        storage._index.close()
+        self.assertEqual(self.names(),['jones','scott'])
+
+    def test_torn_tail(self):
+        end = self.crash(['scott','jones'])
+        with open(self.file,'r+b') as data_file:
+            data_file.truncate(end - 3)
+        self.assertEqual(self.names(),['scott'])
+        self.assertEqual(self.names('c'),['scott'])
+        self.assertLess(os.path.getsize(self.file),end - 3)  # the writer dropped the torn record
+
+    def test_zero_filled_tail(self):
+        end = self.crash(['scott'])
+        self.append('\0' * 50)
+        self.assertEqual(self.names(),['scott'])
+        mapped = MappedCompactStorage(self.file)
+        self.assertEqual(len(mapped),1)
+        mapped.close()
+        self.assertEqual(self.names('c'),['scott'])
+        self.assertEqual(os.path.getsize(self.file),end)
+
+    def test_damaged_record_stops_replay(self):
+        self.crash(['scott'])
+        first = os.path.getsize(self.file)
+        self.crash(['jones','adams'])
+        with open(self.file,'r+b') as data_file:
+            data_file.seek(first + 40)  # the username length of jones
+            byte = data_file.read(1)
+            data_file.seek(first + 40)
+            data_file.write(chr(ord(byte) ^ 0x40))
+        self.assertEqual(self.names(),['scott'])  # adams follows the damaged record and is dropped too
+        self.assertEqual(self.names('c'),['scott'])
+        self.assertEqual(os.path.getsize(self.file),first)
+
+    def test_version_1_file(self):
+        header = CompactStorage.FILE_HEADER.pack(CompactStorage.MAGIC,1,42)
+        body = 'scott' + 'secret'
+        data = CompactStorage.RECORD_HEADER.pack(hashlib.sha256('scott').digest(),0,0,5,6) + body
+        with open(self.file,'wb') as data_file:
+            data_file.write(header + data)
+        self.assertEqual(self.names(),['scott'])
+        storage = CompactStorage(self.file,'c')
+        self.assertEqual(storage.version,1)
+        storage.put(dbkey('jones'),record('jones'))
+        storage.close()
+        self.assertEqual(self.names(),['jones','scott'])
+        with open(self.file,'rb') as data_file:
+            self.assertEqual(struct.unpack_from('>4sB',data_file.read(5)),(CompactStorage.MAGIC,1))
+
+    def test_checksum(self):
+        self.crash(['scott'])
+        with open(self.file,'rb') as data_file:
+            data = data_file.read()[CompactStorage.FILE_HEADER.size:]
+        crc, = CompactStorage.RECORD_CRC.unpack_from(data,0)
+        self.assertEqual(crc,zlib.crc32(data[CompactStorage.RECORD_CRC.size:]) & 0xffffffff)
+
+    def test_empty_fields_rejected(self):
+        storage = CompactStorage(self.file,'c')
+        try:
+            self.assertRaises(ValueError,storage.put,dbkey('scott'),{'host':None,'username':'','rsakey':'c2VjcmV0'})
+            self.assertRaises(ValueError,storage.put,dbkey('scott'),{'host':None,'username':'scott','rsakey':''})
+        finally:
+            storage.close()
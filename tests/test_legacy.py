@@ -0,0 +1,59 @@
+"""
+Shelve files written by earlier versions - records stored as pickled dicts
+"""
+import base64
+import cPickle
+import shelve
+
+from pswdfile.password import Password,PasswordStore
+from pswdfile.record import is_encoded
+from pswdfile.storage import open_storage
+from tests.common import TempDirTestCase
+
+
+class LegacyShelveTest(TempDirTestCase):
+
+    def setUp(self):
+        super(LegacyShelveTest,self).setUp()
+        # encrypt with the current code, then write the records the way earlier versions did
+        self.populate([('scott','dbhost','tiger'),('jones',None,'secret')],name='.pdnew')
+        storage = open_storage(self.path('.pdnew'))
+        records = [(dbkey,dict(record)) for dbkey,record in storage.iter_records()]
+        storage.close()
+        legacy = shelve.open(self.path())
+        for dbkey,record in records:
+            if record['host']:
+                legacy[dbkey] = base64.b64encode(cPickle.dumps(record))  # the last format
+            else:
+                legacy[dbkey] = record  # the format before it
+        legacy.close()
+
+    def raw_values(self):
+        legacy = shelve.open(self.path(),'r')
+        try:
+            return dict((key,legacy.dict[key]) for key in legacy.keys())
+        finally:
+            legacy.close()
+
+    def test_read(self):
+        with PasswordStore(data_file_dir=self.dir) as store:
+            self.assertEqual(store.get('scott','dbhost'),'tiger')
+            self.assertEqual(store.get('jones'),'secret')
+        pwd = Password(host='dbhost',username='scott',data_file_dir=self.dir)
+        self.assertEqual(pwd.decrypt(),'tiger')
+        records = sorted((record['username'],record['host']) for record in Password(data_file_dir=self.dir).get_all())
+        self.assertEqual(records,[('jones',None),('scott','dbhost')])
+
+    def test_write_keeps_pickled_records(self):
+        with PasswordStore(data_file_dir=self.dir,mode='c') as store:
+            store.put('scott','dbhost','lion')
+            store.put('adams','dbhost','bear')
+        self.assertFalse(any(is_encoded(value) for value in self.raw_values().values()))
+        legacy = shelve.open(self.path(),'r')
+        try:
+            self.assertEqual(len(legacy),3)  # still readable by the old code
+        finally:
+            legacy.close()
+        with PasswordStore(data_file_dir=self.dir) as store:
+            self.assertEqual(store.get('scott','dbhost'),'lion')
+            self.assertEqual(store.get('adams','dbhost'),'bear')
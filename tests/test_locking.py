@@ -0,0 +1,87 @@
+"""
+Readers and writers of one data file - a reader session never holds a writer up
+"""
+import os
+import subprocess
+import sys
+import time
+
+from pswdfile.password import PasswordStore
+from pswdfile.storage import open_storage
+from tests.common import ROOT,TempDirTestCase
+
+
+class ReaderWriterTest(TempDirTestCase):
+
+    def setUp(self):
+        super(ReaderWriterTest,self).setUp()
+        self.populate([('scott','dbhost','tiger')],backend='shelve')
+
+    def store(self,mode='r',**kwargs):
+        store = PasswordStore(data_file_dir=self.dir,mode=mode,**kwargs)
+        store.open()
+        self.assertFalse(store.is_error(),store.get_error_message() if store.is_error() else None)
+        return store
+
+    def write(self,password,atomic=False):
+        with self.store('c',lock_timeout=1.0,atomic=atomic) as writer:
+            writer.put('scott','dbhost',password)
+        self.assertFalse(writer.is_error())
+
+    def test_writer_while_reader_session_open(self):
+        with self.store() as reader:
+            self.assertEqual(reader.get('scott','dbhost'),'tiger')
+            start = time.time()
+            self.write('lion')
+            self.assertLess(time.time() - start,1.0)
+            self.assertEqual(reader.get('scott','dbhost'),'lion')  # the reader sees the write
+
+    def test_atomic_writer_while_reader_session_open(self):
+        with self.store() as reader:
+            self.assertEqual(reader.get('scott','dbhost'),'tiger')
+            self.write('lion',atomic=True)
+            self.assertEqual(reader.get('scott','dbhost'),'lion')
+
+    def test_reader_waits_for_writer_session(self):
+        writer = self.store('c')
+        try:
+            writer.put('scott','dbhost','lion')
+            reader = PasswordStore(data_file_dir=self.dir,lock_timeout=0.2)
+            reader.open()  # a shelve changed in place can't be opened until the writer is done
+            self.assertTrue(reader.is_error())
+            self.assertIn('Timed out',reader.get_error_message())
+        finally:
+            writer.close()
+
+    def test_lookup_waits_for_writer_session(self):
+        with self.store(lock_timeout=0.2) as reader:
+            writer = self.store('c')
+            try:
+                writer.put('scott','dbhost','lion')
+                self.assertIsNone(reader.get('scott','dbhost'))  # times out - never a half written record
+                self.assertIn('Timed out',reader.get_error_message())
+            finally:
+                writer.close()
+            self.assertEqual(reader.get('scott','dbhost'),'lion')
+
+    def test_iteration_sees_one_version(self):
+        storage = open_storage(self.path(),'r')
+        try:
+            records = storage.iter_records()
+            next(records)  # holds the shared lock until the iteration ends
+            with self.assertRaises(IOError):
+                open_storage(self.path(),'c',timeout=0.1)
+            records.close()
+            open_storage(self.path(),'c',timeout=0.1).close()
+        finally:
+            storage.close()
+
+    def test_pwutil_add_while_reader_session_open(self):
+        env = dict(os.environ,PYTHONPATH=ROOT)
+        with self.store() as reader:
+            start = time.time()
+            output = subprocess.check_output([sys.executable,'-m','pswdfile.pwutil','add',self.path(),'adams',
+                                              'dbhost','secret'],cwd=ROOT,env=env)
+            self.assertIn('Entry Added',output)
+            self.assertLess(time.time() - start,5.0)
+            self.assertEqual(reader.get('adams','dbhost'),'secret')
@@ -0,0 +1,56 @@
+"""
+pwutil commands run through the click test runner
+"""
+import os
+
+from click.testing import CliRunner
+
+from pswdfile import pwutil
+from pswdfile.password import PasswordStore
+from tests.common import TempDirTestCase
+
+
+class ImportTest(TempDirTestCase):
+
+    def run_import(self,data,*args):
+        return CliRunner().invoke(pwutil.main,['import'] + list(args) + [self.path(),'-'],input=data)
+
+    def test_import(self):
+        result = self.run_import('username,host,password\nscott,dbhost,tiger\njones,,secret\n','-q')
+        self.assertEqual(result.exit_code,0,result.output)
+        with PasswordStore(data_file_dir=self.dir) as store:
+            self.assertEqual(store.get('scott','dbhost'),'tiger')
+            self.assertEqual(store.get('jones'),'secret')
+
+    def test_row_without_password_writes_nothing(self):
+        result = self.run_import('username,host,password\nscott,dbhost,tiger\njones,dbhost\n','-q')
+        self.assertEqual(result.exit_code,2)
+        self.assertIn('line 3: no password',result.output)
+        self.assertFalse(os.listdir(self.dir))
+
+    def test_invalid_json_writes_nothing(self):
+        result = self.run_import('{"username":"scott","password":"tiger"}\n{"username":\n','-q','-f','jsonl')
+        self.assertEqual(result.exit_code,2)
+        self.assertIn('line 2: not valid JSON',result.output)
+        self.assertFalse(os.listdir(self.dir))
+
+
+class CountingStore(PasswordStore):
+
+    commits = 0
+
+    def commit(self):
+        self.commits += 1
+        super(CountingStore,self).commit()
+
+
+class BatchTest(TempDirTestCase):
+
+    def test_commit(self):
+        lines = ['add scott dbhost tiger','add jones dbhost secret','remove jones dbhost','commit',
+                 'get scott dbhost']
+        with CountingStore(data_file_dir=self.dir,mode='c') as store:
+            results = list(pwutil.run_batch(store,lines,commit_every=2))
+            self.assertTrue(all(result['ok'] for result in results),results)
+            self.assertEqual(store.commits,2)  # after the second write and the commit command
+            self.assertEqual(results[-1]['password'],'tiger')
@@ -0,0 +1,57 @@
+"""
+PasswordStore sessions - a with block left by an exception aborts instead of committing
+"""
+from pswdfile.cache import CredentialCache
+from pswdfile.password import PasswordStore
+from tests.common import TempDirTestCase
+
+
+class Failure(Exception):
+    pass
+
+
+class AbortTest(TempDirTestCase):
+
+    def setUp(self):
+        super(AbortTest,self).setUp()
+        self.populate([('scott','dbhost','tiger')],backend=self.backend)
+
+    backend = 'shelve'
+
+    def read(self):
+        with PasswordStore(data_file_dir=self.dir) as store:
+            return store.get('scott','dbhost')
+
+    def fail_in_session(self,**kwargs):
+        try:
+            with PasswordStore(data_file_dir=self.dir,mode='c',**kwargs) as store:
+                store.put('scott','dbhost','lion')
+                raise Failure()
+        except Failure:
+            pass
+        self.assertFalse(store.isOpen)
+
+    def test_atomic_session_writes_nothing(self):
+        self.fail_in_session(atomic=True)
+        self.assertEqual(self.read(),'tiger')
+
+    def test_clean_exit_commits(self):
+        with PasswordStore(data_file_dir=self.dir,mode='c',atomic=True) as store:
+            store.put('scott','dbhost','lion')
+        self.assertEqual(self.read(),'lion')
+
+    def test_abort_clears_cache(self):
+        cache = CredentialCache()
+        self.fail_in_session(atomic=True,cache=cache)
+        with PasswordStore(data_file_dir=self.dir,cache=cache) as store:
+            self.assertEqual(store.get('scott','dbhost'),'tiger')
+
+
+class CompactAbortTest(AbortTest):
+
+    backend = 'compact'
+
+
+class SqliteAbortTest(AbortTest):
+
+    backend = 'sqlite'
@@ -0,0 +1,52 @@
+"""
+Sharded data files - ShardedPasswordStore and ShardedStorage over the same shards
+"""
+from pswdfile.password import PasswordStore
+from pswdfile.shard import ShardedPasswordStore,read_manifest,reshard_file
+from tests.common import TempDirTestCase
+
+ENTRIES = [('user{0:02d}'.format(i),'host{0:d}'.format(i % 3),'secret{0:02d}'.format(i)) for i in range(20)]
+
+
+class ShardTest(TempDirTestCase):
+
+    def setUp(self):
+        super(ShardTest,self).setUp()
+        with ShardedPasswordStore(data_file_dir=self.dir,mode='c',shards=4) as store:
+            for username,host,password in ENTRIES:
+                store.put(username,host,password)
+
+    def test_store_and_storage_see_the_same_records(self):
+        with ShardedPasswordStore(data_file_dir=self.dir) as sharded,PasswordStore(data_file_dir=self.dir) as store:
+            for username,host,password in ENTRIES:
+                self.assertEqual(sharded.get(username,host),password)
+                self.assertEqual(store.get(username,host),password)  # through ShardedStorage
+            self.assertEqual(len(sharded.get_all()),len(ENTRIES))
+
+    def test_reader_follows_reshard(self):
+        with ShardedPasswordStore(data_file_dir=self.dir) as reader:
+            self.assertEqual(reader.get('user01','host1'),'secret01')
+            reshard_file(self.path(),2)
+            self.assertEqual(read_manifest(self.path())[:2],(2,2))
+            self.assertEqual(reader.get('user02','host2'),'secret02')
+            self.assertEqual(reader.get('user01','host1'),'secret01')
+            self.assertEqual(len(reader.get_all()),len(ENTRIES))
+
+    def test_missing_username(self):
+        with ShardedPasswordStore(data_file_dir=self.dir) as reader:
+            self.assertIsNone(reader.get('','host1'))
+            self.assertEqual(reader.errmsg,'Missing User Name')
+
+    def test_abort(self):
+        try:
+            with ShardedPasswordStore(data_file_dir=self.dir,mode='c') as writer:
+                writer.put('user01','host1','changed')
+                raise KeyError()
+        except KeyError:
+            pass
+        self.assertFalse(writer.isOpen)
+        with ShardedPasswordStore(data_file_dir=self.dir,mode='c') as writer:
+            writer.put('user01','host1','changed')
+            self.assertEqual(len(writer.get_all()),len(ENTRIES))
+        with ShardedPasswordStore(data_file_dir=self.dir) as reader:
+            self.assertEqual(reader.get('user01','host1'),'changed')